@@ -0,0 +1,64 @@
+import time
+import logging
+from typing import Callable, List, Tuple
+import numpy as np
+import pandas as pd
+
+from src.pipeline import get_clean_data
+from src.data_ingestion.synthetic import get_synthetic_games
+
+ELO_COLS = dict(date_col='inferred_date', w_id_col='WID', w_games_col='WGames', w_sets_col='WSets', l_id_col='LID',
+                l_games_col='LGames', l_sets_col='LSets', itf_col='source')
+
+
+def get_regional_games(n_regions: int, players_per_region: int, n_dates: int, games_per_date: int,
+                       event_every: int = 7, cross_share: float = .2, seed: int = 0) -> pd.DataFrame:
+    """Random clean data (see get_synthetic_games) where players only meet their own regional circuit, apart from
+    events every event_every dates where cross_share of the matches are against any player"""
+    data = get_synthetic_games(n_regions*players_per_region, n_dates, games_per_date, seed)
+    rng = np.random.default_rng(seed + 1)
+
+    w_id, l_id = data['WID'].values, data['LID'].values
+    region = w_id // players_per_region*players_per_region
+    # the loser keeps their place within a region but moves to the winner's
+    regional = region + l_id % players_per_region
+    regional = np.where(regional == w_id, region + (w_id + 1) % players_per_region, regional)
+
+    days = (data['inferred_date'] - data['inferred_date'].iloc[0]).dt.days.values
+    cross = (days % event_every == 0) & (rng.random(len(data)) < cross_share)
+    return data.assign(LID=np.where(cross, l_id, regional))
+
+
+def get_games(year_from: int = 2010, year_to: int = 2020) -> Tuple[pd.DataFrame, int, List[str]]:
+    """Clean pipeline data for the years given, falls back to synthetic data of similar size if it can't be loaded
+
+    Returns:
+        Tuple[pd.DataFrame, int, List[str]]: clean data, number of players, surface columns
+    """
+    try:
+        data, player_map, s_categories = get_clean_data(year_from, year_to, save=False)
+        print(f'DATA: {year_from} -> {year_to}, {len(data)} games, {len(player_map)} players')
+        return data, len(player_map), list(s_categories)
+    except Exception as e:
+        logging.debug(f'FALLING BACK TO SYNTHETIC DATA: {e}')
+        n_years = year_to - year_from + 1
+        data = get_synthetic_games(n_players=10_000, n_dates=365*n_years, games_per_date=50)
+        print(f'DATA: synthetic ({n_years} years), {len(data)} games, 10000 players')
+        return data, 10_000, ['Clay', 'Grass', 'Hard']
+
+
+def get_initial_state(n_players: int, n_surfaces: int = 3) -> dict:
+    return dict(player_abs=np.full((n_players, n_surfaces + 1), 1500.),
+                games_played=np.zeros((n_players, n_surfaces + 1)),
+                player_trend=np.zeros((n_players,)),
+                at_abilities=np.full((n_players, n_surfaces + 1), 1500.))
+
+
+def best_time(func: Callable, repeat: int = 3) -> float:
+    """Best wall time (seconds) out of `repeat` calls"""
+    times = []
+    for _ in range(repeat):
+        ts = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - ts)
+    return min(times)
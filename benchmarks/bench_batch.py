@@ -0,0 +1,32 @@
+"""One elo call per parameter candidate vs a single batched pass (elo_batch)
+
+    python -m benchmarks.bench_batch
+"""
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo
+from src.model.batch import elo_batch
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def get_candidates(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [{name: value*rng.uniform(.8, 1.2) for name, value in PARAMS.items()} for _ in range(n)]
+
+
+def main(year_from: int = 2010, year_to: int = 2020, lanes=(1, 16, 64, 256)):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    state = get_initial_state(n_players, len(surfaces))
+
+    t = best_time(lambda: elo(PARAMS, data, **ELO_COLS, surface_cols=surfaces, **state), repeat=1)
+    print(f'     elo: {t:7.2f} sec per candidate')
+
+    for n in lanes:
+        candidates = get_candidates(n)
+        t = best_time(lambda: elo_batch(candidates, data, **ELO_COLS, surface_cols=surfaces, **state), repeat=1)
+        print(f'batch {n:>3}: {t:7.2f} sec total, {t/n:7.3f} sec per candidate')
+
+
+if __name__ == '__main__':
+    main()
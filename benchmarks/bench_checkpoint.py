@@ -0,0 +1,65 @@
+"""Checkpoint spacing vs storage, write overhead and the latency of restoring the state at a past date, then the cost
+of replaying a score correction from the nearest checkpoint vs replaying everything
+
+    python -m benchmarks.bench_checkpoint
+"""
+import os
+import time
+import tempfile
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo, elo_arrays, get_match_arrays, PrimitiveTable
+from src.model.checkpoint import elo_checkpoints, load_checkpoints, get_state_at, replay_corrections
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020, n_lookups: int = 20):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    m = get_match_arrays(data, **ELO_COLS, surface_cols=surfaces)
+    tables = PrimitiveTable(PARAMS, len(surfaces))
+
+    t = best_time(lambda: elo_arrays(PARAMS, m, *get_initial_state(n_players, len(surfaces)).values(),
+                                     tables=tables), repeat=1)
+    print(f'no checkpoints: {t:7.3f} sec replay')
+
+    lookup_dates = np.random.default_rng(0).integers(m.dates[0], m.dates[-1], n_lookups)
+
+    for every in (1, 7, 'week', 30, 90):
+        with tempfile.TemporaryDirectory() as folder:
+            t = best_time(lambda: elo_checkpoints(PARAMS, m, *get_initial_state(n_players, len(surfaces)).values(),
+                                                  folder=folder, every=every, tables=tables), repeat=1)
+            size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+
+            checkpoints = load_checkpoints(folder)
+            ts = time.perf_counter()
+            for date in lookup_dates:
+                get_state_at(PARAMS, m, checkpoints, date, tables=tables)
+            lookup = (time.perf_counter() - ts) / n_lookups
+
+            print(f'every {str(every):>4}: {t:7.3f} sec replay, {len(checkpoints.dates):5d} snapshots, '
+                  f'{size/2**20:8.1f} MB, {lookup*1e3:7.2f} ms per lookup')
+            del checkpoints
+
+    t = best_time(lambda: elo(PARAMS, data, **ELO_COLS, surface_cols=surfaces,
+                              **get_initial_state(n_players, len(surfaces))), repeat=1)
+    print(f'\ncorrection, full replay: {t:7.3f} sec')
+
+    with tempfile.TemporaryDirectory() as folder:
+        elo_checkpoints(PARAMS, m, *get_initial_state(n_players, len(surfaces)).values(), folder=folder, every='week',
+                        tables=tables)
+        checkpoints = load_checkpoints(folder)
+        for days_ago in (7, 30, 365, 5*365):
+            day = data['inferred_date'].max() - np.timedelta64(days_ago, 'D')
+            changes = data[data['inferred_date'] >= day].iloc[:1].copy()
+            changes['LGames'] += 1
+            t = best_time(lambda: replay_corrections(PARAMS, data, changes, checkpoints, **ELO_COLS,
+                                                     surface_cols=surfaces, tables=tables))
+            *_, moved = replay_corrections(PARAMS, data, changes, checkpoints, **ELO_COLS, surface_cols=surfaces,
+                                           tables=tables)
+            print(f'correction {days_ago:5d} days ago: {t:7.3f} sec, {len(moved)} players moved')
+        del checkpoints
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Separate float64 state arrays vs the compact interleaved state (float64 and float32) on a small and a large player
+universe, with memory and drift against the float64 reference
+
+    python -m benchmarks.bench_compact
+"""
+import time
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo_arrays, get_match_arrays, get_compact_state, PrimitiveTable
+from ._data import ELO_COLS, get_synthetic_games, get_initial_state
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+def main():
+    tables = PrimitiveTable(PARAMS, len(SURFACES))
+
+    for n_players in (10_000, 1_000_000):
+        data = get_synthetic_games(n_players=n_players, n_dates=730, games_per_date=250)
+        m = get_match_arrays(data, **ELO_COLS, surface_cols=SURFACES)
+        print(f'{n_players} players, {len(data)} games')
+
+        reference = None
+        for label, dtype in (('separate float64', None), ('compact float64', np.float64),
+                             ('compact float32', np.float32)):
+            def get_state():
+                state = get_initial_state(n_players, len(SURFACES)).values()
+                return list(state) if dtype is None else list(get_compact_state(*state, dtype=dtype))
+
+            # fresh state for each repeat, allocation isn't timed
+            times = []
+            for _ in range(3):
+                state = get_state()
+                ts = time.perf_counter()
+                out = elo_arrays(PARAMS, m, *state, tables=tables)
+                times.append(time.perf_counter() - ts)
+            t = min(times)
+            state_bytes = sum(arr.nbytes for arr in state)
+            if reference is None:
+                reference = out
+            drift = np.abs(out[0] - reference[0]).max()
+            p_drift = np.abs(out[-1] - reference[-1]).max()
+            print(f'  {label:>16}: {t:7.3f} sec, state {state_bytes/2**20:7.1f} MB, '
+                  f'max rating drift {drift:.2e}, max prob drift {p_drift:.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Grouped pandas engine vs date boundary numpy engine, with and without precomputed primitive tables
+
+    python -m benchmarks.bench_engine
+"""
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo, elo_arrays, get_match_arrays, get_day_ordinals, PrimitiveTable
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    n_dates = len(np.unique(get_day_ordinals(data['inferred_date'])))
+
+    results = {}
+    for engine in ('pandas', 'numpy'):
+        def run():
+            results[engine] = elo(PARAMS, data, **ELO_COLS, surface_cols=surfaces,
+                                  **get_initial_state(n_players, len(surfaces)), engine=engine)
+        t = best_time(run)
+        print(f'{engine:>8}: {t:7.3f} sec total, {t/n_dates*1e6:8.1f} us per date ({n_dates} dates)')
+
+    for p_arr, n_arr in zip(results['pandas'], results['numpy']):
+        np.testing.assert_array_equal(p_arr, n_arr)
+    print('outputs identical')
+
+    match_arrays = get_match_arrays(data, **ELO_COLS, surface_cols=surfaces)
+    for label, tables in (('no tables', None), ('tables', PrimitiveTable(PARAMS, len(surfaces)))):
+        t = best_time(lambda: elo_arrays(PARAMS, match_arrays, *get_initial_state(n_players, len(surfaces)).values(),
+                                         tables=tables))
+        print(f'{label:>9}: {t:7.3f} sec total, {t/n_dates*1e6:8.1f} us per date')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Cost of filling a pre match feature matrix during the replay (in memory and memory mapped) over elo alone
+
+    python -m benchmarks.bench_features
+"""
+import os
+import tempfile
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo
+from src.model.features import FeatureMatrix
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020):
+    data, n_players, surfaces = get_games(year_from, year_to)
+
+    def run(features=None):
+        elo(PARAMS, data, **ELO_COLS, surface_cols=surfaces, **get_initial_state(n_players, len(surfaces)),
+            features=features)
+
+    base = best_time(run)
+    print(f'{"elo":>22}: {base:7.3f} sec')
+
+    with tempfile.TemporaryDirectory() as folder:
+        for label, groups, dtype, path in (
+                ('all, float32', None, np.float32, None),
+                ('all, float64', None, np.float64, None),
+                ('prob + ability', ['prob', 'ability'], np.float32, None),
+                ('all, float32, memmap', None, np.float32, os.path.join(folder, 'features.npy'))):
+            features = FeatureMatrix(len(data), surfaces, groups=groups, dtype=dtype, path=path)
+            t = best_time(lambda: run(features))
+            print(f'{label:>22}: {t:7.3f} sec (+{(t - base)/base:5.1%}), {len(features.columns)} columns, '
+                  f'{features.values.nbytes/1e6:6.1f} MB')
+            del features
+
+
+if __name__ == '__main__':
+    main()
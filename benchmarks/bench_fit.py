@@ -0,0 +1,28 @@
+"""Scaling efficiency of fit from 1 to N worker processes, efficiency = T1 / (N * TN)
+
+    python -m benchmarks.bench_fit
+"""
+import os
+
+from src.model.fitting import fit, get_candidates
+from ._data import ELO_COLS, get_games, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020, n_candidates: int = 16):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    candidates = get_candidates(n_candidates)
+    max_workers = os.cpu_count()
+
+    t_1 = None
+    for workers in sorted({1, 2, 4, 8, max_workers}):
+        if workers > max_workers:
+            continue
+        t = best_time(lambda: fit(data, **ELO_COLS, surface_cols=surfaces, n_players=n_players,
+                                  workers=workers, candidates=candidates), repeat=1)
+        t_1 = t_1 or t
+        print(f'{workers:>3} workers: {t:7.2f} sec, {n_candidates/t:6.2f} candidates/sec, '
+              f'speedup {t_1/t:5.2f}, efficiency {t_1/(workers*t):5.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Throughput vs predictive cost of each update granularity (match / day / week) on the same data, to choose one for
+bulk backfills deliberately
+
+    python -m benchmarks.bench_granularity
+"""
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import GRANULARITIES, elo, get_day_ordinals, get_round_bounds
+from src.model.metrics import MetricAccumulator
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    dates = np.sort(get_day_ordinals(data['inferred_date']))
+
+    results = {}
+    for granularity in GRANULARITIES:
+        def run():
+            metrics = MetricAccumulator()
+            elo(PARAMS, data, **ELO_COLS, surface_cols=surfaces, **get_initial_state(n_players, len(surfaces)),
+                granularity=granularity, metrics=metrics, keep_probs=False)
+            results[granularity] = metrics.get_metrics().loc['Overall']
+        # the per match loop is slow without Numba, once is enough
+        t = best_time(run, repeat=1 if granularity == 'match' else 3)
+        results[granularity]['seconds'] = t
+
+        n_rounds = len(dates) if granularity == 'match' else len(get_round_bounds(dates, granularity)) - 1
+        print(f'{granularity:>6}: {n_rounds:7d} updates, {t:7.3f} sec, {len(data)/t:9.0f} matches per sec')
+
+    day = results['day']
+    print('\nrelative to day:')
+    for granularity, overall in results.items():
+        print(f'{granularity:>6}: speedup {day["seconds"]/overall["seconds"]:5.2f}x, log likelihood '
+              f'{overall["log_likelihood"] - day["log_likelihood"]:+9.1f} ({overall["log_likelihood"]:.1f}), brier '
+              f'{overall["brier"] - day["brier"]:+.5f}, accuracy {overall["accuracy"] - day["accuracy"]:+.4f}')
+
+
+if __name__ == '__main__':
+    main()
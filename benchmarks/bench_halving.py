@@ -0,0 +1,35 @@
+"""Full random search vs successive halving over the same candidates: compute, wall time and best candidate found
+
+    python -m benchmarks.bench_halving
+"""
+import time
+import pandas as pd
+
+from src.model.fitting import fit, successive_halving, get_candidates
+from ._data import ELO_COLS, get_games
+
+
+def main(year_from: int = 2010, year_to: int = 2020, n_candidates: int = 81, eta: int = 3, n_rungs: int = 4):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    candidates = get_candidates(n_candidates)
+    score_from = pd.Timestamp(f'{year_from + 1}-01-01')
+
+    ts = time.perf_counter()
+    full = fit(data, **ELO_COLS, surface_cols=surfaces, n_players=n_players, candidates=candidates, workers=1,
+               score_from=score_from)
+    t_full = time.perf_counter() - ts
+
+    ts = time.perf_counter()
+    halving = successive_halving(data, **ELO_COLS, surface_cols=surfaces, n_players=n_players, eta=eta,
+                                 n_rungs=n_rungs, candidates=candidates, score_from=score_from)
+    t_halving = time.perf_counter() - ts
+
+    print(f'full search: {t_full:7.2f} sec, best candidate {full.index[0]} '
+          f'(log likelihood {full["log_likelihood"].iloc[0]:.2f})')
+    print(f'    halving: {t_halving:7.2f} sec, best candidate {halving.index[0]} '
+          f'(log likelihood {halving["log_likelihood"].iloc[0]:.2f})')
+    print(f'speedup {t_full/t_halving:.1f}x, same best: {full.index[0] == halving.index[0]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Rating history: recording cost, storage per dtype and trajectory lookup from the memory mapped files
+
+    python -m benchmarks.bench_history
+"""
+import os
+import time
+import tempfile
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo
+from src.model.history import HistoryRecorder, save_history, load_history, get_trajectory
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020):
+    data, n_players, surfaces = get_games(year_from, year_to)
+
+    def run(history=None):
+        elo(PARAMS, data, **ELO_COLS, surface_cols=surfaces, **get_initial_state(n_players, len(surfaces)),
+            history=history)
+
+    base = best_time(run)
+    print(f'{"elo":>8}: {base:7.3f} sec')
+
+    players = np.random.default_rng(0).integers(0, n_players, 1000)
+    for dtype in (None, np.float16, np.int16):
+        label = 'exact' if dtype is None else dtype.__name__
+        recorders = []
+
+        def record():
+            recorders.append(HistoryRecorder(n_players, dtype))
+            run(recorders[-1])
+        t = best_time(record)
+        history = recorders[-1].get_history()
+
+        with tempfile.TemporaryDirectory() as folder:
+            save_history(history, folder)
+            size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+            loaded = load_history(folder)
+
+            ts = time.perf_counter()
+            for player in players:
+                get_trajectory(loaded, player, surfaces)
+            lookup = (time.perf_counter() - ts)/len(players)
+            del loaded
+
+        print(f'{label:>8}: {t:7.3f} sec (+{(t - base)/base:5.1%}), {len(history.dates)} entries, '
+              f'{size/1e6:6.1f} MB, trajectory lookup {lookup*1e3:5.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
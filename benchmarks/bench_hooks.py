@@ -0,0 +1,75 @@
+"""Cost of observer hooks: the pre hooks round loop vs the no observer path (no dispatch), an empty observer and a
+RoundTimer
+
+    python -m benchmarks.bench_hooks
+"""
+import time
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import (PrimitiveTable, EloRound, get_match_arrays, get_round_bounds, elo_round_arrays,
+                             iter_elo_arrays)
+from src.model.observers import EloObserver, RoundTimer
+from ._data import ELO_COLS, get_games, get_initial_state
+
+
+def iter_plain(params, match_arrays, player_abs, games_played, player_trend, at_abilities, tables, features=None,
+               history=None):
+    """iter_elo_arrays' round loop as it was before observers, the baseline"""
+    m, state = match_arrays, (player_abs, games_played, player_trend, at_abilities)
+    bounds = get_round_bounds(m.dates, 'day')
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        abilities = None if features is None else np.empty((2, end - start))
+        if features is not None:
+            features.update(params, m.order[start:end], m.w_id[start:end], m.l_id[start:end], m.itf[start:end],
+                            player_abs, games_played, player_trend, at_abilities, tables=tables)
+
+        *_, p = elo_round_arrays(
+            params=params, w_id=m.w_id[start:end], w_games=m.w_games[start:end], w_sets=m.w_sets[start:end],
+            l_id=m.l_id[start:end], l_games=m.l_games[start:end], l_sets=m.l_sets[start:end],
+            surfaces=m.surfaces[start:end], itf=m.itf[start:end], player_abs=player_abs,
+            games_played=games_played, player_trend=player_trend, at_abilities=at_abilities, tables=tables,
+            surface_codes=m.surface_codes[start:end], abilities=abilities)
+
+        if features is not None:
+            features.update_predictions(m.order[start:end], p, abilities)
+        if history is not None:
+            history.record(int(m.dates[start]), np.unique(np.concatenate((m.w_id[start:end], m.l_id[start:end]))),
+                           player_abs, games_played, player_trend)
+
+        yield EloRound(int(m.dates[start]), m.order[start:end], p, state)
+
+
+def main(year_from: int = 2010, year_to: int = 2020, repeat: int = 7):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    m = get_match_arrays(data, **ELO_COLS, surface_cols=surfaces)
+    tables = PrimitiveTable(PARAMS, len(surfaces))
+    n_rounds = len(get_round_bounds(m.dates, 'day')) - 1
+
+    runs = {
+        'pre hooks loop': lambda state: iter_plain(PARAMS, m, **state, tables=tables),
+        'no observers': lambda state: iter_elo_arrays(PARAMS, m, **state, tables=tables),
+        'empty observer': lambda state: iter_elo_arrays(PARAMS, m, **state, tables=tables,
+                                                        observers=[EloObserver()]),
+        'RoundTimer': lambda state: iter_elo_arrays(PARAMS, m, **state, tables=tables, observers=[RoundTimer()]),
+    }
+
+    # interleaved so drifting machine load hits every variant alike, best of each
+    times = {label: [] for label in runs}
+    for _ in range(repeat):
+        for label, run in runs.items():
+            state = get_initial_state(n_players, len(surfaces))
+            ts = time.perf_counter()
+            for _ in run(state):
+                pass
+            times[label].append(time.perf_counter() - ts)
+
+    base = min(times['pre hooks loop'])
+    print(f'{"pre hooks loop":>16}: {base:7.3f} sec, {n_rounds} rounds')
+    for label in list(runs)[1:]:
+        t = min(times[label])
+        print(f'{label:>16}: {t:7.3f} sec ({(t - base)/base:+6.1%}), {(t - base)/n_rounds*1e6:+6.2f} us per round')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Memory locality of alphabetical player ids vs ids renumbered by first appearance (elo renumber=True), on synthetic
+multi decade data where players have careers of a few years and ids are unrelated to when they play
+
+    python -m benchmarks.bench_locality
+"""
+import numpy as np
+import pandas as pd
+
+from src.constants import PARAMS
+from src.model.model import (
+    PrimitiveTable, elo, elo_arrays, get_match_arrays, get_date_bounds, get_activity_order)
+from ._data import ELO_COLS, get_synthetic_games, get_initial_state, best_time
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+def get_career_games(n_players: int, n_years: int, games_per_date: int, career_years: int = 5,
+                     seed: int = 0) -> pd.DataFrame:
+    """Synthetic games where each match is between two players whose career spans the date, ids are a random
+    permutation of debut order (like alphabetical ids)"""
+    rng = np.random.default_rng(seed)
+    n_dates, career = 365*n_years, 365*career_years
+    data = get_synthetic_games(n_players=n_players, n_dates=n_dates, games_per_date=games_per_date, seed=seed)
+
+    # debuts sorted, players active on day t are the contiguous debut range (t - career, t]
+    debuts = np.sort(rng.integers(-career, n_dates, n_players))
+    day = np.repeat(np.arange(n_dates), games_per_date)
+    lo, hi = np.searchsorted(debuts, day - career, side='right'), np.searchsorted(debuts, day, side='right')
+    a = lo + (rng.random(len(day))*(hi - lo)).astype(np.int64)
+    b = lo + (a - lo + 1 + (rng.random(len(day))*(hi - lo - 1)).astype(np.int64)) % (hi - lo)
+
+    public_ids = rng.permutation(n_players)
+    return data.assign(WID=public_ids[a], LID=public_ids[b])
+
+
+def get_round_footprint(match_arrays, row_bytes: int, block_bytes: int) -> float:
+    """Mean number of distinct memory blocks (cache lines, pages) of a state array a round touches"""
+    m = match_arrays
+    bounds = get_date_bounds(m.dates)
+    blocks = [len(np.unique(np.concatenate((m.w_id[start:end], m.l_id[start:end]))*row_bytes // block_bytes))
+              for start, end in zip(bounds[:-1], bounds[1:])]
+    return float(np.mean(blocks))
+
+
+def main(n_players: int = 100_000, n_years: int = 20, games_per_date: int = 50):
+    data = get_career_games(n_players, n_years, games_per_date)
+    print(f'DATA: synthetic ({n_years} years), {len(data)} games, {n_players} players')
+    row_bytes = (len(SURFACES) + 1)*8
+
+    m = get_match_arrays(data, **ELO_COLS, surface_cols=SURFACES)
+    internal_ids = np.argsort(get_activity_order(m.dates, m.w_id, m.l_id, n_players))
+    renumbered = m._replace(w_id=internal_ids[m.w_id], l_id=internal_ids[m.l_id])
+    tables = PrimitiveTable(PARAMS, len(SURFACES))
+
+    for label, arrays in (('alphabetical', m), ('renumbered', renumbered)):
+        lines = get_round_footprint(arrays, row_bytes, 64)
+        pages = get_round_footprint(arrays, row_bytes, 4096)
+        t = best_time(lambda: elo_arrays(PARAMS, arrays, *get_initial_state(n_players, len(SURFACES)).values(),
+                                         tables=tables))
+        print(f'{label:>12}: per round {lines:6.1f} cache lines, {pages:6.1f} pages of player_abs, elo_arrays '
+              f'{t:6.3f} sec')
+
+    for renumber in (False, True):
+        t = best_time(lambda: elo(PARAMS, data, **ELO_COLS, surface_cols=SURFACES,
+                                  **get_initial_state(n_players, len(SURFACES)), renumber=renumber))
+        # end to end, renumbering and restoring the state included
+        print(f'elo renumber={renumber!s:>5}: {t:6.3f} sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Peak traced memory of the modelling step of pipeline.run: copied, re-sorted train/test frames with elo copying
+state vs positional views with elo running in place into one prediction buffer
+
+    python -m benchmarks.bench_memory
+"""
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from src.constants import PARAMS, SOURCE_COL
+from src.model.model import STATE_FIELDS, elo
+from src.model.fitting import get_initial_state
+from ._data import get_synthetic_games
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+ELO_COLS = dict(params=PARAMS, date_col='inferred_date', w_id_col='WID', w_games_col='WGames', w_sets_col='WSets',
+                l_id_col='LID', l_games_col='LGames', l_sets_col='LSets', surface_cols=SURFACES, itf_col=SOURCE_COL)
+
+
+def copied(clean_data: pd.DataFrame, n_players: int, date_cutoff: pd.Timestamp):
+    # as pipeline.run was, with a stable sort so match order within a date (and so collision waves) is the same
+    train_data = clean_data[clean_data['inferred_date'] <= date_cutoff].copy(
+        deep=True).sort_values(by='inferred_date', kind='stable').reset_index(drop=True)
+    test_data = clean_data[clean_data['inferred_date'] > date_cutoff].copy(
+        deep=True).sort_values(by='inferred_date', kind='stable').reset_index(drop=True)
+
+    *state, _ = elo(**ELO_COLS, data=train_data,
+                    **dict(zip(STATE_FIELDS, get_initial_state(n_players, len(SURFACES) + 1))))
+    *_, test_predictions = elo(**ELO_COLS, data=test_data, **dict(zip(STATE_FIELDS, state)))
+    test_data['p'] = test_predictions
+    return test_predictions
+
+
+def views(clean_data: pd.DataFrame, n_players: int, date_cutoff: pd.Timestamp):
+    cutoff = clean_data['inferred_date'].searchsorted(date_cutoff, side='right')
+    train_data, test_data = clean_data.iloc[:cutoff], clean_data.iloc[cutoff:]
+
+    state = dict(zip(STATE_FIELDS, get_initial_state(n_players, len(SURFACES) + 1)))
+    predictions = np.empty((len(clean_data),))
+    elo(**ELO_COLS, data=train_data, **state, inplace=True, out=predictions[:cutoff])
+    *_, test_predictions = elo(**ELO_COLS, data=test_data, **state, inplace=True, out=predictions[cutoff:])
+    return test_predictions
+
+
+def main(n_years: int = 21, test_years: int = 2):
+    # 2000 -> 2020 sized
+    data = get_synthetic_games(n_players=10_000, n_dates=365*n_years, games_per_date=50)
+    date_cutoff = data['inferred_date'].iloc[0] + pd.Timedelta(days=365*(n_years - test_years))
+    print(f'DATA: synthetic ({n_years} years), {len(data)} games, {data.memory_usage(deep=True).sum()/2**20:.1f} MB')
+
+    results = {}
+    for label, run in (('copied', copied), ('views', views)):
+        tracemalloc.start()
+        results[label] = run(data, 10_000, date_cutoff)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{label:>7}: peak {peak/2**20:7.1f} MB above the clean data')
+
+    np.testing.assert_array_equal(results['copied'], results['views'])
+    print('test predictions identical')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Experimental time sharded replay (elo_parallel): final state error against the serial replay and wall clock
+speedup at 1/2/4/8 workers (one era per worker), converged (tol) and speculative (a single pass, or two). With fewer
+cores than workers eras queue up, so the speedup the critical path allows (initial guess plus the average era of each
+pass) is shown too
+
+    python -m benchmarks.bench_parallel
+"""
+import os
+import time
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import PrimitiveTable, get_match_arrays, elo_arrays
+from src.model.parallel import elo_parallel
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020, tol: float = 1e-6):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    m = get_match_arrays(data, **ELO_COLS, surface_cols=surfaces)
+    tables = PrimitiveTable(PARAMS, len(surfaces))
+    print(f'{os.cpu_count()} cores')
+
+    results = {}
+
+    def serial():
+        results['serial'] = elo_arrays(PARAMS, m, *get_initial_state(n_players, len(surfaces)).values(),
+                                       tables=tables)
+    base = best_time(serial)
+    *expected, expected_probs = results['serial']
+    print(f'{"serial":>24}: {base:7.3f} sec')
+
+    for workers in (1, 2, 4, 8):
+        for label, max_passes in (('converged', None), ('1 pass', 1), ('2 passes', 2)):
+            ts = time.perf_counter()
+            *state, probs, passes = elo_parallel(PARAMS, m, *get_initial_state(n_players, len(surfaces)).values(),
+                                                 workers=workers, tol=tol, max_passes=max_passes, tables=tables)
+            t = time.perf_counter() - ts
+
+            error = np.abs(state[0] - expected[0])
+            likelihood = np.log(probs).sum() - np.log(expected_probs).sum()
+            critical = passes['seconds'].iloc[0] + (passes['seconds'] / passes['eras_run']).iloc[1:].sum()
+            print(f'{f"{workers} workers, {label}":>24}: {t:7.3f} sec ({base/t:5.2f}x, critical path '
+                  f'{base/critical:5.2f}x), {len(passes) - 1} passes, '
+                  f'{passes["eras_run"].sum():3d} era runs, ability error max {error.max():8.2e} '
+                  f'mean {error.mean():8.2e}, log likelihood {likelihood:+8.2f}')
+
+
+if __name__ == '__main__':
+    main()
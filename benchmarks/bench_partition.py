@@ -0,0 +1,60 @@
+"""Player graph partitioned replay (elo_partitioned) on regional circuits that only meet at weekly events, for the
+numpy and sequential engines: check it is bit identical to the serial engine, wall clock speedup at 1/2/4/8 workers and
+the parallelism and barrier overhead per season. Achieved parallelism is capped by the cores available, available
+parallelism (and the speedup the critical path allows) is what enough cores would get
+
+    python -m benchmarks.bench_partition
+"""
+import os
+import time
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import PrimitiveTable, get_match_arrays, elo_arrays
+from src.model.partition import get_player_communities, elo_partitioned, get_partition_report
+from ._data import ELO_COLS, get_regional_games, get_initial_state, best_time
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+def main(n_regions: int = 8, players_per_region: int = 1250, n_years: int = 11, games_per_date: int = 50,
+         engines: tuple = ('numpy', 'sequential')):
+    n_players = n_regions*players_per_region
+    data = get_regional_games(n_regions, players_per_region, n_dates=365*n_years, games_per_date=games_per_date)
+    m = get_match_arrays(data, **ELO_COLS, surface_cols=SURFACES)
+    tables = PrimitiveTable(PARAMS, len(SURFACES))
+
+    ts = time.perf_counter()
+    communities = get_player_communities(m.w_id, m.l_id, n_players)
+    print(f'DATA: synthetic, {len(data)} games, {n_players} players in {n_regions} regions, {os.cpu_count()} cores')
+    print(f'{communities.max() + 1} communities found in {time.perf_counter() - ts:.3f} sec')
+
+    for engine in engines:
+        sequential, results = engine == 'sequential', {}
+
+        def serial():
+            results['serial'] = elo_arrays(PARAMS, m, *get_initial_state(n_players, len(SURFACES)).values(),
+                                           tables=tables, sequential=sequential)
+        base = best_time(serial, repeat=1 if sequential else 3)
+        print(f'{engine} engine\n{"serial":>10}: {base:7.3f} sec')
+
+        for workers in (1, 2, 4, 8):
+            ts = time.perf_counter()
+            *state, steps = elo_partitioned(PARAMS, m, *get_initial_state(n_players, len(SURFACES)).values(),
+                                            workers=workers, sequential=sequential, tables=tables)
+            t = time.perf_counter() - ts
+
+            identical = all(np.array_equal(a, e) for a, e in zip(state, results['serial']))
+            parallel, sync = steps[steps['kind'] == 'parallel'], steps[steps['kind'] == 'sync']
+            critical = parallel['critical'].sum() + sync['seconds'].sum()
+            achieved = parallel['busy'].sum()/parallel['seconds'].sum()
+            available = parallel['busy'].sum()/parallel['critical'].sum()
+            print(f'{f"{workers} workers":>10}: {t:7.3f} sec ({base/t:5.2f}x, critical path {base/critical:5.2f}x), '
+                  f'bit identical {identical}, parallelism achieved {achieved:4.2f} available {available:4.2f}, '
+                  f'{len(sync)} barrier dates {sync["seconds"].sum()/steps["seconds"].sum():5.1%} of the time')
+
+        print(get_partition_report(steps).round(3).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Grouped (per date) numpy engine vs the per match sequential engine (compiled with Numba when installed), throughput
+and how far apart the predictions of the two update orders are
+
+    python -m benchmarks.bench_sequential
+"""
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import PrimitiveTable, get_match_arrays, get_collision_count, elo_arrays
+from src.model.sequential import NUMBA_AVAILABLE
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    m = get_match_arrays(data, **ELO_COLS, surface_cols=surfaces)
+    tables = PrimitiveTable(PARAMS, len(surfaces))
+    print(f'{get_collision_count(m.dates, m.w_id, m.l_id)} repeat player appearances within a date')
+    print(f'sequential engine: {"numba" if NUMBA_AVAILABLE else "plain python (numba not installed)"}')
+
+    results = {}
+    for label, sequential in (('grouped', False), ('sequential', True)):
+        def run():
+            results[label] = elo_arrays(PARAMS, m, *get_initial_state(n_players, len(surfaces)).values(),
+                                        tables=tables, sequential=sequential)
+        if sequential and NUMBA_AVAILABLE:
+            # first call compiles (or loads the cache)
+            run()
+        t = best_time(run)
+        print(f'{label:>10}: {t:7.3f} sec total, {len(m.dates)/t:10.0f} matches per sec')
+
+    grouped, sequential = results['grouped'][-1], results['sequential'][-1]
+    print(f'max |probs difference|: {np.abs(grouped - sequential).max():.2e}, '
+          f'log likelihood grouped {np.log(grouped).sum():.1f}, sequential {np.log(sequential).sum():.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Bringing ratings up to date with one new day: full replay vs EloState load + ingest, plus save/load cost
+
+    python -m benchmarks.bench_state
+"""
+import os
+import time
+import tempfile
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo
+from src.model.state import EloState
+from ._data import ELO_COLS, get_games, get_initial_state, best_time
+
+
+def main(year_from: int = 2010, year_to: int = 2020):
+    data, n_players, surfaces = get_games(year_from, year_to)
+    data = data.assign(winner_name='P' + data['WID'].astype(str), loser_name='P' + data['LID'].astype(str))
+
+    last_day = data['inferred_date'] == data['inferred_date'].max()
+    history, new_day = data[~last_day], data[last_day]
+
+    t = best_time(lambda: elo(PARAMS, data, **ELO_COLS, surface_cols=surfaces,
+                              **get_initial_state(n_players, len(surfaces))), repeat=1)
+    print(f'   full replay: {t:9.4f} sec')
+
+    state = EloState(surfaces)
+    state.ingest(history)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'state.npz')
+        print(f'          save: {best_time(lambda: state.save(path)):9.4f} sec '
+              f'({os.path.getsize(path)/2**20:.1f} MB, {state.n_players} players)')
+        print(f'          load: {best_time(lambda: EloState.load(path)):9.4f} sec')
+
+        times, probs = [], None
+        for _ in range(3):
+            ts = time.perf_counter()
+            probs = EloState.load(path).ingest(new_day)
+            times.append(time.perf_counter() - ts)
+        print(f' load + ingest: {min(times):9.4f} sec ({len(new_day)} matches)')
+
+    *_, expected = elo(PARAMS, data, **ELO_COLS, surface_cols=surfaces, **get_initial_state(n_players, len(surfaces)))
+    np.testing.assert_allclose(probs, expected[last_day.values])
+    print('new day predictions identical to full replay')
+
+
+if __name__ == '__main__':
+    main()
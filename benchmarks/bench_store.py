@@ -0,0 +1,43 @@
+"""In memory state vs memory mapped state files (MemmapState), without and with the undo journal committing every
+date, and durably (synced to disk) every date or every 30 dates, on a large player universe
+
+    python -m benchmarks.bench_store
+"""
+import os
+import tempfile
+
+from src.constants import PARAMS
+from src.model.model import STATE_FIELDS, elo
+from src.model.store import MemmapState
+from ._data import ELO_COLS, get_synthetic_games, get_initial_state, best_time
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+def main(n_players: int = 500_000, n_dates: int = 2000, games_per_date: int = 100):
+    data = get_synthetic_games(n_players=n_players, n_dates=n_dates, games_per_date=games_per_date)
+    print(f'DATA: synthetic, {len(data)} games, {n_players} players')
+
+    def run(state, observers=()):
+        elo(PARAMS, data, **ELO_COLS, surface_cols=SURFACES, **dict(zip(STATE_FIELDS, state)), inplace=True,
+            keep_probs=False, observers=observers)
+
+    base = best_time(lambda: run(get_initial_state(n_players, len(SURFACES)).values()))
+    print(f'{"in memory":>20}: {base:7.3f} sec')
+
+    with tempfile.TemporaryDirectory() as folder:
+        for label, flush_every, durable in (('memmap', None, False), ('journal, every date', 1, False),
+                                            ('durable, every date', 1, True), ('durable, every 30', 30, True)):
+            def replay():
+                store = MemmapState.create(folder, n_players, len(SURFACES) + 1)
+                journal = [] if flush_every is None else [
+                    store.journal(data['WID'].values, data['LID'].values, flush_every=flush_every, durable=durable)]
+                run(store.state, journal)
+                store.flush()
+            t = best_time(replay)
+            size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+            print(f'{label:>20}: {t:7.3f} sec ({(t - base)/base:+7.1%}), {size/1e6:6.1f} MB on disk')
+
+
+if __name__ == '__main__':
+    main()
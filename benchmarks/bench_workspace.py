@@ -0,0 +1,59 @@
+"""Per round temporaries (tracemalloc peak above the state, per round) and time, with and without a RoundWorkspace
+
+    python -m benchmarks.bench_workspace
+"""
+import time
+import tracemalloc
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import (
+    PrimitiveTable, RoundWorkspace, get_match_arrays, get_date_bounds, elo_round_arrays, elo_round_workspace,
+    elo_arrays)
+from ._data import ELO_COLS, get_synthetic_games, get_initial_state, best_time
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+def get_round_peaks(round_function, m, tables, n_players: int) -> np.array:
+    """Bytes allocated above what was live before each round (the round's temporaries)"""
+    state = list(get_initial_state(n_players, len(SURFACES)).values())
+    bounds = get_date_bounds(m.dates)
+    peaks = np.empty(len(bounds) - 1)
+
+    tracemalloc.start()
+    for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        round_function(
+            params=PARAMS, w_id=m.w_id[start:end], w_games=m.w_games[start:end], w_sets=m.w_sets[start:end],
+            l_id=m.l_id[start:end], l_games=m.l_games[start:end], l_sets=m.l_sets[start:end],
+            surfaces=m.surfaces[start:end], itf=m.itf[start:end], player_abs=state[0], games_played=state[1],
+            player_trend=state[2], at_abilities=state[3], tables=tables, surface_codes=m.surface_codes[start:end])
+        peaks[i] = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return peaks
+
+
+def main(n_players: int = 10_000, n_dates: int = 4000):
+    tables = PrimitiveTable(PARAMS, len(SURFACES))
+
+    for games_per_date in (2, 50, 500):
+        data = get_synthetic_games(n_players=n_players, n_dates=n_dates, games_per_date=games_per_date)
+        m = get_match_arrays(data, **ELO_COLS, surface_cols=SURFACES)
+        workspace = RoundWorkspace.for_matches(m)
+        print(f'{games_per_date} games per date, {n_dates} dates')
+
+        for label, ws in (('allocating', None), ('workspace', workspace)):
+            round_function = elo_round_arrays if ws is None else (
+                lambda **kwargs: elo_round_workspace(**kwargs, workspace=ws))
+            peaks = get_round_peaks(round_function, m, tables, n_players)
+
+            t = best_time(lambda: elo_arrays(PARAMS, m, *get_initial_state(n_players, len(SURFACES)).values(),
+                                             tables=tables, workspace=ws))
+            print(f'  {label:>10}: {t/n_dates*1e6:7.1f} us per round, temporaries per round: median '
+                  f'{np.median(peaks):9.0f} B, max {peaks.max():9.0f} B')
+
+
+if __name__ == '__main__':
+    main()
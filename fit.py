@@ -0,0 +1,33 @@
+import sys
+import getopt
+import logging
+from datetime import datetime
+
+from src.pipeline import tune
+from src.model.fitting import work_journal
+
+# log to file
+logging.basicConfig(level=logging.DEBUG,
+                    filename=f'logs/PIPELINE_FIT: {datetime.now()}.log',
+                    format=' %(asctime)s - %(levelname)s - %(message)s',)
+
+
+if __name__ == "__main__":
+    args = {arg: val for (arg, val) in getopt.getopt(
+        sys.argv[1:], '', ['yf=', 'yt=', 'burn=', 'n=', 'workers=', 'seed=', 'journal=', 'work=', 'method='])[0]}
+
+    logging.debug(f'ARGS: {args}')
+
+    # join a sweep another machine started (journal on shared filesystem)
+    if '--work' in args:
+        work_journal(args['--journal'], args['--work'])
+        sys.exit()
+
+    tune(year_from=int(args['--yf']),
+         year_to=int(args['--yt']),
+         burn_in=int(args.get('--burn', 1)),
+         n_candidates=int(args.get('--n', 100)),
+         workers=int(args['--workers']) if '--workers' in args else None,
+         seed=int(args.get('--seed', 0)),
+         journal=args.get('--journal'),
+         method=args.get('--method', 'random'))
@@ -16,10 +16,11 @@ logging.getLogger('matplotlib.font_manager').disabled = True
 
 if __name__ == "__main__":
     # run()
-    args = {arg: val for (arg, val) in getopt.getopt(sys.argv[1:], '', ['yf=', 'yt=', 'ts='])[0]}
+    args = {arg: val for (arg, val) in getopt.getopt(sys.argv[1:], '', ['yf=', 'yt=', 'ts=', 'state='])[0]}
 
     logging.debug(f'ARGS: {args}')
 
     run(year_from=int(args['--yf']),
         year_to=int(args['--yt']),
-        test_size=int(args['--ts']))
+        test_size=int(args['--ts']),
+        state_folder=args.get('--state'))
@@ -51,3 +51,17 @@ PARAMS = {
     'trend_weight': .0736,
     'all_time_weight': .598,
 }
+
+# (low, high) search space used when fitting PARAMS, low == high fixes a parameter
+PARAM_BOUNDS = {
+    'K': (100., 400.),
+    'offset': (1., 1.),
+    'shape': (.1, .6),
+    'surface_weight': (0., .5),
+    'itf_deduction': (0., .6),
+    'p': (.5, .6),
+    'straight_sets_boost': (0., .2),
+    'trend_rate': (0., .6),
+    'trend_weight': (0., .2),
+    'all_time_weight': (0., .9),
+}
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+def get_synthetic_games(n_players: int, n_dates: int, games_per_date: int, seed: int = 0,
+                        latent_skill: bool = True) -> pd.DataFrame:
+    """Random but well formed clean data (same columns as the pipeline), sorted by date with a RangeIndex
+
+    Args:
+        n_players (int): number of players
+        n_dates (int): number of consecutive dates
+        games_per_date (int): matches on each date
+        seed (int): random seed
+        latent_skill (bool): players have a latent skill deciding who wins so ratings carry signal (parameter
+            searches and accuracy comparisons are meaningful), winners are random otherwise
+
+    Returns:
+        pd.DataFrame: clean data
+    """
+    rng = np.random.default_rng(seed)
+    n = n_dates*games_per_date
+
+    dates = pd.Timestamp('2010-01-04') + pd.to_timedelta(np.repeat(np.arange(n_dates), games_per_date), unit='day')
+
+    if latent_skill:
+        skill = rng.normal(0, 1, n_players)
+        a_id = rng.integers(0, n_players, n)
+        b_id = (a_id + rng.integers(1, n_players, n)) % n_players
+        a_wins = rng.random(n) < 1/(1 + np.exp(-(skill[a_id] - skill[b_id])))
+        w_id, l_id = np.where(a_wins, a_id, b_id), np.where(a_wins, b_id, a_id)
+    else:
+        w_id = rng.integers(0, n_players, n)
+        l_id = (w_id + rng.integers(1, n_players, n)) % n_players
+
+    surface = rng.integers(0, 3, n)
+    l_sets = rng.integers(0, 2, n)
+
+    return pd.DataFrame({
+        'inferred_date': dates,
+        'WID': w_id,
+        'LID': l_id,
+        'Clay': (surface == 0).astype(np.uint8),
+        'Grass': (surface == 1).astype(np.uint8),
+        'Hard': (surface == 2).astype(np.uint8),
+        'WGames': 12. + rng.integers(0, 7, n) + 6*l_sets,
+        'WSets': 2.,
+        'LGames': rng.integers(0, 11, n).astype(float),
+        'LSets': l_sets.astype(float),
+        'source': np.where(rng.random(n) < .6, 'I', 'W'),
+    })
@@ -0,0 +1,176 @@
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+import pandas as pd
+
+from .model import MatchArrays, get_match_arrays, get_date_bounds, elo_round_arrays, get_log_likelihood
+
+# number of dims each parameter needs so it broadcasts against the arrays it's used with inside elo_round_arrays,
+# 3 -> (P, matches, surfaces), 2 -> (P, matches)
+PARAM_DIMS = {
+    'K': 3,
+    'offset': 3,
+    'shape': 3,
+    'surface_weight': 3,
+    'itf_deduction': 3,
+    'p': 2,
+    'straight_sets_boost': 2,
+    'trend_rate': 2,
+    'trend_weight': 2,
+    'all_time_weight': 2,
+}
+
+
+# (max_round, n_abilities + 1) float64 arrays a lane holds at once inside elo_round_arrays (gathers, surface weight
+# and binomial broadcasts, k factors), measured peak is ~6
+ROUND_TEMPORARIES = 8
+
+
+def stack_params(params: List[Dict[str, float]]) -> Dict[str, np.array]:
+    """Stacks P parameter sets into a dictionary of (P,) arrays
+
+    Args:
+        params (List[Dict[str, float]]): ELO model parameter sets
+
+    Returns:
+        Dict[str, np.array]: parameter name -> value for each lane
+    """
+    return {name: np.array([p[name] for p in params], dtype=float) for name in PARAM_DIMS}
+
+
+def get_lane_params(params: Dict[str, np.array]) -> Dict[str, np.array]:
+    """Reshapes stacked (P,) parameters so each broadcasts along the lane (first) axis inside elo_round_arrays
+
+    Args:
+        params (Dict[str, np.array]): stacked parameters (see stack_params)
+
+    Returns:
+        Dict[str, np.array]: reshaped parameters
+    """
+    return {name: np.asarray(params[name], dtype=float).reshape((-1,) + (1,)*(dims - 1))
+            for name, dims in PARAM_DIMS.items()}
+
+
+def get_lane_bytes(n_players: int, n_abilities: int, n_matches: int, max_round: int = 0) -> int:
+    """Approximate memory (bytes) a single parameter lane needs: state, predictions and the largest round's temporaries
+
+    Args:
+        n_players (int): number of players
+        n_abilities (int): number of abilities per player (surfaces + base)
+        n_matches (int): number of matches
+        max_round (int): most matches in a round (date), see get_date_bounds
+
+    Returns:
+        int: bytes per lane
+    """
+    return 8*(n_players*(3*n_abilities + 1) + n_matches + ROUND_TEMPORARIES*max_round*(n_abilities + 1))
+
+
+def elo_batch_arrays(params: Dict[str, np.array],
+                     match_arrays: MatchArrays,
+                     player_abs: np.array,
+                     games_played: np.array,
+                     player_trend: np.array,
+                     at_abilities: np.array,
+                     start: int = 0,
+                     end: Optional[int] = None) -> Tuple[np.array]:
+    """Runs parameter lanes over the sorted matches [start, end), player state (P, ...) is updated IN PLACE so a
+    later call can resume from where this one stopped. start and end must fall on date boundaries
+
+    Args:
+        params (Dict[str, np.array]): stacked parameters (see stack_params)
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        player_abs (np.array): current player abilities (P, n_players, n_abilities)
+        games_played (np.array): games played previously (P, n_players, n_abilities)
+        player_trend (np.array): current trend (P, n_players)
+        at_abilities (np.array): all time max abilities (P, n_players, n_abilities)
+        start (int): first match (sorted position)
+        end (Optional[int]): stop before this match (sorted position), last if None
+
+    Returns:
+        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs (P, end - start) sorted
+    """
+    m = match_arrays
+    end = len(m.dates) if end is None else end
+    lane_params = get_lane_params(params)
+
+    bounds = get_date_bounds(m.dates[start:end]) + start
+    probs = np.empty((len(player_abs), end - start))
+
+    for r_start, r_end in zip(bounds[:-1], bounds[1:]):
+
+        player_abs, games_played, player_trend, at_abilities, p = elo_round_arrays(
+            params=lane_params, w_id=m.w_id[r_start:r_end], w_games=m.w_games[r_start:r_end],
+            w_sets=m.w_sets[r_start:r_end], l_id=m.l_id[r_start:r_end], l_games=m.l_games[r_start:r_end],
+            l_sets=m.l_sets[r_start:r_end], surfaces=m.surfaces[r_start:r_end], itf=m.itf[r_start:r_end],
+            player_abs=player_abs, games_played=games_played, player_trend=player_trend, at_abilities=at_abilities)
+
+        probs[:, r_start - start:r_end - start] = p
+
+    return player_abs, games_played, player_trend, at_abilities, probs
+
+
+def elo_batch(params: List[Dict[str, float]],
+              data: pd.DataFrame,
+              date_col: str,
+              w_id_col: str,
+              w_games_col: str,
+              w_sets_col: str,
+              l_id_col: str,
+              l_games_col: str,
+              l_sets_col: str,
+              surface_cols: List[str],
+              itf_col: str,
+              player_abs: np.array,
+              games_played: np.array,
+              player_trend: np.array,
+              at_abilities: np.array,
+              max_bytes: int = 2**30) -> Tuple[np.array]:
+    """Runs the ELO model for many parameter sets in a single pass over the data, state is held as
+    (P, n_players, n_surfaces + 1) arrays and each parameter set is a lane along the first axis
+
+    Args:
+        params (List[Dict[str, float]]): P ELO model parameter sets
+        data (pd.DataFrame): Match dataframe
+        date_col (str): Column with date
+        w_id_col (str): Column with winner ids
+        w_games_col (str): Columns with games won by winner
+        w_sets_col (str): Columns with sets won by winner
+        l_id_col (str): Column with loser ids
+        l_games_col (str): Columns with games won by loser
+        l_sets_col (str): Columns with games won by loser
+        surface_cols (List[str]): Columns of 1 hot encoding of surfaces
+        itf_col (str): Column with bool indicator if game on itf circuit
+        player_abs (np.array): initial player abilities (shared by every lane)
+        games_played (np.array): initial games played (shared by every lane)
+        player_trend (np.array): initial trend (shared by every lane)
+        at_abilities (np.array): initial all time max abilities (shared by every lane)
+        max_bytes (int): memory cap, lanes are run in chunks small enough to fit
+
+    Returns:
+        Tuple[np.array]: probs (P, n_matches) in data order, log likelihood (P,)
+    """
+    m = get_match_arrays(
+        data=data, date_col=date_col, w_id_col=w_id_col, w_games_col=w_games_col, w_sets_col=w_sets_col,
+        l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col, surface_cols=surface_cols,
+        itf_col=itf_col)
+
+    stacked = stack_params(params)
+    n_lanes = len(params)
+    max_round = int(np.diff(get_date_bounds(m.dates)).max(initial=0))
+    chunk = max(1, max_bytes // get_lane_bytes(*player_abs.shape, len(data), max_round))
+
+    overall_probs = np.empty((n_lanes, len(data)))
+
+    for lane_from in range(0, n_lanes, chunk):
+        lanes = slice(lane_from, min(lane_from + chunk, n_lanes))
+        size = lanes.stop - lanes.start
+
+        *_, overall_probs[lanes, m.order] = elo_batch_arrays(
+            params={name: values[lanes] for name, values in stacked.items()}, match_arrays=m,
+            player_abs=np.repeat(player_abs[None], size, axis=0).astype(float),
+            games_played=np.repeat(games_played[None], size, axis=0).astype(float),
+            player_trend=np.repeat(player_trend[None], size, axis=0).astype(float),
+            at_abilities=np.repeat(at_abilities[None], size, axis=0).astype(float))
+
+    # probs are always from the winners perspective
+    return overall_probs, get_log_likelihood(overall_probs, 1, axis=1)
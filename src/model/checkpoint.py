@@ -0,0 +1,225 @@
+from typing import List, Dict, Tuple, Union, Optional, NamedTuple
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+from .model import (
+    STATE_FIELDS, MatchArrays, PrimitiveTable, get_match_arrays, get_day_ordinals, get_date_bounds, get_week_ordinals,
+    get_match_slice, elo_arrays)
+
+
+class Checkpoints(NamedTuple):
+    """Player state snapshots, snapshot i is the state before the match at sorted position positions[i] (the start of
+    day dates[i]), the last snapshot is the final state"""
+    dates: np.array
+    positions: np.array
+    player_abs: np.array
+    games_played: np.array
+    player_trend: np.array
+    at_abilities: np.array
+
+
+def get_checkpoint_positions(dates: np.array, every: Union[int, str] = 7) -> np.array:
+    """Sorted match positions snapshots are taken at, always the first match and the end
+
+    Args:
+        dates (np.array): sorted dates (day ordinals, see get_day_ordinals)
+        every (Union[int, str]): number of dates between snapshots or `week` for the first date of each tournament
+            (Monday to Sunday) week
+
+    Returns:
+        np.array: snapshot positions
+    """
+    starts = get_date_bounds(dates)[:-1]
+    if not len(dates):
+        starts = starts[:0]
+    elif every == 'week':
+        weeks = get_week_ordinals(dates[starts])
+        starts = starts[np.concatenate(([True], weeks[1:] != weeks[:-1]))]
+    elif isinstance(every, (int, np.integer)) and every > 0:
+        starts = starts[::every]
+    else:
+        raise ValueError(f'Unknown checkpoint spacing: {every}')
+
+    return np.append(starts, len(dates)).astype(np.int64)
+
+
+def elo_checkpoints(params: Dict[str, float],
+                    match_arrays: MatchArrays,
+                    player_abs: np.array,
+                    games_played: np.array,
+                    player_trend: np.array,
+                    at_abilities: np.array,
+                    folder: str,
+                    every: Union[int, str] = 7,
+                    tables: Optional[PrimitiveTable] = None) -> Tuple[np.array]:
+    """Same as elo_arrays, also writing state snapshots to memory mapped .npy files in folder. Closer snapshots make
+    get_state_at faster at the cost of storage, (n_players * (3 * n_abilities + 1) * 8) bytes per snapshot
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        folder (str): folder to write snapshots to (created if needed)
+        every (Union[int, str]): snapshot spacing (see get_checkpoint_positions)
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
+
+    Returns:
+        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs (original data order)
+    """
+    m = match_arrays
+    os.makedirs(folder, exist_ok=True)
+
+    positions = get_checkpoint_positions(m.dates, every)
+    # the final snapshot is keyed to the day after the last match
+    dates = np.append(m.dates[positions[:-1]], m.dates[-1] + 1 if len(m.dates) else 0).astype(np.int32)
+    np.save(os.path.join(folder, 'positions.npy'), positions)
+    np.save(os.path.join(folder, 'dates.npy'), dates)
+
+    state = dict(zip(STATE_FIELDS, (player_abs, games_played, player_trend, at_abilities)))
+    snapshots = {field: np.lib.format.open_memmap(os.path.join(folder, f'{field}.npy'), mode='w+', dtype=float,
+                                                  shape=(len(positions),) + values.shape)
+                 for field, values in state.items()}
+
+    overall_probs = np.empty((len(m.dates),))
+
+    for i, (start, end) in enumerate(zip(positions[:-1], positions[1:])):
+        for field, values in state.items():
+            snapshots[field][i] = values
+
+        *_, overall_probs[m.order[start:end]] = elo_arrays(
+            params, get_match_slice(m, start, end), *state.values(), tables=tables)
+
+    for field, values in state.items():
+        snapshots[field][-1] = values
+        snapshots[field].flush()
+
+    logging.info(f'CHECKPOINTS: {len(positions)} snapshots written to {folder}')
+    return player_abs, games_played, player_trend, at_abilities, overall_probs
+
+
+def load_checkpoints(folder: str) -> Checkpoints:
+    """Memory maps (read only) snapshots written by elo_checkpoints, nothing is read until a snapshot is used"""
+    return Checkpoints(**{field: np.load(os.path.join(folder, f'{field}.npy'), mmap_mode='r')
+                          for field in Checkpoints._fields})
+
+
+def get_checkpoint_index(checkpoints: Checkpoints, date: int) -> int:
+    """Latest snapshot at or before the start of date
+
+    Args:
+        checkpoints (Checkpoints): snapshots (see load_checkpoints)
+        date (int): day ordinal
+
+    Returns:
+        int: snapshot index
+    """
+    return max(int(np.searchsorted(checkpoints.dates, date, side='right')) - 1, 0)
+
+
+def get_state_at(params: Dict[str, float],
+                 match_arrays: MatchArrays,
+                 checkpoints: Checkpoints,
+                 date: int,
+                 tables: Optional[PrimitiveTable] = None) -> Tuple[np.array]:
+    """Player state at the start of date (before any match on it), restored from the nearest earlier snapshot and
+    replaying at most the snapshot spacing. match_arrays must be the ones the snapshots were written from
+
+    Args:
+        params (Dict[str, float]): ELO model parameters the snapshots were written with
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        checkpoints (Checkpoints): snapshots (see load_checkpoints)
+        date (int): day ordinal
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
+
+    Returns:
+        Tuple[np.array]: player_abs, games_played, player_trend, at_abilities (copies)
+    """
+    i = get_checkpoint_index(checkpoints, date)
+    state = [np.array(getattr(checkpoints, field)[i]) for field in STATE_FIELDS]
+
+    end = int(np.searchsorted(match_arrays.dates, date, side='left'))
+    if end > checkpoints.positions[i]:
+        elo_arrays(params, get_match_slice(match_arrays, checkpoints.positions[i], end), *state, tables=tables)
+
+    return tuple(state)
+
+
+def replay_corrections(params: Dict[str, float],
+                       data: pd.DataFrame,
+                       changes: pd.DataFrame,
+                       checkpoints: Checkpoints,
+                       date_col: str,
+                       w_id_col: str,
+                       w_games_col: str,
+                       w_sets_col: str,
+                       l_id_col: str,
+                       l_games_col: str,
+                       l_sets_col: str,
+                       surface_cols: List[str],
+                       itf_col: str,
+                       removed: Optional[pd.Index] = None,
+                       tables: Optional[PrimitiveTable] = None,
+                       tol: float = 1e-9) -> Tuple[Union[np.array, pd.DataFrame]]:
+    """Final state after correcting the data, restored from the nearest snapshot before the earliest affected date so
+    only the suffix is replayed. Player ids must already exist in the snapshots
+
+    Args:
+        params (Dict[str, float]): ELO model parameters the snapshots were written with
+        data (pd.DataFrame): Match dataframe the snapshots were written from
+        changes (pd.DataFrame): corrected rows, index labels already in data replace that row, others are inserted
+        checkpoints (Checkpoints): snapshots (see load_checkpoints)
+        date_col (str): Column with date
+        w_id_col (str): Column with winner ids
+        w_games_col (str): Columns with games won by winner
+        w_sets_col (str): Columns with sets won by winner
+        l_id_col (str): Column with loser ids
+        l_games_col (str): Columns with games won by loser
+        l_sets_col (str): Columns with games won by loser
+        surface_cols (List[str]): Columns of 1 hot encoding of surfaces
+        itf_col (str): Column with bool indicator if game on itf circuit
+        removed (Optional[pd.Index]): index labels of rows to drop (e.g. walkovers)
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
+        tol (float): smallest change in ability reported
+
+    Returns:
+        Tuple[Union[np.array, pd.DataFrame]]: player_abs, games_played, player_trend, at_abilities, change in final
+            ability of every player that moved (a column per surface and Base, largest move first)
+    """
+    removed = pd.Index([] if removed is None else removed)
+    edited = changes.index.intersection(data.index)
+    # edited rows keep their place (order within a date sets the waves), only new rows go at the end
+    corrected = data.copy()
+    corrected.loc[edited] = changes.loc[edited]
+    corrected = pd.concat((corrected.drop(index=removed), changes.drop(index=edited)))
+
+    # old dates matter too, a match moved later still changes everything after where it used to be
+    affected = np.concatenate((get_day_ordinals(data.loc[edited.union(removed), date_col]),
+                               get_day_ordinals(changes[date_col])))
+    if not len(affected):
+        return (*[np.array(getattr(checkpoints, field)[-1]) for field in STATE_FIELDS],
+                pd.DataFrame(columns=[*surface_cols, 'Base']))
+
+    i = get_checkpoint_index(checkpoints, affected.min())
+    state = [np.array(getattr(checkpoints, field)[i]) for field in STATE_FIELDS]
+
+    # snapshot 0 is the state before any match, so it replays everything (including inserts before its date)
+    suffix = corrected if i == 0 else corrected[get_day_ordinals(corrected[date_col]) >= checkpoints.dates[i]]
+    logging.info(f'CORRECTIONS: replaying {len(suffix)} of {len(corrected)} matches from snapshot {i}')
+
+    m = get_match_arrays(
+        data=suffix, date_col=date_col, w_id_col=w_id_col, w_games_col=w_games_col, w_sets_col=w_sets_col,
+        l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col, surface_cols=surface_cols,
+        itf_col=itf_col)
+    elo_arrays(params, m, *state, tables=tables)
+
+    change = state[0] - checkpoints.player_abs[-1]
+    moved = np.flatnonzero(np.abs(change).max(axis=1) > tol)
+    moved = moved[np.argsort(-np.abs(change[moved]).max(axis=1), kind='stable')]
+
+    return (*state, pd.DataFrame(change[moved], index=pd.Index(moved, name='player'),
+                                 columns=[*surface_cols, 'Base']))
@@ -0,0 +1,144 @@
+from typing import List, Dict, Optional
+import numpy as np
+import pandas as pd
+
+from .model import PrimitiveTable, get_k_factor
+
+# feature groups in column order, per ability groups get a column per surface and Base for each player
+FEATURE_GROUPS = ('prob', 'ability', 'abs', 'at', 'trend', 'games', 'k_factor')
+_PER_ABILITY = ('abs', 'at', 'games', 'k_factor')
+
+
+def get_feature_columns(surfaces: List[str], groups: Optional[List[str]] = None) -> List[str]:
+    """Column names of a feature matrix, winner (w_) then loser (l_) for each group
+
+    Args:
+        surfaces (List[str]): surface columns (one hot encoding) in the order abilities are stored
+        groups (Optional[List[str]]): feature groups (see FEATURE_GROUPS), all if None
+
+    Returns:
+        List[str]: column names
+    """
+    groups = FEATURE_GROUPS if groups is None else groups
+    unknown = set(groups) - set(FEATURE_GROUPS)
+    if unknown:
+        raise ValueError(f'Unknown feature groups: {sorted(unknown)}')
+
+    columns = []
+    for group in (g for g in FEATURE_GROUPS if g in groups):
+        if group == 'prob':
+            columns.append('prob')
+        elif group in _PER_ABILITY:
+            columns += [f'{side}_{group}_{ability}' for side in ('w', 'l') for ability in [*surfaces, 'Base']]
+        else:
+            columns += [f'{side}_{group}' for side in ('w', 'l')]
+    return columns
+
+
+class FeatureMatrix:
+    """Pre match features of every match, written by the replay (see elo `features`) from the same state the
+    predictions use, so there's no second walk over history. prob and ability are handed over by the round that
+    computed them, the state features are gathered before it. Rows are aligned with the match data, columns are
+    contiguous (Fortran order) so each feature can be read without touching the rest
+
+    Args:
+        n_matches (int): number of matches (rows of the data passed to elo)
+        surfaces (List[str]): surface columns (one hot encoding) in the order abilities are stored
+        groups (Optional[List[str]]): feature groups to keep (see FEATURE_GROUPS), all if None
+        dtype (type): storage type
+        path (Optional[str]): .npy file to memory map the matrix to, in memory if None
+    """
+
+    def __init__(self, n_matches: int, surfaces: List[str], groups: Optional[List[str]] = None,
+                 dtype: type = np.float32, path: Optional[str] = None):
+        self.columns = get_feature_columns(surfaces, groups)
+        self.path = path
+
+        shape = (n_matches, len(self.columns))
+        if path is None:
+            self.values = np.empty(shape, dtype=dtype, order='F')
+        else:
+            self.values = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape, fortran_order=True)
+
+        # first column of each group kept
+        self._starts, start = {}, 0
+        for group in FEATURE_GROUPS:
+            if groups is None or group in groups:
+                self._starts[group] = start
+                start += 1 if group == 'prob' else 2*(len(surfaces) + 1) if group in _PER_ABILITY else 2
+
+    def update(self,
+               params: Dict[str, float],
+               index: np.array,
+               w_id: np.array,
+               l_id: np.array,
+               itf: np.array,
+               player_abs: np.array,
+               games_played: np.array,
+               player_trend: np.array,
+               at_abilities: np.array,
+               tables: Optional[PrimitiveTable] = None):
+        """Writes a round's state features from the state before the round is applied, prob and ability come from the
+        round itself (see update_predictions)
+
+        Args:
+            params (Dict[str, float]): ELO model parameters (parameters.yml)
+            index (np.array): rows of the round's matches
+            w_id (np.array): winner ids
+            l_id (np.array): loser ids
+            itf (np.array): True if game on itf circuit
+            player_abs (np.array): current player abilities
+            games_played (np.array): games played previously
+            player_trend (np.array): current trend
+            at_abilities (np.array): all time max abilities
+            tables (Optional[PrimitiveTable]): the round's precomputed primitives, k factors computed directly if None
+        """
+        values = {}
+        for group, state in (('abs', player_abs), ('at', at_abilities), ('trend', player_trend),
+                             ('games', games_played)):
+            if group in self._starts:
+                values[group] = (state[w_id], state[l_id])
+        if 'k_factor' in self._starts:
+            itf_indicator = itf.reshape(-1, 1)
+            if tables is None:
+                values['k_factor'] = tuple(
+                    get_k_factor(games_played[ids], params['K'], params['offset'], params['shape'], itf_indicator,
+                                 params['itf_deduction']) for ids in (w_id, l_id))
+            else:
+                values['k_factor'] = tuple(tables.get_k_factor(games_played[ids], itf_indicator)
+                                           for ids in (w_id, l_id))
+        self._write(index, values)
+
+    def update_predictions(self, index: np.array, probs: np.array, abilities: np.array):
+        """Writes the prob and ability features of a round as the round predicted them
+
+        Args:
+            index (np.array): rows of the round's matches
+            probs (np.array): pre match probs
+            abilities (np.array): (2, n_matches) winner and loser current abilities
+        """
+        self._write(index, {'prob': (probs,), 'ability': tuple(abilities)})
+
+    @property
+    def needs_predictions(self) -> bool:
+        """True if prob or ability is kept, so rounds should hand over their abilities"""
+        return 'prob' in self._starts or 'ability' in self._starts
+
+    def _write(self, index: np.array, values: Dict[str, tuple]):
+        for group, sides in values.items():
+            if group not in self._starts:
+                continue
+            start = self._starts[group]
+            for side in sides:
+                side = side.reshape(len(index), -1)
+                self.values[index, start:start + side.shape[1]] = side
+                start += side.shape[1]
+
+    def flush(self):
+        """Writes a memory mapped matrix to disk"""
+        if isinstance(self.values, np.memmap):
+            self.values.flush()
+
+    def to_frame(self, index: Optional[pd.Index] = None) -> pd.DataFrame:
+        """Features as a dataframe, index should be the match data's index"""
+        return pd.DataFrame(self.values, index=index, columns=self.columns)
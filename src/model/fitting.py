@@ -0,0 +1,459 @@
+from typing import List, Dict, Tuple, Optional
+import os
+import time
+import shutil
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from .model import (
+    MatchArrays, PrimitiveTable, get_match_arrays, elo_arrays, get_log_likelihood, get_day_ordinals, get_date_bounds)
+from .batch import stack_params, get_lane_bytes, elo_batch_arrays
+from .gradient import elo_gradient
+from .metrics import MetricAccumulator
+from .journal import (
+    get_data_fingerprint, get_candidate_key, get_worker_id, add_sweep, get_sweep, claim_candidate,
+    requeue_dead_claims, record_result, get_results)
+from ..constants import PARAMS, PARAM_BOUNDS
+
+# match arrays, state shape and score mask each worker process sets up once (see init_worker)
+_WORKER = {}
+
+
+def save_match_arrays(match_arrays: MatchArrays, folder: str):
+    """Saves each match column as a .npy file so other processes can memory map them
+
+    Args:
+        match_arrays (MatchArrays): contiguous match columns
+        folder (str): folder to save to
+    """
+    for field, values in match_arrays._asdict().items():
+        np.save(os.path.join(folder, f'{field}.npy'), values)
+
+
+def load_match_arrays(folder: str, mmap_mode: Optional[str] = 'r') -> MatchArrays:
+    """Loads match columns saved with save_match_arrays, memory mapped (read only) by default
+
+    Args:
+        folder (str): folder arrays were saved to
+        mmap_mode (Optional[str]): numpy memory map mode, None loads into memory
+
+    Returns:
+        MatchArrays: contiguous match columns
+    """
+    return MatchArrays(**{field: np.load(os.path.join(folder, f'{field}.npy'), mmap_mode=mmap_mode)
+                          for field in MatchArrays._fields})
+
+
+def load_worker_match_arrays(folder: str) -> MatchArrays:
+    """Match columns saved with save_match_arrays mapped for a pool worker, as plain ndarray views of the mapped
+    files since np.memmap slices carry subclass overhead on every round
+
+    Args:
+        folder (str): folder arrays were saved to
+
+    Returns:
+        MatchArrays: contiguous match columns (read only)
+    """
+    return MatchArrays(*[np.asarray(values) for values in load_match_arrays(folder)])
+
+
+def get_candidates(
+        n: int, bounds: Dict[str, Tuple[float, float]] = PARAM_BOUNDS, seed: int = 0) -> List[Dict[str, float]]:
+    """Samples parameter sets uniformly within bounds, the same seed always gives the same candidates
+
+    Args:
+        n (int): number of candidates
+        bounds (Dict[str, Tuple[float, float]]): (low, high) for each parameter
+        seed (int): random seed
+
+    Returns:
+        List[Dict[str, float]]: candidate parameter sets
+    """
+    rng = np.random.default_rng(seed)
+    samples = {name: rng.uniform(low, high, n) for name, (low, high) in bounds.items()}
+    return [{name: float(values[i]) for name, values in samples.items()} for i in range(n)]
+
+
+def get_initial_state(n_players: int, n_abilities: int) -> Tuple[np.array]:
+    """New player state, everyone starts at 1500 with no games or trend
+
+    Args:
+        n_players (int): number of players
+        n_abilities (int): number of abilities per player (surfaces + base)
+
+    Returns:
+        Tuple[np.array]: player_abs, games_played, player_trend, at_abilities
+    """
+    return (np.full((n_players, n_abilities), 1500.), np.zeros((n_players, n_abilities)), np.zeros((n_players,)),
+            np.full((n_players, n_abilities), 1500.))
+
+
+def get_score_from(score_from: Optional[pd.Timestamp]) -> Optional[int]:
+    """Converts the first date to score to a day ordinal (see get_day_ordinals)"""
+    if score_from is None:
+        return None
+    return int(get_day_ordinals(np.array([score_from], dtype='datetime64[ns]'))[0])
+
+
+def init_worker(folder: str, n_players: int, n_abilities: int, score_from: Optional[int] = None):
+    """Process pool initialiser, maps the shared match arrays once per worker"""
+    _WORKER['matches'] = load_worker_match_arrays(folder)
+    _WORKER['shape'] = (n_players, n_abilities)
+    _WORKER['score_from'] = score_from
+
+
+def evaluate_candidate(params: Dict[str, float]) -> Dict[str, float]:
+    """Runs ELO from scratch with params over the worker's shared arrays and scores the predictions
+
+    Args:
+        params (Dict[str, float]): ELO model parameters
+
+    Returns:
+        Dict[str, float]: params, metrics, seconds taken and worker pid
+    """
+    ts = time.perf_counter()
+    n_players, n_abilities = _WORKER['shape']
+    # predictions are scored as each round finishes rather than stored
+    metrics = MetricAccumulator(score_from=_WORKER['score_from'])
+    elo_arrays(params, _WORKER['matches'], *get_initial_state(n_players, n_abilities),
+               tables=PrimitiveTable(params, n_surfaces=n_abilities - 1), metrics=metrics, keep_probs=False)
+
+    overall = metrics.get_metrics().loc['Overall']
+    return {**params, 'log_likelihood': overall['log_likelihood'], 'brier': overall['brier'],
+            'accuracy': overall['accuracy'], 'seconds': time.perf_counter() - ts, 'pid': os.getpid()}
+
+
+def work_journal(path: str, fingerprint: str, stale_after: float = 3600.) -> int:
+    """Evaluates a sweep's pending candidates from the journal until none are left. Any number of these can run at
+    once, on any machine sharing the journal's filesystem
+
+    Args:
+        path (str): journal path
+        fingerprint (str): data fingerprint of the sweep
+        stale_after (float): seconds after which a running candidate is assumed abandoned and evaluated again
+
+    Returns:
+        int: number of candidates evaluated
+    """
+    sweep = get_sweep(path, fingerprint)
+    # candidates a killed worker on this host was evaluating, rather than waiting stale_after for them
+    requeue_dead_claims(path, fingerprint)
+    init_worker(sweep['arrays_folder'], sweep['n_players'], sweep['n_abilities'], sweep['score_from'])
+    worker = get_worker_id()
+
+    evaluated = 0
+    while True:
+        claimed = claim_candidate(path, fingerprint, worker, stale_after)
+        if claimed is None:
+            return evaluated
+        candidate_id, params = claimed
+        record_result(path, candidate_id, worker, evaluate_candidate(params))
+        evaluated += 1
+
+
+def fit(data: pd.DataFrame,
+        date_col: str,
+        w_id_col: str,
+        w_games_col: str,
+        w_sets_col: str,
+        l_id_col: str,
+        l_games_col: str,
+        l_sets_col: str,
+        surface_cols: List[str],
+        itf_col: str,
+        n_players: Optional[int] = None,
+        n_candidates: int = 100,
+        bounds: Dict[str, Tuple[float, float]] = PARAM_BOUNDS,
+        seed: int = 0,
+        workers: Optional[int] = None,
+        score_from: Optional[pd.Timestamp] = None,
+        candidates: Optional[List[Dict[str, float]]] = None,
+        journal: Optional[str] = None) -> pd.DataFrame:
+    """Random search over ELO parameters, evaluations fanned out over a process pool. Match columns are saved once
+    as .npy files which every worker memory maps, so the dataframe is never pickled. With a journal every result is
+    written to SQLite as it finishes and candidates already scored on the same data are reused rather than evaluated
+    again, candidates a killed run on this host was evaluating are queued again
+
+    Args:
+        data (pd.DataFrame): Match dataframe
+        date_col (str): Column with date
+        w_id_col (str): Column with winner ids
+        w_games_col (str): Columns with games won by winner
+        w_sets_col (str): Columns with sets won by winner
+        l_id_col (str): Column with loser ids
+        l_games_col (str): Columns with games won by loser
+        l_sets_col (str): Columns with games won by loser
+        surface_cols (List[str]): Columns of 1 hot encoding of surfaces
+        itf_col (str): Column with bool indicator if game on itf circuit
+        n_players (Optional[int]): number of players, max id + 1 if None
+        n_candidates (int): number of parameter sets to sample
+        bounds (Dict[str, Tuple[float, float]]): (low, high) for each parameter
+        seed (int): random seed for sampling candidates
+        workers (Optional[int]): number of processes, all cores if None
+        score_from (Optional[pd.Timestamp]): only score matches on or after this date (earlier ones are burn in)
+        candidates (Optional[List[Dict[str, float]]]): evaluate these instead of sampling
+        journal (Optional[str]): SQLite journal path, match arrays are kept alongside it for other workers
+
+    Returns:
+        pd.DataFrame: a row per candidate with params, log_likelihood, brier, accuracy and seconds, best first
+    """
+    match_arrays = get_match_arrays(
+        data=data, date_col=date_col, w_id_col=w_id_col, w_games_col=w_games_col, w_sets_col=w_sets_col,
+        l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col, surface_cols=surface_cols,
+        itf_col=itf_col)
+
+    if n_players is None:
+        n_players = int(max(match_arrays.w_id.max(), match_arrays.l_id.max())) + 1
+    if candidates is None:
+        candidates = get_candidates(n_candidates, bounds, seed)
+
+    score_from = get_score_from(score_from)
+    workers = workers or os.cpu_count()
+
+    ts = time.perf_counter()
+    if journal is None:
+        with tempfile.TemporaryDirectory() as folder:
+            save_match_arrays(match_arrays, folder)
+
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(folder, n_players, len(surface_cols) + 1, score_from)) as executor:
+                results = list(executor.map(evaluate_candidate, candidates))
+    else:
+        fingerprint = get_data_fingerprint(match_arrays, n_players, score_from)
+        folder = os.path.join(os.path.dirname(os.path.abspath(journal)), f'arrays_{fingerprint}')
+        if not os.path.exists(folder):
+            # saved to a sibling then moved into place, so a crash mid save never leaves a partial folder to reuse
+            os.makedirs(os.path.dirname(folder), exist_ok=True)
+            partial = tempfile.mkdtemp(prefix=f'.arrays_{fingerprint}_', dir=os.path.dirname(folder))
+            save_match_arrays(match_arrays, partial)
+            try:
+                os.replace(partial, folder)
+            except OSError:
+                # another run moved its copy in first
+                shutil.rmtree(partial)
+
+        add_sweep(journal, fingerprint, folder, n_players, len(surface_cols) + 1, score_from, candidates)
+        requeue_dead_claims(journal, fingerprint)
+        logging.info(f'FIT: journal {journal}, sweep {fingerprint}')
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(work_journal, [journal]*workers, [fingerprint]*workers))
+
+    seconds = time.perf_counter() - ts
+    logging.info(f'FIT: {len(candidates)} candidates, {workers} workers, {seconds:.2f} sec')
+
+    if journal is not None:
+        results = get_results(journal, fingerprint, candidates)
+        if len(results) < len({get_candidate_key(c) for c in candidates}):
+            logging.warning(f'FIT: only {len(results)} of {len(candidates)} candidates scored, the rest are still '
+                            f'claimed by other workers (see stale_after)')
+        return results
+
+    results = pd.DataFrame(results)
+    results.index.name = 'candidate'
+    return results.sort_values(by='log_likelihood', ascending=False)
+
+
+def get_rung_ends(dates: np.array, n_rungs: int, eta: float, first_scored: int = 0) -> np.array:
+    """Sorted match position each rung replays up to, snapped to the next date boundary. Rung r covers
+    eta**(r - n_rungs + 1) of the scored matches (plus any burn in before them), the last rung covers everything
+
+    Args:
+        dates (np.array): sorted dates (day ordinals)
+        n_rungs (int): number of rungs
+        eta (float): growth factor of the history replayed between rungs
+        first_scored (int): sorted position of the first scored match
+
+    Returns:
+        np.array: end position of each rung
+    """
+    bounds = get_date_bounds(dates)
+    fractions = np.power(float(eta), np.arange(n_rungs) - (n_rungs - 1))
+    targets = first_scored + fractions*(len(dates) - first_scored)
+    return bounds[np.clip(np.searchsorted(bounds, targets), 1, len(bounds) - 1)]
+
+
+def successive_halving(data: pd.DataFrame,
+                       date_col: str,
+                       w_id_col: str,
+                       w_games_col: str,
+                       w_sets_col: str,
+                       l_id_col: str,
+                       l_games_col: str,
+                       l_sets_col: str,
+                       surface_cols: List[str],
+                       itf_col: str,
+                       n_players: Optional[int] = None,
+                       n_candidates: int = 81,
+                       eta: int = 3,
+                       n_rungs: int = 4,
+                       bounds: Dict[str, Tuple[float, float]] = PARAM_BOUNDS,
+                       seed: int = 0,
+                       score_from: Optional[pd.Timestamp] = None,
+                       candidates: Optional[List[Dict[str, float]]] = None,
+                       max_bytes: int = 2**30) -> pd.DataFrame:
+    """Successive halving search, candidates are scored on growing prefixes of the date sorted history and only the
+    best 1/eta (running log likelihood) move on to the next rung. Survivors resume from their saved state rather than
+    replaying from scratch, so the last rung's scores are identical to a full replay
+
+    Args:
+        data (pd.DataFrame): Match dataframe
+        date_col (str): Column with date
+        w_id_col (str): Column with winner ids
+        w_games_col (str): Columns with games won by winner
+        w_sets_col (str): Columns with sets won by winner
+        l_id_col (str): Column with loser ids
+        l_games_col (str): Columns with games won by loser
+        l_sets_col (str): Columns with games won by loser
+        surface_cols (List[str]): Columns of 1 hot encoding of surfaces
+        itf_col (str): Column with bool indicator if game on itf circuit
+        n_players (Optional[int]): number of players, max id + 1 if None
+        n_candidates (int): number of parameter sets to sample
+        eta (int): keep the best 1/eta candidates at each rung
+        n_rungs (int): number of rungs, the last replays all data
+        bounds (Dict[str, Tuple[float, float]]): (low, high) for each parameter
+        seed (int): random seed for sampling candidates
+        score_from (Optional[pd.Timestamp]): only score matches on or after this date (earlier ones are burn in)
+        candidates (Optional[List[Dict[str, float]]]): evaluate these instead of sampling
+        max_bytes (int): memory cap for temporaries, live lanes are run in chunks
+
+    Returns:
+        pd.DataFrame: a row per candidate with params, rung reached and metrics over that rung's prefix, best first
+    """
+    m = get_match_arrays(
+        data=data, date_col=date_col, w_id_col=w_id_col, w_games_col=w_games_col, w_sets_col=w_sets_col,
+        l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col, surface_cols=surface_cols,
+        itf_col=itf_col)
+
+    if n_players is None:
+        n_players = int(max(m.w_id.max(), m.l_id.max())) + 1
+    if candidates is None:
+        candidates = get_candidates(n_candidates, bounds, seed)
+
+    n_candidates, n_matches = len(candidates), len(m.dates)
+    stacked = stack_params(candidates)
+
+    score_from = get_score_from(score_from)
+    scored = np.ones(n_matches, dtype=bool) if score_from is None else m.dates >= score_from
+    rung_ends = get_rung_ends(m.dates, n_rungs, eta, first_scored=int(np.argmax(scored)))
+
+    # running sums for each candidate, state only kept for live candidates (rows follow `live`)
+    totals = {name: np.zeros(n_candidates) for name in ('log_likelihood', 'brier', 'accuracy', 'matches')}
+    rung = np.zeros(n_candidates, dtype=int)
+    live = np.arange(n_candidates)
+    state = [np.repeat(s[None], n_candidates, axis=0) for s in get_initial_state(n_players, len(surface_cols) + 1)]
+
+    max_round = int(np.diff(get_date_bounds(m.dates)).max(initial=0))
+    chunk = max(1, max_bytes // get_lane_bytes(n_players, len(surface_cols) + 1, n_matches, max_round))
+    start, evaluated = 0, 0
+
+    for r, end in enumerate(rung_ends):
+        for lane_from in range(0, len(live), chunk):
+            lanes = slice(lane_from, lane_from + chunk)
+            *_, probs = elo_batch_arrays({name: values[live[lanes]] for name, values in stacked.items()}, m,
+                                         *[s[lanes] for s in state], start=start, end=end)
+
+            probs = probs[:, scored[start:end]]
+            totals['log_likelihood'][live[lanes]] += get_log_likelihood(probs, 1, axis=1)
+            totals['brier'][live[lanes]] += np.sum((1 - probs)**2, axis=1)
+            totals['accuracy'][live[lanes]] += np.sum(probs > 0.5, axis=1)
+            totals['matches'][live[lanes]] += probs.shape[1]
+
+        rung[live] = r
+        evaluated += len(live)*(end - start)
+        start = end
+
+        if r < len(rung_ends) - 1:
+            # every live candidate has scored the same prefix so running totals are comparable
+            keep = np.sort(np.argsort(-totals['log_likelihood'][live], kind='stable')[:int(np.ceil(len(live)/eta))])
+            live = live[keep]
+            state = [s[keep] for s in state]
+
+    logging.info(f'SUCCESSIVE HALVING: {evaluated} match evaluations, {n_candidates*n_matches} for a full search '
+                 f'({n_candidates*n_matches/evaluated:.1f}x less)')
+
+    results = pd.DataFrame(candidates)
+    results['rung'] = rung
+    results['log_likelihood'] = totals['log_likelihood']
+    results['brier'] = totals['brier'] / np.maximum(totals['matches'], 1)
+    results['accuracy'] = totals['accuracy'] / np.maximum(totals['matches'], 1)
+    results['matches'] = totals['matches'].astype(int)
+    results.index.name = 'candidate'
+    return results.sort_values(by=['rung', 'log_likelihood'], ascending=False)
+
+
+def fit_lbfgs(data: pd.DataFrame,
+              date_col: str,
+              w_id_col: str,
+              w_games_col: str,
+              w_sets_col: str,
+              l_id_col: str,
+              l_games_col: str,
+              l_sets_col: str,
+              surface_cols: List[str],
+              itf_col: str,
+              n_players: Optional[int] = None,
+              x0: Dict[str, float] = PARAMS,
+              bounds: Dict[str, Tuple[float, float]] = PARAM_BOUNDS,
+              score_from: Optional[pd.Timestamp] = None,
+              max_iter: int = 50) -> Tuple[Dict[str, float], pd.DataFrame]:
+    """Maximises log likelihood with L-BFGS-B using the exact gradient from elo_gradient, each step is a single replay.
+    Parameters are scaled to [0, 1] within their bounds, those with low == high are held fixed
+
+    Args:
+        data (pd.DataFrame): Match dataframe
+        date_col (str): Column with date
+        w_id_col (str): Column with winner ids
+        w_games_col (str): Columns with games won by winner
+        w_sets_col (str): Columns with sets won by winner
+        l_id_col (str): Column with loser ids
+        l_games_col (str): Columns with games won by loser
+        l_sets_col (str): Columns with games won by loser
+        surface_cols (List[str]): Columns of 1 hot encoding of surfaces
+        itf_col (str): Column with bool indicator if game on itf circuit
+        n_players (Optional[int]): number of players, max id + 1 if None
+        x0 (Dict[str, float]): starting parameters (clipped to bounds)
+        bounds (Dict[str, Tuple[float, float]]): (low, high) for each parameter
+        score_from (Optional[pd.Timestamp]): only score matches on or after this date (earlier ones are burn in)
+        max_iter (int): maximum L-BFGS iterations
+
+    Returns:
+        Tuple[Dict[str, float], pd.DataFrame]: best parameters, a row per replay with params and log_likelihood
+    """
+    match_arrays = get_match_arrays(
+        data=data, date_col=date_col, w_id_col=w_id_col, w_games_col=w_games_col, w_sets_col=w_sets_col,
+        l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col, surface_cols=surface_cols,
+        itf_col=itf_col)
+
+    if n_players is None:
+        n_players = int(max(match_arrays.w_id.max(), match_arrays.l_id.max())) + 1
+    score_from = get_score_from(score_from)
+
+    free = [name for name, (low, high) in bounds.items() if high > low]
+    low = np.array([bounds[name][0] for name in free])
+    scale = np.array([bounds[name][1] - bounds[name][0] for name in free])
+    fixed = {name: float(np.clip(x0[name], *bounds[name])) for name in bounds}
+
+    history = []
+
+    def to_params(x: np.array) -> Dict[str, float]:
+        return {**fixed, **dict(zip(free, low + x*scale))}
+
+    def negative_log_likelihood(x: np.array) -> Tuple[float, np.array]:
+        params = to_params(x)
+        log_likelihood, gradient = elo_gradient(
+            params, match_arrays, *get_initial_state(n_players, len(surface_cols) + 1), score_from=score_from)
+        history.append({**params, 'log_likelihood': log_likelihood})
+        logging.debug(f'LBFGS: replay {len(history)}, log likelihood {log_likelihood:.2f}')
+        return -log_likelihood, -np.array([gradient[name] for name in free])*scale
+
+    start = np.array([(fixed[name] - bounds[name][0]) / (bounds[name][1] - bounds[name][0]) for name in free])
+    result = minimize(negative_log_likelihood, start, jac=True, method='L-BFGS-B', bounds=[(0, 1)]*len(free),
+                      options={'maxiter': max_iter})
+
+    logging.info(f'LBFGS: {result.message}, {len(history)} replays, log likelihood {-result.fun:.2f}')
+    return to_params(result.x), pd.DataFrame(history)
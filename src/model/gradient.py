@@ -0,0 +1,193 @@
+from typing import Dict, Optional, Tuple
+import numpy as np
+from scipy.stats import binom
+
+from .model import (
+    MatchArrays, get_surface_weights, get_current_ability, get_probs, get_performance_score, get_k_factor,
+    get_ability_change, get_updated_trend, get_date_bounds, get_round_waves)
+from ..constants import PARAMS
+
+# order of the last (sensitivity) axis
+PARAM_NAMES = list(PARAMS)
+_I = {name: i for i, name in enumerate(PARAM_NAMES)}
+
+
+def get_ability_gradient(
+        params: Dict[str, float], ids: np.array, s_weights: np.array, ds_weights: np.array, player_abs: np.array,
+        player_trend: np.array, at_abilities: np.array, d_abs: np.array, d_trend: np.array, d_at: np.array
+) -> Tuple[np.array]:
+    """Players current ability (see get_current_ability) and its derivative w.r.t. each parameter
+
+    Args:
+        params (Dict[str, float]): ELO model parameters
+        ids (np.array): player ids
+        s_weights (np.array): surface weights for each match
+        ds_weights (np.array): derivative of surface weights w.r.t. surface_weight
+        player_abs (np.array): current player abilities
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        d_abs (np.array): player_abs sensitivities (n_players, n_abilities, n_params)
+        d_trend (np.array): player_trend sensitivities (n_players, n_params)
+        d_at (np.array): at_abilities sensitivities (n_players, n_abilities, n_params)
+
+    Returns:
+        Tuple[np.array]: ability (m,), d_ability (m, n_params)
+    """
+    c_ability, at_ability, c_trend = player_abs[ids], at_abilities[ids], player_trend[ids]
+    at_weight, trend_weight = params['all_time_weight'], params['trend_weight']
+
+    ability = get_current_ability(c_ability, at_ability, s_weights, at_weight, c_trend, trend_weight)
+
+    c_sum, at_sum = np.sum(c_ability*s_weights, axis=1), np.sum(at_ability*s_weights, axis=1)
+    c_ab = c_sum*(1 - at_weight) + at_sum*at_weight
+
+    d_c_ab = (np.einsum('mcq,mc->mq', d_abs[ids], s_weights)*(1 - at_weight)
+              + np.einsum('mcq,mc->mq', d_at[ids], s_weights)*at_weight)
+    d_c_ab[:, _I['surface_weight']] += (np.sum(c_ability*ds_weights, axis=1)*(1 - at_weight)
+                                        + np.sum(at_ability*ds_weights, axis=1)*at_weight)
+    d_c_ab[:, _I['all_time_weight']] += at_sum - c_sum
+
+    d_ability = d_c_ab*(1 + c_trend*trend_weight)[:, None] + c_ab[:, None]*d_trend[ids]*trend_weight
+    d_ability[:, _I['trend_weight']] += c_ab*c_trend
+
+    return ability, d_ability
+
+
+def update_players_gradient(params: Dict[str, float],
+                            ids: np.array,
+                            performance: np.array,
+                            d_performance: np.array,
+                            playing_surface: np.array,
+                            itf_indicator: np.array,
+                            player_abs: np.array,
+                            games_played: np.array,
+                            player_trend: np.array,
+                            at_abilities: np.array,
+                            d_abs: np.array,
+                            d_trend: np.array,
+                            d_at: np.array):
+    """Same update as update_players (ids must be unique), carrying the sensitivities of the state along IN PLACE
+
+    Args:
+        params (Dict[str, float]): ELO model parameters
+        ids (np.array): player ids (unique)
+        performance (np.array): players performance score for each match
+        d_performance (np.array): performance sensitivities (m, n_params)
+        playing_surface (np.array): surface match was played on and base
+        itf_indicator (np.array): True if game on itf circuit (column vector)
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        d_abs (np.array): player_abs sensitivities
+        d_trend (np.array): player_trend sensitivities
+        d_at (np.array): at_abilities sensitivities
+    """
+    K, offset, shape, itf_deduction = params['K'], params['offset'], params['shape'], params['itf_deduction']
+    games = games_played[ids] + offset
+
+    k_factor = get_k_factor(games_played[ids], K, offset, shape, itf_indicator, itf_deduction)
+
+    d_k_factor = np.zeros(k_factor.shape + (len(PARAM_NAMES),))
+    d_k_factor[..., _I['K']] = (1 - itf_indicator*itf_deduction) / np.power(games, shape)
+    d_k_factor[..., _I['offset']] = -shape*k_factor/games
+    d_k_factor[..., _I['shape']] = -k_factor*np.log(games)
+    d_k_factor[..., _I['itf_deduction']] = -K*itf_indicator/np.power(games, shape)
+
+    player_abs[ids] += get_ability_change(
+        k_factor=k_factor, p_score=performance[..., None], playing_surface=playing_surface)
+    d_abs[ids] += (d_k_factor*performance[:, None, None]
+                   + k_factor[..., None]*d_performance[:, None, :])*playing_surface[..., None]
+
+    # max is piecewise, sensitivity follows whichever branch is taken
+    takes_current = player_abs[ids] >= at_abilities[ids]
+    d_at[ids] = np.where(takes_current[..., None], d_abs[ids], d_at[ids])
+    at_abilities[ids] = np.maximum(player_abs[ids], at_abilities[ids])
+
+    trend_rate = params['trend_rate']
+    d_trend_new = d_trend[ids]*(1 - trend_rate) + d_performance*trend_rate
+    d_trend_new[:, _I['trend_rate']] += performance - player_trend[ids]
+    d_trend[ids] = d_trend_new
+    player_trend[ids] = get_updated_trend(player_trend[ids], performance, trend_rate)
+
+    games_played[ids] += playing_surface
+
+
+def elo_gradient(params: Dict[str, float],
+                 match_arrays: MatchArrays,
+                 player_abs: np.array,
+                 games_played: np.array,
+                 player_trend: np.array,
+                 at_abilities: np.array,
+                 score_from: Optional[int] = None) -> Tuple[float, Dict[str, float]]:
+    """Replays the ELO model (same updates as elo_arrays) carrying forward mode sensitivities of the state, giving the
+    exact gradient of the total log likelihood w.r.t. every parameter in one pass. Player state is updated IN PLACE
+
+    Args:
+        params (Dict[str, float]): ELO model parameters
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        score_from (Optional[int]): day ordinal to start scoring from (earlier matches are burn in), all if None
+
+    Returns:
+        Tuple[float, Dict[str, float]]: log likelihood, parameter name -> derivative of log likelihood
+    """
+    m = match_arrays
+    n_params = len(PARAM_NAMES)
+
+    d_abs = np.zeros(player_abs.shape + (n_params,))
+    d_at = np.zeros(at_abilities.shape + (n_params,))
+    d_trend = np.zeros(player_trend.shape + (n_params,))
+
+    log_likelihood, gradient = 0., np.zeros(n_params)
+    bounds = get_date_bounds(m.dates)
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        w_id, l_id = m.w_id[start:end], m.l_id[start:end]
+        w_games, l_games = m.w_games[start:end], m.l_games[start:end]
+        w_sets, l_sets = m.w_sets[start:end], m.l_sets[start:end]
+        surfaces, itf_indicator = m.surfaces[start:end], m.itf[start:end].reshape(-1, 1)
+
+        s_weights, playing_surface = get_surface_weights(surfaces, params['surface_weight'])
+        # d s_weights / d surface_weight, base loses whatever the surface gains
+        ds_weights = surfaces.astype(float)
+        ds_weights = np.concatenate((ds_weights, -ds_weights.sum(axis=1, keepdims=True)), axis=1)
+
+        states = (player_abs, player_trend, at_abilities, d_abs, d_trend, d_at)
+        w_ability, d_w_ability = get_ability_gradient(params, w_id, s_weights, ds_weights, *states)
+        l_ability, d_l_ability = get_ability_gradient(params, l_id, s_weights, ds_weights, *states)
+
+        probs = get_probs(w_ability, l_ability)
+        d_probs = (probs*(1 - probs)*np.log(10)/400)[:, None]*(d_w_ability - d_l_ability)
+
+        w_performance, l_performance = get_performance_score(
+            probs, w_games, l_games, w_sets, l_sets, params['p'], params['straight_sets_boost'])
+
+        # d/dp P(X <= k | n, p) = -n P(X = k | n - 1, p)
+        n_games = w_games + l_games
+        d_w_performance = -d_probs
+        d_w_performance[:, _I['p']] += -n_games*binom.pmf(w_games, n_games - 1, params['p'])
+        d_w_performance[:, _I['straight_sets_boost']] += (w_sets - l_sets) == 2
+
+        if score_from is None or m.dates[start] >= score_from:
+            log_likelihood += np.log(probs).sum()
+            gradient += (d_probs/probs[:, None]).sum(axis=0)
+
+        ids = np.sort(np.concatenate((w_id, l_id)))
+        if (ids[1:] != ids[:-1]).all():
+            waves = [slice(None)]
+        else:
+            round_waves = get_round_waves(w_id, l_id)
+            waves = [round_waves == wave for wave in range(round_waves.max() + 1)]
+
+        for wave in waves:
+            for ids, performance, d_performance in ((w_id[wave], w_performance[wave], d_w_performance[wave]),
+                                                    (l_id[wave], l_performance[wave], -d_w_performance[wave])):
+                update_players_gradient(
+                    params, ids, performance, d_performance, playing_surface[wave], itf_indicator[wave],
+                    player_abs, games_played, player_trend, at_abilities, d_abs, d_trend, d_at)
+
+    return log_likelihood, dict(zip(PARAM_NAMES, gradient))
@@ -0,0 +1,133 @@
+from typing import List, Optional, NamedTuple
+import os
+import numpy as np
+import pandas as pd
+
+# quantized abilities are stored as the change from the starting rating, so the precision goes where ratings live
+START_RATING = 1500.
+# fixed point steps per unit for int16 storage (abilities to 1/8 of a point, +-4096 from the start, trend +-2)
+INT16_SCALES = {'player_abs': 8., 'player_trend': 2.**14}
+
+
+class RatingHistory(NamedTuple):
+    """Every player's state after each round they played in, CSR layout: player i's entries (oldest first) are
+    offsets[i]:offsets[i + 1] of the flat arrays"""
+    offsets: np.array
+    dates: np.array
+    player_abs: np.array
+    player_trend: np.array
+    games_played: np.array
+
+
+class HistoryRecorder:
+    """Append only log of the players who played in each round (see elo `history`), turned into a RatingHistory once
+    the replay is done. Each round only touches the rows of its players
+
+    Args:
+        n_players (int): number of players in the state
+        dtype (Optional[type]): np.float16 or np.int16 to quantize abilities and trend (games played are then
+            int16 too), exact (float64 and int32) if None
+    """
+
+    def __init__(self, n_players: int, dtype: Optional[type] = None):
+        if dtype not in (None, np.float16, np.int16):
+            raise ValueError(f'Unsupported history dtype: {dtype}')
+        self.n_players = n_players
+        self.dtype = dtype
+
+        self._ids: List[np.array] = []
+        self._dates: List[np.array] = []
+        self._values = {field: [] for field in RatingHistory._fields[2:]}
+
+    def record(self, date: int, ids: np.array, player_abs: np.array, games_played: np.array,
+               player_trend: np.array):
+        """Appends the (updated) state of the players who played in a round
+
+        Args:
+            date (int): day ordinal of the round
+            ids (np.array): players who played (unique)
+            player_abs (np.array): current player abilities
+            games_played (np.array): games played previously
+            player_trend (np.array): current trend
+        """
+        self._ids.append(np.asarray(ids, dtype=np.int64))
+        self._dates.append(np.full(len(ids), date, dtype=np.int32))
+        for field, values in (('player_abs', player_abs), ('player_trend', player_trend),
+                              ('games_played', games_played)):
+            self._values[field].append(self._encode(field, values[ids]))
+
+    @property
+    def n_rounds(self) -> int:
+        return len(self._ids)
+
+    def relabel(self, order: np.array, start: int = 0):
+        """Maps ids recorded from round start on back to public ids, for replays run on renumbered players (see
+        get_activity_order)"""
+        self._ids[start:] = [order[ids] for ids in self._ids[start:]]
+
+    def _encode(self, field: str, values: np.array) -> np.array:
+        if field == 'games_played':
+            return values.astype(np.int32 if self.dtype is None else np.int16)
+        if self.dtype is None:
+            return values.astype(np.float64)
+
+        values = values - START_RATING if field == 'player_abs' else values
+        if self.dtype == np.int16:
+            return np.clip(np.rint(values*INT16_SCALES[field]), -2**15, 2**15 - 1).astype(np.int16)
+        return values.astype(np.float16)
+
+    def get_history(self) -> RatingHistory:
+        """Recorded entries grouped by player (stable, so each player's entries stay in date order)"""
+        ids = np.concatenate(self._ids) if self._ids else np.zeros((0,), dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(ids, minlength=self.n_players)))).astype(np.int64)
+
+        def flat(chunks: List[np.array], dtype: type) -> np.array:
+            return np.concatenate(chunks)[order] if chunks else np.zeros((0,), dtype=dtype)
+
+        return RatingHistory(offsets=offsets, dates=flat(self._dates, np.int32),
+                             **{field: flat(chunks, np.float64) for field, chunks in self._values.items()})
+
+
+def save_history(history: RatingHistory, folder: str):
+    """Writes each array of a history to its own .npy file in folder (created if needed)"""
+    os.makedirs(folder, exist_ok=True)
+    for field, values in history._asdict().items():
+        np.save(os.path.join(folder, f'{field}.npy'), values)
+
+
+def load_history(folder: str) -> RatingHistory:
+    """Memory maps (read only) a history written by save_history, trajectories only read their own entries"""
+    return RatingHistory(**{field: np.load(os.path.join(folder, f'{field}.npy'), mmap_mode='r')
+                            for field in RatingHistory._fields})
+
+
+def get_decoded(field: str, values: np.array) -> np.array:
+    """Float values of a (possibly quantized) history field"""
+    if field == 'games_played' or values.dtype == np.float64:
+        return values.astype(np.float64)
+    values = values/INT16_SCALES[field] if values.dtype == np.int16 else values.astype(np.float64)
+    return values + START_RATING if field == 'player_abs' else values
+
+
+def get_trajectory(history: RatingHistory, player: int, surfaces: List[str]) -> pd.DataFrame:
+    """One player's state after every round they played in, reads only that player's entries
+
+    Args:
+        history (RatingHistory): recorded history (see HistoryRecorder, load_history)
+        player (int): player id
+        surfaces (List[str]): surface columns abilities correspond to
+
+    Returns:
+        pd.DataFrame: a row per round played indexed by date, abilities (a column per surface and Base), trend and
+            games played per ability (games_<ability>)
+    """
+    rows = slice(int(history.offsets[player]), int(history.offsets[player + 1]))
+    abilities = [*surfaces, 'Base']
+
+    trajectory = pd.DataFrame(get_decoded('player_abs', history.player_abs[rows]), columns=abilities,
+                              index=pd.Index(np.asarray(history.dates[rows]).astype('datetime64[D]'), name='date'))
+    trajectory['trend'] = get_decoded('player_trend', history.player_trend[rows])
+    trajectory[[f'games_{ability}' for ability in abilities]] = get_decoded(
+        'games_played', history.games_played[rows])
+    return trajectory
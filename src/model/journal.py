@@ -0,0 +1,231 @@
+from typing import List, Dict, Optional
+import os
+import json
+import time
+import socket
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+
+from .model import MatchArrays
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sweeps (
+    fingerprint TEXT PRIMARY KEY,
+    arrays_folder TEXT NOT NULL,
+    n_players INTEGER NOT NULL,
+    n_abilities INTEGER NOT NULL,
+    score_from INTEGER
+);
+CREATE TABLE IF NOT EXISTS candidates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint TEXT NOT NULL,
+    key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    claimed_at REAL,
+    log_likelihood REAL,
+    brier REAL,
+    accuracy REAL,
+    seconds REAL,
+    UNIQUE (fingerprint, key)
+);
+CREATE INDEX IF NOT EXISTS candidates_status ON candidates (fingerprint, status);
+"""
+
+
+def get_data_fingerprint(match_arrays: MatchArrays, n_players: int, score_from: Optional[int] = None) -> str:
+    """Hash identifying the data a sweep is scored on, results are only reused for the same fingerprint
+
+    Args:
+        match_arrays (MatchArrays): contiguous match columns
+        n_players (int): number of players
+        score_from (Optional[int]): day ordinal scoring starts from
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha256(f'{n_players}:{score_from}'.encode())
+    for field in MatchArrays._fields:
+        digest.update(np.ascontiguousarray(getattr(match_arrays, field)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def get_candidate_key(params: Dict[str, float]) -> str:
+    """Canonical (order independent) text for a parameter set"""
+    return json.dumps({name: float(value) for name, value in params.items()}, sort_keys=True)
+
+
+def get_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+@contextmanager
+def connect(path: str) -> sqlite3.Connection:
+    """Opens (creating if needed) a journal in autocommit mode and closes it after, the default rollback journal mode
+    is used so the file can live on a filesystem shared between machines"""
+    connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+    try:
+        connection.executescript(SCHEMA)
+        yield connection
+    finally:
+        connection.close()
+
+
+def add_sweep(path: str, fingerprint: str, arrays_folder: str, n_players: int, n_abilities: int,
+              score_from: Optional[int], candidates: List[Dict[str, float]]) -> int:
+    """Registers a sweep and queues its candidates, candidates already in the journal for this fingerprint (scored or
+    not) are skipped
+
+    Args:
+        path (str): journal path
+        fingerprint (str): data fingerprint (see get_data_fingerprint)
+        arrays_folder (str): folder match arrays were saved to (see save_match_arrays)
+        n_players (int): number of players
+        n_abilities (int): number of abilities per player (surfaces + base)
+        score_from (Optional[int]): day ordinal scoring starts from
+        candidates (List[Dict[str, float]]): parameter sets to evaluate
+
+    Returns:
+        int: number of newly queued candidates
+    """
+    with connect(path) as connection:
+        connection.execute('BEGIN IMMEDIATE')
+        connection.execute('INSERT OR IGNORE INTO sweeps VALUES (?, ?, ?, ?, ?)',
+                           (fingerprint, arrays_folder, n_players, n_abilities, score_from))
+        before = connection.total_changes
+        connection.executemany(
+            'INSERT OR IGNORE INTO candidates (fingerprint, key, params) VALUES (?, ?, ?)',
+            [(fingerprint, get_candidate_key(c), get_candidate_key(c)) for c in candidates])
+        queued = connection.total_changes - before
+        connection.execute('COMMIT')
+
+    logging.info(f'JOURNAL: {queued} new candidates queued, {len(candidates) - queued} already in journal')
+    return queued
+
+
+def get_sweep(path: str, fingerprint: str) -> Dict:
+    """Sweep settings a worker needs to evaluate candidates"""
+    with connect(path) as connection:
+        row = connection.execute(
+            'SELECT arrays_folder, n_players, n_abilities, score_from FROM sweeps WHERE fingerprint = ?',
+            (fingerprint,)).fetchone()
+    if row is None:
+        raise KeyError(f'No sweep with fingerprint: {fingerprint}')
+    return dict(zip(('arrays_folder', 'n_players', 'n_abilities', 'score_from'), row))
+
+
+def claim_candidate(path: str, fingerprint: str, worker: str, stale_after: float = 3600.) -> Optional[tuple]:
+    """Takes the next pending candidate, claims older than stale_after seconds (dead workers) are taken again
+
+    Args:
+        path (str): journal path
+        fingerprint (str): data fingerprint
+        worker (str): worker id
+        stale_after (float): seconds after which a running candidate is assumed abandoned
+
+    Returns:
+        Optional[tuple]: (candidate id, params) or None if nothing left to evaluate
+    """
+    with connect(path) as connection:
+        # immediate takes the write lock up front so two workers can't claim the same row
+        connection.execute('BEGIN IMMEDIATE')
+        row = connection.execute(
+            "SELECT id, params FROM candidates WHERE fingerprint = ? "
+            "AND (status = 'pending' OR (status = 'running' AND claimed_at < ?)) ORDER BY id LIMIT 1",
+            (fingerprint, time.time() - stale_after)).fetchone()
+        if row is not None:
+            connection.execute("UPDATE candidates SET status = 'running', worker = ?, claimed_at = ? WHERE id = ?",
+                               (worker, time.time(), row[0]))
+        connection.execute('COMMIT')
+
+    return None if row is None else (row[0], json.loads(row[1]))
+
+
+def requeue_dead_claims(path: str, fingerprint: str) -> int:
+    """Puts candidates claimed by worker processes on this host that are no longer alive (killed mid evaluation) back
+    in the queue, so a rerun doesn't wait for stale_after. Claims from other hosts can't be checked and are left to
+    stale_after
+
+    Args:
+        path (str): journal path
+        fingerprint (str): data fingerprint
+
+    Returns:
+        int: number of candidates queued again
+    """
+    host = socket.gethostname()
+    with connect(path) as connection:
+        connection.execute('BEGIN IMMEDIATE')
+        rows = connection.execute("SELECT id, worker FROM candidates WHERE fingerprint = ? AND status = 'running'",
+                                  (fingerprint,)).fetchall()
+        dead = [candidate_id for candidate_id, worker in rows
+                if worker is not None and worker.rpartition(':')[0] == host
+                and not is_process_alive(int(worker.rpartition(':')[2]))]
+        connection.executemany("UPDATE candidates SET status = 'pending', worker = NULL, claimed_at = NULL "
+                               "WHERE id = ? AND status = 'running'", [(candidate_id,) for candidate_id in dead])
+        connection.execute('COMMIT')
+
+    if dead:
+        logging.warning(f'JOURNAL: {len(dead)} candidates claimed by dead workers queued again')
+    return len(dead)
+
+
+def is_process_alive(pid: int) -> bool:
+    """True if a process with pid exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, owned by someone else
+        return True
+    return True
+
+
+def record_result(path: str, candidate_id: int, worker: str, metrics: Dict[str, float]):
+    """Stores a candidate's metrics and marks it done
+
+    Args:
+        path (str): journal path
+        candidate_id (int): candidate id (see claim_candidate)
+        worker (str): worker id
+        metrics (Dict[str, float]): log_likelihood, brier, accuracy and seconds
+    """
+    with connect(path) as connection:
+        connection.execute(
+            "UPDATE candidates SET status = 'done', worker = ?, log_likelihood = ?, brier = ?, accuracy = ?, "
+            "seconds = ? WHERE id = ?",
+            (worker, *[float(metrics[name]) for name in ('log_likelihood', 'brier', 'accuracy', 'seconds')],
+             candidate_id))
+
+
+def get_results(path: str, fingerprint: str, candidates: Optional[List[Dict[str, float]]] = None) -> pd.DataFrame:
+    """Scored candidates for a fingerprint, including those of earlier sweeps on the same data unless candidates are
+    given
+
+    Args:
+        path (str): journal path
+        fingerprint (str): data fingerprint
+        candidates (Optional[List[Dict[str, float]]]): only these parameter sets, every scored one if None
+
+    Returns:
+        pd.DataFrame: a row per candidate with params, metrics, seconds and worker, best first
+    """
+    with connect(path) as connection:
+        rows = connection.execute(
+            "SELECT id, params, log_likelihood, brier, accuracy, seconds, worker FROM candidates "
+            "WHERE fingerprint = ? AND status = 'done'", (fingerprint,)).fetchall()
+    if candidates is not None:
+        keys = {get_candidate_key(c) for c in candidates}
+        rows = [row for row in rows if row[1] in keys]
+
+    results = pd.DataFrame(
+        [{**json.loads(params), 'log_likelihood': ll, 'brier': brier, 'accuracy': acc, 'seconds': s, 'worker': w}
+         for _, params, ll, brier, acc, s, w in rows],
+        index=pd.Index([row[0] for row in rows], name='candidate'))
+    return results.sort_values(by='log_likelihood', ascending=False) if len(results) else results
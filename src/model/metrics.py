@@ -0,0 +1,68 @@
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+
+# source labels in itf indicator order (False -> WTA, True -> ITF)
+SOURCE_NAMES = ['WTA', 'ITF']
+
+
+class MetricAccumulator:
+    """Running sums of prediction metrics, updated a round at a time so the predictions themselves never need to be
+    kept. Split by source (WTA / ITF) and optionally by surface
+
+    Args:
+        surfaces (Optional[List[str]]): surface names in surface code order (see get_surface_codes) to split by, no
+            surface split if None
+        score_from (Optional[int]): day ordinal to start scoring from, earlier rounds are burn in
+    """
+    # sums kept for each group, in column order
+    SUMS = ('total', 'log_likelihood', 'squared_error', 'correct')
+
+    def __init__(self, surfaces: Optional[List[str]] = None, score_from: Optional[int] = None):
+        self.surfaces = None if surfaces is None else list(surfaces)
+        self.score_from = score_from
+
+        self.source_sums = np.zeros((len(SOURCE_NAMES), len(self.SUMS)))
+        # last row is matches with no surface
+        self.surface_sums = None if surfaces is None else np.zeros((len(self.surfaces) + 1, len(self.SUMS)))
+
+    def update(self, probs: np.array, itf: np.array, surface_codes: Optional[np.array] = None,
+               date: Optional[int] = None):
+        """Adds a round of predictions
+
+        Args:
+            probs (np.array): predicted probability of the winner winning
+            itf (np.array): True if game on itf circuit
+            surface_codes (Optional[np.array]): surface codes, required if splitting by surface
+            date (Optional[int]): day ordinal of the round, checked against score_from
+        """
+        if self.score_from is not None and date is not None and date < self.score_from:
+            return
+
+        # probs are always from the winners perspective
+        values = (np.ones_like(probs), np.log(probs), (1 - probs)**2, probs > 0.5)
+
+        for sums, codes in ((self.source_sums, itf), (self.surface_sums, surface_codes)):
+            if sums is not None:
+                codes = np.asarray(codes, dtype=np.intp)
+                for j, value in enumerate(values):
+                    sums[:, j] += np.bincount(codes, weights=value, minlength=len(sums))
+
+    def get_metrics(self) -> pd.DataFrame:
+        """Metrics for every group
+
+        Returns:
+            pd.DataFrame: row for Overall, each source and each surface (if split) with total, log likelihood (sum),
+                brier score and accuracy
+        """
+        sums = [self.source_sums.sum(axis=0, keepdims=True), self.source_sums]
+        index = ['Overall', *SOURCE_NAMES]
+        if self.surface_sums is not None:
+            sums.append(self.surface_sums[:-1])
+            index += self.surfaces
+        sums = np.concatenate(sums)
+
+        total = sums[:, 0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({'total': total.astype(int), 'log_likelihood': sums[:, 1],
+                                 'brier': sums[:, 2] / total, 'accuracy': sums[:, 3] / total}, index=index)
@@ -1,8 +1,23 @@
-from typing import Union, List, Dict, Optional, Tuple
+from typing import Union, List, Dict, Optional, Tuple, NamedTuple, Iterator, Sequence, TYPE_CHECKING
 import numpy as np
 import pandas as pd
 from scipy.stats import binom
 from copy import deepcopy
+from functools import partial
+import logging
+
+from .metrics import MetricAccumulator
+from .sequential import elo_match_kernel
+
+if TYPE_CHECKING:
+    from .features import FeatureMatrix
+    from .history import HistoryRecorder
+    from .observers import EloObserver
+
+# player state arrays, in the order every function takes them
+STATE_FIELDS = ('player_abs', 'games_played', 'player_trend', 'at_abilities')
+# units of matches elo can update players in, finest first (see get_round_bounds)
+GRANULARITIES = ('match', 'day', 'week')
 
 
 def get_surface_weights(one_hot_surface: np.array, surface_weight: Union[float, np.array]) -> Tuple[np.array]:
@@ -15,15 +30,11 @@ def get_surface_weights(one_hot_surface: np.array, surface_weight: Union[float,
     Returns:
         Tuple[np.array]: surface weights, playing_surfaces
     """
-    # only surface in play will be != 0
+    # only surface in play will be != 0
     s_weights = one_hot_surface*surface_weight
-    try:
-        # base takes all weight not assigned to surface, reshape so that 2d
-        base_weight = 1 - s_weights.sum(axis=1).reshape(-1, 1)
-        s_weight = np.append(s_weights, base_weight, axis=1)
-    except np.AxisError:
-        base_weight = 1 - s_weights.sum()
-        s_weight = np.append(s_weights, base_weight)
+    # base takes all weight not assigned to surface, surfaces are always the last axis (leading axes are broadcast)
+    base_weight = 1 - s_weights.sum(axis=-1, keepdims=True)
+    s_weight = np.concatenate((s_weights, base_weight), axis=-1)
     return s_weight, (s_weight > 0).astype(int)
 
 
@@ -44,10 +55,8 @@ def get_current_ability(
         float: Players current surface specific ability
     """
     assert c_ability.shape == at_ability.shape
-    try:
-        c_ab = np.sum(c_ability*s_weights, axis=1)*(1 - at_weight) + np.sum(at_ability*s_weights, axis=1)*at_weight
-    except np.AxisError:
-        c_ab = np.sum(c_ability*s_weights)*(1 - at_weight) + np.sum(at_ability*s_weights)*at_weight
+    # abilities are always the last axis (leading axes are broadcast)
+    c_ab = np.sum(c_ability*s_weights, axis=-1)*(1 - at_weight) + np.sum(at_ability*s_weights, axis=-1)*at_weight
 
     return c_ab + c_ab*c_trend*trend_weight
 
@@ -65,21 +74,23 @@ def get_probs(player_a: float, player_b: float) -> float:
     return 1 - 1/(1 + np.power(10, (player_a - player_b)/400))
 
 
-def get_log_likelihood(probs: float, y: int) -> float:
+def get_log_likelihood(probs: float, y: int, axis: Optional[int] = None) -> float:
     """Calculate log likelihood based on predictions
 
     Args:
         probs (float): predictions (0,1)
         y (int): outcomes, binary [0,1]
+        axis (Optional[int]): axis to sum over, all if None
 
     Returns:
         float: log likelihood
     """
-    return np.log(probs*y + (1 - y)*(1 - probs)).sum()
+    return np.log(probs*y + (1 - y)*(1 - probs)).sum(axis=axis)
 
 
 def get_performance_score(
-        probs: float, g_won: int, g_lost: int, s_won: int, s_lost: int, p: float, s_boost: float) -> Tuple[np.array]:
+        probs: float, g_won: int, g_lost: int, s_won: int, s_lost: int, p: float, s_boost: float,
+        games_cdf: Optional[np.array] = None) -> Tuple[np.array]:
     """Represents the winners performance in a game (losers = 1 - winners)
 
     Args:
@@ -90,11 +101,14 @@ def get_performance_score(
         s_lost (int): Sets lost by winner
         p (float): probability of winner winning a game
         s_boost (float): added to winners performance score if they win in staright sets
+        games_cdf (Optional[np.array]): binomial cdf of games won (see PrimitiveTable), computed if None
 
     Returns:
         Tuple[np.array]: Winners performance scores, Losers performance scores
     """
-    w_performance = binom.cdf(g_won, (g_won + g_lost), p) + ((s_won - s_lost) == 2)*s_boost
+    if games_cdf is None:
+        games_cdf = binom.cdf(g_won, (g_won + g_lost), p)
+    w_performance = games_cdf + ((s_won - s_lost) == 2)*s_boost
     l_performance = 1 - w_performance
 
     return w_performance - probs, l_performance - (1 - probs)
@@ -148,8 +162,105 @@ def get_updated_trend(c_trend: float, performance: float, update_rate: float) ->
     return c_trend*(1 - update_rate) + performance*update_rate
 
 
-def elo_single_round(params: Dict[str, float],
-                     data: pd.DataFrame,
+def get_surface_codes(one_hot_surface: np.array) -> np.array:
+    """Position of the surface played on in the one hot encoding, matches without a surface get n_surfaces
+
+    Args:
+        one_hot_surface (np.array): One hot surface encoding for each match (row)
+
+    Returns:
+        np.array: surface code for each match
+    """
+    codes = np.where(one_hot_surface.any(axis=1), one_hot_surface.argmax(axis=1), one_hot_surface.shape[1])
+    return codes.astype(np.int8)
+
+
+class PrimitiveTable:
+    """Model primitives precomputed for a single parameter set, so rounds use integer gathers rather than scipy and
+    np.power. Values are identical to the functions they replace
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        n_surfaces (int): number of surfaces in the one hot encoding
+        max_games (int): largest total games in a match held in the binomial table (larger computed directly)
+        max_played (int): games played held in the k factor table (more computed directly)
+    """
+
+    def __init__(self, params: Dict[str, float], n_surfaces: int = 3, max_games: int = 80, max_played: int = 2048):
+        self.params = params
+
+        games = np.arange(max_games + 1)
+        # [games won, total games]
+        self.binom_cdf = binom.cdf(games[:, None], games[None, :], params['p'])
+
+        # [itf, games played]
+        self.k_factor = get_k_factor(
+            games_played=np.arange(max_played)[None, :], K=params['K'], offset=params['offset'],
+            shape=params['shape'], ift_indicator=np.array([[False], [True]]), itf_deduction=params['itf_deduction'])
+
+        # [surface code], last row is a match without a surface
+        one_hot = np.vstack((np.eye(n_surfaces, dtype=int), np.zeros((1, n_surfaces), dtype=int)))
+        self.surface_weights, self.playing_surface = get_surface_weights(one_hot, params['surface_weight'])
+
+    def get_binom_cdf(self, g_won: np.array, g_lost: np.array) -> np.array:
+        """binom.cdf(g_won, g_won + g_lost, p)"""
+        won, total = g_won.astype(np.intp), (g_won + g_lost).astype(np.intp)
+        outside = total >= self.binom_cdf.shape[1]
+        if not outside.any():
+            return self.binom_cdf[won, total]
+
+        last = self.binom_cdf.shape[1] - 1
+        cdf = self.binom_cdf[np.minimum(won, last), np.minimum(total, last)]
+        cdf[outside] = binom.cdf(g_won[outside], total[outside], self.params['p'])
+        return cdf
+
+    def get_k_factor(self, games_played: np.array, itf_indicator: np.array) -> np.array:
+        """get_k_factor for the parameters this table was built with"""
+        played = games_played.astype(np.intp)
+        itf = np.broadcast_to(itf_indicator, played.shape)
+        outside = played >= self.k_factor.shape[1]
+        if not outside.any():
+            return self.k_factor[itf.astype(np.intp), played]
+
+        k_factor = self.k_factor[itf.astype(np.intp), np.minimum(played, self.k_factor.shape[1] - 1)]
+        k_factor[outside] = get_k_factor(
+            games_played[outside], self.params['K'], self.params['offset'], self.params['shape'], itf[outside],
+            self.params['itf_deduction'])
+        return k_factor
+
+
+class MatchArrays(NamedTuple):
+    """Match dataframe converted to contiguous numpy columns, sorted by date (stable)"""
+    dates: np.ndarray
+    w_id: np.ndarray
+    w_games: np.ndarray
+    w_sets: np.ndarray
+    l_id: np.ndarray
+    l_games: np.ndarray
+    l_sets: np.ndarray
+    surfaces: np.ndarray
+    surface_codes: np.ndarray
+    itf: np.ndarray
+    order: np.ndarray
+
+
+def get_day_ordinals(dates: Union[pd.Series, np.array]) -> np.array:
+    """Converts dates to int32 day ordinals (days since epoch), non datetime columns are ranked so ordering is kept
+
+    Args:
+        dates (Union[pd.Series, np.array]): Dates for each match
+
+    Returns:
+        np.array: int32 day ordinal for each match
+    """
+    dates = np.asarray(dates)
+    if np.issubdtype(dates.dtype, np.datetime64):
+        return dates.astype('datetime64[D]').astype(np.int32)
+    return pd.factorize(dates, sort=True)[0].astype(np.int32)
+
+
+def get_match_arrays(data: pd.DataFrame,
+                     date_col: str,
                      w_id_col: str,
                      w_games_col: str,
                      w_sets_col: str,
@@ -157,16 +268,12 @@ def elo_single_round(params: Dict[str, float],
                      l_games_col: str,
                      l_sets_col: str,
                      surface_cols: List[str],
-                     itf_col: str,
-                     player_abs: np.array,
-                     games_played: np.array,
-                     player_trend: np.array,
-                     at_abilities: np.array) -> Tuple[np.array]:
-    """ELO runs over dates this function runs a single date and returns updated player specific data and predicted probs
+                     itf_col: str) -> MatchArrays:
+    """Extracts every column the model needs once, rows stable sorted by date so each date is a contiguous slice
 
     Args:
-        params (Dict[str, float]): ELO model parameters (parameters.yml)
         data (pd.DataFrame): Match dataframe
+        date_col (str): Column with date
         w_id_col (str): Column with winner ids
         w_games_col (str): Columns with games won by winner
         w_sets_col (str): Columns with sets won by winner
@@ -175,81 +282,976 @@ def elo_single_round(params: Dict[str, float],
         l_sets_col (str): Columns with games won by loser
         surface_cols (List[str]): Columns of 1 hot encoding of surfaces
         itf_col (str): Column with bool indicator if game on itf circuit
+
+    Returns:
+        MatchArrays: contiguous columns, `order` maps each row back to its position in data
+    """
+    dates = get_day_ordinals(data[date_col])
+    # stable so matches within a date keep their original order (same as groupby)
+    order = np.argsort(dates, kind='stable')
+
+    def column(values: np.array) -> np.array:
+        return np.ascontiguousarray(np.asarray(values)[order])
+
+    return MatchArrays(
+        dates=column(dates),
+        w_id=column(data[w_id_col].values),
+        w_games=column(data[w_games_col].values),
+        w_sets=column(data[w_sets_col].values),
+        l_id=column(data[l_id_col].values),
+        l_games=column(data[l_games_col].values),
+        l_sets=column(data[l_sets_col].values),
+        surfaces=column(data[list(surface_cols)].values),
+        surface_codes=column(get_surface_codes(data[list(surface_cols)].values)),
+        itf=column((data[itf_col] == 'I').values),
+        order=order)
+
+
+def get_match_slice(match_arrays: MatchArrays, start: int, end: int) -> MatchArrays:
+    """Matches at sorted positions [start, end) as their own MatchArrays (views, no copies), order is reset so
+    elo_arrays returns probs in sorted order for the slice
+
+    Args:
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        start (int): first match (sorted position)
+        end (int): stop before this match (sorted position)
+
+    Returns:
+        MatchArrays: sliced match columns
+    """
+    return MatchArrays(**{field: values[start:end] for field, values in match_arrays._asdict().items()
+                          if field != 'order'}, order=np.arange(end - start))
+
+
+def get_date_bounds(dates: np.array) -> np.array:
+    """Positions where a new date starts within a sorted date array, first is 0 and last is len(dates)
+
+    Args:
+        dates (np.array): sorted dates (day ordinals)
+
+    Returns:
+        np.array: round boundaries, round i is dates[bounds[i]:bounds[i + 1]]
+    """
+    if not len(dates):
+        return np.zeros((1,), dtype=np.int64)
+    return np.concatenate(([0], np.flatnonzero(np.diff(dates)) + 1, [len(dates)])).astype(np.int64)
+
+
+def get_week_ordinals(dates: np.array) -> np.array:
+    """Tournament (Monday to Sunday) week of each day ordinal, counted from the week of 1970-01-01"""
+    # day 0 (1970-01-01) is a Thursday, shifting by 3 makes weeks start on Monday
+    return (np.asarray(dates).astype(np.int64) + 3) // 7
+
+
+def get_round_bounds(dates: np.array, granularity: str = 'day') -> np.array:
+    """Boundaries of the rounds players are updated in, every match in a round is predicted from the state before it
+
+    Args:
+        dates (np.array): sorted dates (day ordinals)
+        granularity (str): `day` (inferred date), `week` (tournament week) or `match`, which still returns date
+            bounds as those rounds are applied a match at a time (see elo_round_sequential)
+
+    Returns:
+        np.array: round boundaries, round i is dates[bounds[i]:bounds[i + 1]]
+    """
+    if granularity in ('match', 'day'):
+        return get_date_bounds(dates)
+    if granularity == 'week':
+        return get_date_bounds(get_week_ordinals(dates))
+    raise ValueError(f'Unknown granularity: {granularity}')
+
+
+def get_collision_count(rounds: np.array, w_id: np.array, l_id: np.array) -> int:
+    """Number of times a player appears again in a round they've already played in (round robins, bad inferred dates
+    etc.), these rounds are applied as waves (see get_round_waves)
+
+    Args:
+        rounds (np.array): round of each match, day ordinals or week ordinals (see get_round_bounds)
+        w_id (np.array): winner ids
+        l_id (np.array): loser ids
+
+    Returns:
+        int: player appearances beyond the first within each round
+    """
+    ids = np.concatenate((w_id, l_id)).astype(np.int64)
+    rounds = np.concatenate((rounds, rounds)).astype(np.int64)
+    # unique (round, player) pairs, any extra appearance is a collision
+    keys = (rounds - rounds.min(initial=0))*(ids.max(initial=0) + 1) + ids
+    return len(keys) - len(np.unique(keys))
+
+
+def get_round_waves(w_id: np.array, l_id: np.array) -> np.array:
+    """Splits a round into conflict free waves, no player appears twice within a wave and a players matches keep their
+    original order across waves (wave = longest chain of earlier matches sharing a player)
+
+    Args:
+        w_id (np.array): winner ids
+        l_id (np.array): loser ids
+
+    Returns:
+        np.array: wave each match belongs to, 0 -> n_waves - 1
+    """
+    n = len(w_id)
+    ids = np.concatenate((w_id, l_id))
+    match = np.tile(np.arange(n), 2)
+
+    # previous match (within round) each player appeared in, -1 if first appearance
+    order = np.lexsort((match, ids))
+    same = ids[order][1:] == ids[order][:-1]
+    prev = np.full(2*n, -1)
+    prev[order[1:][same]] = match[order][:-1][same]
+    prev_w, prev_l = prev[:n], prev[n:]
+
+    # relax until stable, iterations bounded by longest chain (usually 1 or 2)
+    waves = np.zeros(n, dtype=np.int64)
+    while True:
+        new_waves = np.maximum(np.where(prev_w >= 0, waves[prev_w] + 1, 0), np.where(prev_l >= 0, waves[prev_l] + 1, 0))
+        if (new_waves == waves).all():
+            return waves
+        waves = new_waves
+
+
+def get_compact_state(player_abs: np.array,
+                      games_played: np.array,
+                      player_trend: np.array,
+                      at_abilities: np.array,
+                      dtype: type = np.float32) -> Tuple[np.array]:
+    """Copies state into a single (n_players, 3 * n_abilities + 1) buffer with a record per player laid out as
+    [abilities | all time abilities | trend | games played], so the per match gathers read one contiguous record
+    rather than four arrays. The returned arrays are column views of the buffer and can be used anywhere the separate
+    arrays are (leading lane axes are kept)
+
+    Args:
         player_abs (np.array): current player abilities
         games_played (np.array): games played previously
         player_trend (np.array): current trend
         at_abilities (np.array): all time max abilities
+        dtype (type): storage type, float32 halves memory (updates are still computed in float64)
 
     Returns:
-        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs
+        Tuple[np.array]: player_abs, games_played, player_trend, at_abilities (views of the compact buffer)
+    """
+    n_abilities = player_abs.shape[-1]
+    record = np.empty(player_abs.shape[:-1] + (3*n_abilities + 1,), dtype=dtype)
+
+    record[..., :n_abilities] = player_abs
+    record[..., n_abilities:2*n_abilities] = at_abilities
+    record[..., 2*n_abilities] = player_trend
+    record[..., 2*n_abilities + 1:] = games_played
+
+    return (record[..., :n_abilities], record[..., 2*n_abilities + 1:], record[..., 2*n_abilities],
+            record[..., n_abilities:2*n_abilities])
+
+
+def get_activity_order(dates: np.array, w_id: np.array, l_id: np.array, n_players: int) -> np.array:
+    """Player ids in the order they first play (players who never play last), so the players active at any point of a
+    replay sit in a narrow window of rows rather than scattered over the alphabetical ids get_player_map assigns
+
+    Args:
+        dates (np.array): day ordinal of each match
+        w_id (np.array): winner ids
+        l_id (np.array): loser ids
+        n_players (int): number of players in the state
+
+    Returns:
+        np.array: public id of each internal id, internal player i is public player order[i]
+    """
+    # same order the engines apply matches in (stable by date, winner before loser)
+    sort = np.argsort(dates, kind='stable')
+    ids = np.stack((w_id[sort], l_id[sort]), axis=1).ravel().astype(np.int64)
+
+    seen, first = np.unique(ids, return_index=True)
+    order = np.full((n_players,), -1, dtype=np.int64)
+    order[:len(seen)] = seen[np.argsort(first, kind='stable')]
+    order[len(seen):] = np.setdiff1d(np.arange(n_players), seen)
+    return order
+
+
+def get_renumbered_state(order: np.array,
+                         player_abs: np.array,
+                         games_played: np.array,
+                         player_trend: np.array,
+                         at_abilities: np.array) -> Tuple[np.array]:
+    """Copies of the state with players in a new order, row i holds player order[i]. Renumbering with the inverse
+    (np.argsort(order)) restores the original order
+
+    Args:
+        order (np.array): permutation of player ids (see get_activity_order)
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+
+    Returns:
+        Tuple[np.array]: player_abs, games_played, player_trend, at_abilities (renumbered copies)
+    """
+    return player_abs[..., order, :], games_played[..., order, :], player_trend[..., order], at_abilities[..., order, :]
+
+
+def update_players(params: Dict[str, float],
+                   ids: np.array,
+                   performance: np.array,
+                   playing_surface: np.array,
+                   itf_indicator: np.array,
+                   player_abs: np.array,
+                   games_played: np.array,
+                   player_trend: np.array,
+                   at_abilities: np.array,
+                   tables: Optional[PrimitiveTable] = None):
+    """Applies a set of performances to player state in place, ids must be unique
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        ids (np.array): player ids (unique)
+        performance (np.array): players performance score for each match
+        playing_surface (np.array): surface match was played on and base
+        itf_indicator (np.array): True if game on itf circuit (column vector)
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
     """
-    w_id, l_id = data[w_id_col].values, data[l_id_col].values
+    if tables is None:
+        k_factor = get_k_factor(
+            games_played=games_played[..., ids, :],
+            K=params['K'],
+            offset=params['offset'],
+            shape=params['shape'],
+            ift_indicator=itf_indicator,
+            itf_deduction=params['itf_deduction'])
+    else:
+        k_factor = tables.get_k_factor(games_played[ids], itf_indicator)
+
+    player_abs[..., ids, :] += get_ability_change(k_factor=k_factor,
+                                                  p_score=performance[..., None], playing_surface=playing_surface)
+
+    # due to performance score although unlikely is possible losers ability increases and thus could be max observed
+    at_abilities[..., ids, :] = np.maximum(player_abs[..., ids, :], at_abilities[..., ids, :])
+
+    player_trend[..., ids] = get_updated_trend(c_trend=player_trend[..., ids],
+                                               performance=performance, update_rate=params['trend_rate'])
+
+    games_played[..., ids, :] += playing_surface
+
+
+def elo_round_arrays(params: Dict[str, float],
+                     w_id: np.array,
+                     w_games: np.array,
+                     w_sets: np.array,
+                     l_id: np.array,
+                     l_games: np.array,
+                     l_sets: np.array,
+                     surfaces: np.array,
+                     itf: np.array,
+                     player_abs: np.array,
+                     games_played: np.array,
+                     player_trend: np.array,
+                     at_abilities: np.array,
+                     tables: Optional[PrimitiveTable] = None,
+                     surface_codes: Optional[np.array] = None,
+                     abilities: Optional[np.array] = None) -> Tuple[np.array]:
+    """Same as elo_single_round but takes the round's columns as plain arrays
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        w_id (np.array): winner ids
+        w_games (np.array): games won by winner
+        w_sets (np.array): sets won by winner
+        l_id (np.array): loser ids
+        l_games (np.array): games won by loser
+        l_sets (np.array): sets won by loser
+        surfaces (np.array): 1 hot encoding of surfaces
+        itf (np.array): True if game on itf circuit
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
+        surface_codes (Optional[np.array]): surface codes (see get_surface_codes), only used with tables
+        abilities (Optional[np.array]): (2, n_matches) buffer the winner and loser current abilities are written to
 
-    s_weights, playing_surface = get_surface_weights(
-        one_hot_surface=data[surface_cols].values, surface_weight=params['surface_weight'])
+    Returns:
+        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs
+    """
+    if tables is None:
+        s_weights, playing_surface = get_surface_weights(
+            one_hot_surface=surfaces, surface_weight=params['surface_weight'])
+        games_cdf = None
+    else:
+        surface_codes = get_surface_codes(surfaces) if surface_codes is None else surface_codes
+        s_weights, playing_surface = tables.surface_weights[surface_codes], tables.playing_surface[surface_codes]
+        games_cdf = tables.get_binom_cdf(w_games, l_games)
 
     # winner & loser current ability prior to game
     w_ability = get_current_ability(
-        c_ability=player_abs[w_id],
-        at_ability=at_abilities[w_id],
+        c_ability=player_abs[..., w_id, :],
+        at_ability=at_abilities[..., w_id, :],
         s_weights=s_weights,
         at_weight=params['all_time_weight'],
-        c_trend=player_trend[w_id],
+        c_trend=player_trend[..., w_id],
         trend_weight=params['trend_weight'])
 
     l_ability = get_current_ability(
-        c_ability=player_abs[l_id],
-        at_ability=at_abilities[l_id],
+        c_ability=player_abs[..., l_id, :],
+        at_ability=at_abilities[..., l_id, :],
         s_weights=s_weights,
         at_weight=params['all_time_weight'],
-        c_trend=player_trend[l_id],
+        c_trend=player_trend[..., l_id],
         trend_weight=params['trend_weight'])
 
     probs = get_probs(player_a=w_ability, player_b=l_ability)
+    if abilities is not None:
+        abilities[0], abilities[1] = w_ability, l_ability
 
     w_performance, l_performance = get_performance_score(
-        probs=probs, g_won=data[w_games_col].values, g_lost=data[l_games_col].values, s_won=data[w_sets_col].values,
-        s_lost=data[l_sets_col].values, p=params['p'],
-        s_boost=params['straight_sets_boost'])
-
-    itf_indicator = (data[itf_col] == 'I').values.reshape(-1, 1)
-
-    w_k_factor = get_k_factor(
-        games_played=games_played[w_id],
-        K=params['K'],
-        offset=params['offset'],
-        shape=params['shape'],
-        ift_indicator=itf_indicator,
-        itf_deduction=params['itf_deduction'])
-
-    l_k_factor = get_k_factor(
-        games_played=games_played[l_id],
-        K=params['K'],
-        offset=params['offset'],
-        shape=params['shape'],
-        ift_indicator=itf_indicator,
-        itf_deduction=params['itf_deduction'])
-
-    player_abs[w_id] += get_ability_change(k_factor=w_k_factor,
-                                           p_score=w_performance.reshape(-1, 1), playing_surface=playing_surface)
-    player_abs[l_id] += get_ability_change(k_factor=l_k_factor,
-                                           p_score=l_performance.reshape(-1, 1), playing_surface=playing_surface)
+        probs=probs, g_won=w_games, g_lost=l_games, s_won=w_sets, s_lost=l_sets, p=params['p'],
+        s_boost=params['straight_sets_boost'], games_cdf=games_cdf)
 
-    # due to performance score although unlikely is possible losers ability increases and thus could be max observed
-    at_abilities[w_id] = np.maximum(player_abs[w_id], at_abilities[w_id])
-    at_abilities[l_id] = np.maximum(player_abs[l_id], at_abilities[l_id])
+    itf_indicator = itf.reshape(-1, 1)
 
-    player_trend[w_id] = get_updated_trend(c_trend=player_trend[w_id],
-                                           performance=w_performance, update_rate=params['trend_rate'])
-    player_trend[l_id] = get_updated_trend(c_trend=player_trend[l_id],
-                                           performance=l_performance, update_rate=params['trend_rate'])
+    ids = np.sort(np.concatenate((w_id, l_id)))
+    if (ids[1:] != ids[:-1]).all():
+        waves = [slice(None)]
+    else:
+        # fancy index `+=` drops repeated ids, apply the round as conflict free waves (pre round probs kept)
+        round_waves = get_round_waves(w_id, l_id)
+        waves = [round_waves == wave for wave in range(round_waves.max() + 1)]
 
-    games_played[w_id] += playing_surface
-    games_played[l_id] += playing_surface
+    for wave in waves:
+        for ids, performance in ((w_id[wave], w_performance[..., wave]), (l_id[wave], l_performance[..., wave])):
+            update_players(params=params, ids=ids, performance=performance,
+                           playing_surface=playing_surface[..., wave, :],
+                           itf_indicator=itf_indicator[wave], player_abs=player_abs, games_played=games_played,
+                           player_trend=player_trend, at_abilities=at_abilities, tables=tables)
 
     return player_abs, games_played, player_trend, at_abilities, probs
 
 
+class RoundWorkspace:
+    """Scratch buffers for elo_round_workspace, sized once to the largest date group so a round allocates nothing
+    beyond array views. Buffers are float64, state must be too
+
+    Args:
+        max_matches (int): most matches on a single date
+        n_abilities (int): number of abilities per player (surfaces + base)
+    """
+
+    def __init__(self, max_matches: int, n_abilities: int):
+        self.max_matches = max_matches
+
+        # (m, n_abilities) gathers and updates
+        self.abilities = np.empty((2, max_matches, n_abilities))
+        self.s_weights = np.empty((max_matches, n_abilities))
+        self.playing_surface = np.empty((max_matches, n_abilities), dtype=int)
+        self.k_factor = np.empty((max_matches, n_abilities))
+        self.played = np.empty((max_matches, n_abilities), dtype=np.intp)
+        # (m,) per match values
+        self.values = np.empty((6, max_matches))
+        self.probs = np.empty((max_matches,))
+        self.won = np.empty((max_matches,), dtype=np.intp)
+        self.flags = np.empty((2*max_matches,), dtype=bool)
+        self.itf = np.empty((max_matches, 1), dtype=np.intp)
+        # both sides' ids, sorted to check for repeat players
+        self.ids = np.empty((2*max_matches,), dtype=np.int64)
+        # a wave's share of the round when players repeat
+        self.wave_ids = np.empty((max_matches,), dtype=np.int64)
+        self.wave_performance = np.empty((max_matches,))
+        self.wave_surface = np.empty((max_matches, n_abilities), dtype=int)
+        self.wave_itf = np.empty((max_matches, 1), dtype=np.intp)
+
+    @classmethod
+    def for_matches(cls, match_arrays: MatchArrays, granularity: str = 'day') -> 'RoundWorkspace':
+        """Workspace big enough for every round in match_arrays (see get_round_bounds)"""
+        bounds = get_round_bounds(match_arrays.dates, granularity)
+        return cls(int(np.diff(bounds).max(initial=0)), match_arrays.surfaces.shape[1] + 1)
+
+
+def update_players_workspace(params: Dict[str, float],
+                             ids: np.array,
+                             performance: np.array,
+                             playing_surface: np.array,
+                             itf_indicator: np.array,
+                             player_abs: np.array,
+                             games_played: np.array,
+                             player_trend: np.array,
+                             at_abilities: np.array,
+                             tables: PrimitiveTable,
+                             workspace: RoundWorkspace):
+    """update_players (with tables) computed in the workspace buffers, ids must be unique
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        ids (np.array): player ids (unique)
+        performance (np.array): players performance score for each match
+        playing_surface (np.array): surface match was played on and base
+        itf_indicator (np.array): 1 if game on itf circuit (integer column vector)
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        tables (PrimitiveTable): precomputed primitives for params
+        workspace (RoundWorkspace): scratch buffers
+    """
+    m = len(ids)
+    ws = workspace
+    current, other = ws.abilities[0, :m], ws.abilities[1, :m]
+    k_factor, played, trend, change = ws.k_factor[:m], ws.played[:m], ws.values[4, :m], ws.values[5, :m]
+
+    # k factor gathered from the table, games played past the end of it computed directly
+    np.take(games_played, ids, axis=0, out=other, mode='clip')
+    np.copyto(played, other, casting='unsafe')
+    if played.max(initial=0) < tables.k_factor.shape[1]:
+        np.multiply(itf_indicator, tables.k_factor.shape[1], out=ws.played[:m])
+        np.add(ws.played[:m], other, out=ws.played[:m], casting='unsafe')
+        np.take(tables.k_factor, ws.played[:m], out=k_factor, mode='clip')
+    else:
+        k_factor[:] = tables.get_k_factor(other, itf_indicator.astype(bool))
+
+    # ability change, k_factor*p_score*playing_surface
+    np.multiply(k_factor, performance[:, None], out=k_factor)
+    np.multiply(k_factor, playing_surface, out=k_factor)
+
+    np.take(player_abs, ids, axis=0, out=current, mode='clip')
+    np.add(current, k_factor, out=current)
+    player_abs[ids] = current
+
+    np.take(at_abilities, ids, axis=0, out=k_factor, mode='clip')
+    np.maximum(current, k_factor, out=k_factor)
+    at_abilities[ids] = k_factor
+
+    np.take(player_trend, ids, out=trend, mode='clip')
+    np.multiply(trend, 1 - params['trend_rate'], out=trend)
+    np.multiply(performance, params['trend_rate'], out=change)
+    np.add(trend, change, out=trend)
+    player_trend[ids] = trend
+
+    np.add(other, playing_surface, out=other)
+    games_played[ids] = other
+
+
+def elo_round_workspace(params: Dict[str, float],
+                        w_id: np.array,
+                        w_games: np.array,
+                        w_sets: np.array,
+                        l_id: np.array,
+                        l_games: np.array,
+                        l_sets: np.array,
+                        surfaces: np.array,
+                        itf: np.array,
+                        player_abs: np.array,
+                        games_played: np.array,
+                        player_trend: np.array,
+                        at_abilities: np.array,
+                        tables: PrimitiveTable,
+                        surface_codes: np.array,
+                        workspace: RoundWorkspace,
+                        abilities: Optional[np.array] = None) -> Tuple[np.array]:
+    """Same as elo_round_arrays (with tables) writing every temporary into the workspace with out= arguments, results
+    are identical. Rounds with repeat players only allocate to find their waves, rounds outside the binomial table
+    fall back to elo_round_arrays
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        w_id (np.array): winner ids
+        w_games (np.array): games won by winner
+        w_sets (np.array): sets won by winner
+        l_id (np.array): loser ids
+        l_games (np.array): games won by loser
+        l_sets (np.array): sets won by loser
+        surfaces (np.array): 1 hot encoding of surfaces
+        itf (np.array): True if game on itf circuit
+        player_abs (np.array): current player abilities (float64)
+        games_played (np.array): games played previously (float64)
+        player_trend (np.array): current trend (float64)
+        at_abilities (np.array): all time max abilities (float64)
+        tables (PrimitiveTable): precomputed primitives for params
+        surface_codes (np.array): surface codes (see get_surface_codes)
+        workspace (RoundWorkspace): scratch buffers
+        abilities (Optional[np.array]): (2, n_matches) buffer the winner and loser current abilities are written to
+
+    Returns:
+        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs (a view of the
+            workspace, overwritten by the next round)
+    """
+    m, ws = len(w_id), workspace
+    ids, flags = ws.ids[:2*m], ws.flags[:2*m - 1]
+    ids[:m], ids[m:] = w_id, l_id
+    ids.sort()
+    np.not_equal(ids[1:], ids[:-1], out=flags)
+    unique = flags.all()
+
+    cdf, total = ws.values[0, :m], ws.values[1, :m]
+    np.add(w_games, l_games, out=total)
+    if total.max(initial=0) >= tables.binom_cdf.shape[1]:
+        return elo_round_arrays(
+            params=params, w_id=w_id, w_games=w_games, w_sets=w_sets, l_id=l_id, l_games=l_games, l_sets=l_sets,
+            surfaces=surfaces, itf=itf, player_abs=player_abs, games_played=games_played, player_trend=player_trend,
+            at_abilities=at_abilities, tables=tables, surface_codes=surface_codes, abilities=abilities)
+
+    s_weights, playing_surface = ws.s_weights[:m], ws.playing_surface[:m]
+    np.take(tables.surface_weights, surface_codes, axis=0, out=s_weights, mode='clip')
+    np.take(tables.playing_surface, surface_codes, axis=0, out=playing_surface, mode='clip')
+
+    # binom cdf gathered from the flattened [won, total] table
+    np.copyto(ws.won[:m], w_games, casting='unsafe')
+    np.multiply(ws.won[:m], tables.binom_cdf.shape[1], out=ws.won[:m])
+    np.add(ws.won[:m], total, out=ws.won[:m], casting='unsafe')
+    np.take(tables.binom_cdf, ws.won[:m], out=cdf, mode='clip')
+
+    at_weight, trend_weight = params['all_time_weight'], params['trend_weight']
+    current, other = ws.abilities[0, :m], ws.abilities[1, :m]
+    w_ability, l_ability, trend = ws.values[2, :m], ws.values[3, :m], ws.values[4, :m]
+
+    # current ability, see get_current_ability
+    for ability, player_ids in ((w_ability, w_id), (l_ability, l_id)):
+        np.take(player_abs, player_ids, axis=0, out=current, mode='clip')
+        np.multiply(current, s_weights, out=current)
+        np.sum(current, axis=-1, out=ability)
+        np.multiply(ability, 1 - at_weight, out=ability)
+
+        np.take(at_abilities, player_ids, axis=0, out=other, mode='clip')
+        np.multiply(other, s_weights, out=other)
+        np.sum(other, axis=-1, out=trend)
+        np.multiply(trend, at_weight, out=trend)
+        np.add(ability, trend, out=ability)
+
+        np.take(player_trend, player_ids, out=trend, mode='clip')
+        np.multiply(ability, trend, out=trend)
+        np.multiply(trend, trend_weight, out=trend)
+        np.add(ability, trend, out=ability)
+
+    # probs, see get_probs
+    probs = ws.probs[:m]
+    np.subtract(w_ability, l_ability, out=probs)
+    np.divide(probs, 400, out=probs)
+    np.power(10, probs, out=probs)
+    np.add(1, probs, out=probs)
+    np.divide(1, probs, out=probs)
+    np.subtract(1, probs, out=probs)
+    if abilities is not None:
+        abilities[0], abilities[1] = w_ability, l_ability
+
+    # performance scores, see get_performance_score
+    w_performance, l_performance = w_ability, l_ability
+    np.subtract(w_sets, l_sets, out=total)
+    np.equal(total, 2, out=flags[:m])
+    np.multiply(flags[:m], params['straight_sets_boost'], out=total)
+    np.add(cdf, total, out=cdf)
+    np.subtract(1, cdf, out=l_performance)
+    np.subtract(cdf, probs, out=w_performance)
+    np.subtract(1, probs, out=total)
+    np.subtract(l_performance, total, out=l_performance)
+
+    itf_indicator = ws.itf[:m]
+    np.copyto(itf_indicator[:, 0], itf, casting='unsafe')
+
+    update = partial(update_players_workspace, params=params, player_abs=player_abs, games_played=games_played,
+                     player_trend=player_trend, at_abilities=at_abilities, tables=tables, workspace=workspace)
+
+    if unique:
+        for player_ids, performance in ((w_id, w_performance), (l_id, l_performance)):
+            update(ids=player_ids, performance=performance, playing_surface=playing_surface,
+                   itf_indicator=itf_indicator)
+        return player_abs, games_played, player_trend, at_abilities, probs
+
+    # conflict free waves (see elo_round_arrays), each wave's matches compressed into the wave buffers
+    round_waves = get_round_waves(w_id, l_id)
+    in_wave = flags[:m]
+    for wave in range(round_waves.max() + 1):
+        np.equal(round_waves, wave, out=in_wave)
+        n = np.count_nonzero(in_wave)
+        wave_ids, wave_performance = ws.wave_ids[:n], ws.wave_performance[:n]
+        np.compress(in_wave, playing_surface, axis=0, out=ws.wave_surface[:n])
+        np.compress(in_wave, itf_indicator, axis=0, out=ws.wave_itf[:n])
+
+        for player_ids, performance in ((w_id, w_performance), (l_id, l_performance)):
+            np.compress(in_wave, player_ids, out=wave_ids)
+            np.compress(in_wave, performance, out=wave_performance)
+            update(ids=wave_ids, performance=wave_performance, playing_surface=ws.wave_surface[:n],
+                   itf_indicator=ws.wave_itf[:n])
+
+    return player_abs, games_played, player_trend, at_abilities, probs
+
+
+def elo_round_sequential(params: Dict[str, float],
+                         w_id: np.array,
+                         w_games: np.array,
+                         w_sets: np.array,
+                         l_id: np.array,
+                         l_games: np.array,
+                         l_sets: np.array,
+                         surfaces: np.array,
+                         itf: np.array,
+                         player_abs: np.array,
+                         games_played: np.array,
+                         player_trend: np.array,
+                         at_abilities: np.array,
+                         tables: Optional[PrimitiveTable] = None,
+                         surface_codes: Optional[np.array] = None,
+                         abilities: Optional[np.array] = None) -> Tuple[np.array]:
+    """Same inputs as elo_round_arrays but matches are applied one at a time in order, each seeing the state left by
+    the previous one rather than the pre round state. Runs elo_match_kernel, compiled when Numba is installed and plain
+    python otherwise (slow, but still faster than elo_round_arrays rounds of a single match)
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        w_id (np.array): winner ids
+        w_games (np.array): games won by winner
+        w_sets (np.array): sets won by winner
+        l_id (np.array): loser ids
+        l_games (np.array): games won by loser
+        l_sets (np.array): sets won by loser
+        surfaces (np.array): 1 hot encoding of surfaces
+        itf (np.array): True if game on itf circuit
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, built for this call if None
+        surface_codes (Optional[np.array]): surface codes (see get_surface_codes)
+        abilities (Optional[np.array]): (2, n_matches) buffer the winner and loser current abilities (as each match
+            was predicted) are written to
+
+    Returns:
+        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs
+    """
+    tables = PrimitiveTable(params, n_surfaces=surfaces.shape[1]) if tables is None else tables
+    surface_codes = get_surface_codes(surfaces) if surface_codes is None else surface_codes
+    probs = np.empty((len(w_id),))
+    abilities = np.empty((2, len(w_id))) if abilities is None else abilities
+
+    elo_match_kernel(
+        w_id, l_id, (w_sets - l_sets) == 2, tables.get_binom_cdf(w_games, l_games), surface_codes, itf,
+        tables.surface_weights, tables.playing_surface, tables.k_factor, params['K'], params['offset'],
+        params['shape'], params['itf_deduction'], params['straight_sets_boost'], params['trend_rate'],
+        params['trend_weight'], params['all_time_weight'], player_abs, games_played, player_trend, at_abilities,
+        probs, abilities)
+
+    return player_abs, games_played, player_trend, at_abilities, probs
+
+
+def elo_single_round(params: Dict[str, float],
+                     data: pd.DataFrame,
+                     w_id_col: str,
+                     w_games_col: str,
+                     w_sets_col: str,
+                     l_id_col: str,
+                     l_games_col: str,
+                     l_sets_col: str,
+                     surface_cols: List[str],
+                     itf_col: str,
+                     player_abs: np.array,
+                     games_played: np.array,
+                     player_trend: np.array,
+                     at_abilities: np.array,
+                     abilities: Optional[np.array] = None) -> Tuple[np.array]:
+    """ELO runs over dates this function runs a single date and returns updated player specific data and predicted probs
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        data (pd.DataFrame): Match dataframe
+        w_id_col (str): Column with winner ids
+        w_games_col (str): Columns with games won by winner
+        w_sets_col (str): Columns with sets won by winner
+        l_id_col (str): Column with loser ids
+        l_games_col (str): Columns with games won by loser
+        l_sets_col (str): Columns with games won by loser
+        surface_cols (List[str]): Columns of 1 hot encoding of surfaces
+        itf_col (str): Column with bool indicator if game on itf circuit
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        abilities (Optional[np.array]): (2, n_matches) buffer the winner and loser current abilities are written to
+
+    Returns:
+        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs
+    """
+    return elo_round_arrays(
+        params=params, w_id=data[w_id_col].values, w_games=data[w_games_col].values, w_sets=data[w_sets_col].values,
+        l_id=data[l_id_col].values, l_games=data[l_games_col].values, l_sets=data[l_sets_col].values,
+        surfaces=data[surface_cols].values, itf=(data[itf_col] == 'I').values, player_abs=player_abs,
+        games_played=games_played, player_trend=player_trend, at_abilities=at_abilities, abilities=abilities)
+
+
+class EloRound(NamedTuple):
+    """Results of a single date (see iter_elo), state is only given when asked for and is the live (UPDATED) arrays,
+    not copies"""
+    date: int
+    index: np.array
+    probs: np.array
+    state: Optional[Tuple[np.array]] = None
+
+
+def iter_elo_arrays(params: Dict[str, float],
+                    match_arrays: MatchArrays,
+                    player_abs: np.array,
+                    games_played: np.array,
+                    player_trend: np.array,
+                    at_abilities: np.array,
+                    tables: Optional[PrimitiveTable] = None,
+                    yield_state: bool = False,
+                    workspace: Optional[RoundWorkspace] = None,
+                    sequential: bool = False,
+                    granularity: str = 'day',
+                    features: Optional['FeatureMatrix'] = None,
+                    history: Optional['HistoryRecorder'] = None,
+                    observers: Sequence['EloObserver'] = ()) -> Iterator[EloRound]:
+    """Generator version of elo_arrays, yields each date once its updates are applied. Player state is updated IN
+    PLACE, closing the generator early leaves it as of the last date yielded
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
+        yield_state (bool): include the state arrays with each date
+        workspace (Optional[RoundWorkspace]): run rounds in preallocated buffers (requires tables and float64 state),
+            probs yielded are then views overwritten by the next round
+        sequential (bool): apply matches one at a time within each date (see elo_round_sequential)
+        granularity (str): `day`, `week` or `match` (same as sequential), see get_round_bounds
+        features (Optional[FeatureMatrix]): written with each round's pre match features (rows in original data order)
+        history (Optional[HistoryRecorder]): records the updated state of each round's players
+        observers (Sequence[EloObserver]): hooks called around every round and at the end (see EloObserver)
+
+    Yields:
+        EloRound: first day ordinal, positions of the round's matches in the original data, pre match probs, state
+    """
+    bounds = get_round_bounds(match_arrays.dates, granularity)
+    sequential = sequential or granularity == 'match'
+    if sequential and workspace is not None:
+        raise ValueError('workspace rounds are grouped, they cannot be used sequentially')
+
+    m = match_arrays
+    if workspace is not None:
+        dtypes = {values.dtype for values in (player_abs, games_played, player_trend, at_abilities)}
+        if dtypes != {np.dtype(np.float64)}:
+            raise ValueError(f'workspace buffers are float64, state must be too, got {sorted(map(str, dtypes))}')
+        # workspace gathers clip rather than raise, so ids are checked once up front
+        if len(m.w_id) and (min(m.w_id.min(), m.l_id.min()) < 0
+                            or max(m.w_id.max(), m.l_id.max()) >= len(player_trend)):
+            raise IndexError(f'player ids must be between 0 and {len(player_trend) - 1}')
+
+    state = (player_abs, games_played, player_trend, at_abilities) if yield_state else None
+    if sequential:
+        round_function = elo_round_sequential
+    elif workspace is None:
+        round_function = elo_round_arrays
+    else:
+        round_function = partial(elo_round_workspace, workspace=workspace)
+
+    predictions = features is not None and features.needs_predictions
+
+    def run_round(start: int, end: int) -> np.array:
+        abilities = np.empty((2, end - start)) if predictions else None
+        if features is not None:
+            features.update(params, m.order[start:end], m.w_id[start:end], m.l_id[start:end], m.itf[start:end],
+                            player_abs, games_played, player_trend, at_abilities, tables=tables)
+
+        *_, p = round_function(
+            params=params, w_id=m.w_id[start:end], w_games=m.w_games[start:end], w_sets=m.w_sets[start:end],
+            l_id=m.l_id[start:end], l_games=m.l_games[start:end], l_sets=m.l_sets[start:end],
+            surfaces=m.surfaces[start:end], itf=m.itf[start:end], player_abs=player_abs,
+            games_played=games_played, player_trend=player_trend, at_abilities=at_abilities, tables=tables,
+            surface_codes=m.surface_codes[start:end], abilities=abilities)
+
+        if predictions:
+            features.update_predictions(m.order[start:end], p, abilities)
+        if history is not None:
+            history.record(int(m.dates[start]), np.unique(np.concatenate((m.w_id[start:end], m.l_id[start:end]))),
+                           player_abs, games_played, player_trend)
+        return p
+
+    if not observers:
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield EloRound(int(m.dates[start]), m.order[start:end], run_round(start, end), state)
+        return
+
+    # hooks get their own loop so the one above pays nothing for them
+    live_state = (player_abs, games_played, player_trend, at_abilities)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        date, index = int(m.dates[start]), m.order[start:end]
+        for observer in observers:
+            observer.on_round_start(date, index, live_state)
+
+        elo_round = EloRound(date, index, run_round(start, end), live_state)
+        for observer in observers:
+            observer.on_round_end(elo_round)
+
+        yield elo_round._replace(state=state)
+
+    for observer in observers:
+        observer.on_finish(live_state)
+
+
+def elo_arrays(params: Dict[str, float],
+               match_arrays: MatchArrays,
+               player_abs: np.array,
+               games_played: np.array,
+               player_trend: np.array,
+               at_abilities: np.array,
+               tables: Optional[PrimitiveTable] = None,
+               metrics: Optional[MetricAccumulator] = None,
+               keep_probs: bool = True,
+               workspace: Optional[RoundWorkspace] = None,
+               sequential: bool = False,
+               granularity: str = 'day',
+               observers: Sequence['EloObserver'] = ()) -> Tuple[np.array]:
+    """ELO model over matches already converted to arrays (see get_match_arrays), player state is updated IN PLACE
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
+        metrics (Optional[MetricAccumulator]): updated with each round's predictions
+        keep_probs (bool): False to not store predictions (probs returned as None), use with metrics
+        workspace (Optional[RoundWorkspace]): run rounds in preallocated buffers (requires tables and float64 state)
+        sequential (bool): apply matches one at a time within each date (see elo_round_sequential)
+        granularity (str): `day`, `week` or `match` (see get_round_bounds)
+        observers (Sequence[EloObserver]): hooks called around every round and at the end (see EloObserver)
+
+    Returns:
+        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs (original data order)
+    """
+    m = match_arrays
+    overall_probs = np.empty((len(m.dates),)) if keep_probs else None
+
+    # rounds come in sorted order, so the sorted columns for each are a running slice
+    start = 0
+    for elo_round in iter_elo_arrays(params, m, player_abs, games_played, player_trend, at_abilities, tables,
+                                     workspace=workspace, sequential=sequential, granularity=granularity,
+                                     observers=observers):
+        end = start + len(elo_round.probs)
+
+        if metrics is not None:
+            metrics.update(elo_round.probs, m.itf[start:end], m.surface_codes[start:end], elo_round.date)
+        if keep_probs:
+            overall_probs[elo_round.index] = elo_round.probs
+
+        start = end
+
+    return player_abs, games_played, player_trend, at_abilities, overall_probs
+
+
+def iter_elo(params: Dict[str, float],
+             data: pd.DataFrame,
+             date_col: str,
+             w_id_col: str,
+             w_games_col: str,
+             w_sets_col: str,
+             l_id_col: str,
+             l_games_col: str,
+             l_sets_col: str,
+             surface_cols: List[str],
+             itf_col: str,
+             player_abs: np.array,
+             games_played: np.array,
+             player_trend: np.array,
+             at_abilities: np.array,
+             engine: str = 'numpy',
+             yield_state: bool = False,
+             workspace: bool = False,
+             granularity: str = 'day',
+             features: Optional['FeatureMatrix'] = None,
+             history: Optional['HistoryRecorder'] = None,
+             observers: Sequence['EloObserver'] = ()) -> Iterator[EloRound]:
+    """Runs the ELO model a date at a time, yielding each date's predictions once its updates are applied so they
+    can be consumed (written, scored, plotted) as the replay goes. Player state is updated IN PLACE, closing the
+    generator early leaves it as of the last date yielded
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        data (pd.DataFrame): Match dataframe
+        date_col (str): Column with date
+        w_id_col (str): Column with winner ids
+        w_games_col (str): Columns with games won by winner
+        w_sets_col (str): Columns with sets won by winner
+        l_id_col (str): Column with loser ids
+        l_games_col (str): Columns with games won by loser
+        l_sets_col (str): Columns with games won by loser
+        surface_cols (List[str]): Columns of 1 hot encoding of surfaces
+        itf_col (str): Column with bool indicator if game on itf circuit
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        engine (str): `numpy`, `pandas` or `sequential` (see elo)
+        yield_state (bool): include the state arrays with each date
+        workspace (bool): numpy engine runs rounds in a RoundWorkspace (float64 state only), probs yielded are then
+            views overwritten by the next round
+        granularity (str): `day`, `week` or `match` (see elo), the pandas engine only groups by day
+        features (Optional[FeatureMatrix]): written with each round's pre match features (rows aligned with data)
+        history (Optional[HistoryRecorder]): records the updated state of each round's players
+        observers (Sequence[EloObserver]): hooks called around every round and at the end (see EloObserver)
+
+    Yields:
+        EloRound: first day ordinal, positions of the round's matches in data, pre match probs, state
+    """
+    if engine == 'pandas':
+        if granularity != 'day':
+            raise ValueError(f'The pandas engine only updates by day, not by {granularity}')
+
+        dates = get_day_ordinals(data[date_col])
+        live_state = (player_abs, games_played, player_trend, at_abilities)
+        state = live_state if yield_state else None
+        predictions = features is not None and features.needs_predictions
+
+        # positions rather than index labels, so any index (e.g. a slice of a larger frame) works
+        for _, positions in sorted(data.groupby(date_col).indices.items()):
+            date_df = data.iloc[positions]
+            for observer in observers:
+                observer.on_round_start(int(dates[positions[0]]), positions, live_state)
+            abilities = np.empty((2, len(positions))) if predictions else None
+            if features is not None:
+                features.update(params, positions, date_df[w_id_col].values, date_df[l_id_col].values,
+                                (date_df[itf_col] == 'I').values, player_abs, games_played, player_trend,
+                                at_abilities)
+
+            *_, p = elo_single_round(
+                params=params, data=date_df, w_id_col=w_id_col, w_games_col=w_games_col, w_sets_col=w_sets_col,
+                l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col, surface_cols=surface_cols,
+                itf_col=itf_col, player_abs=player_abs, games_played=games_played, player_trend=player_trend,
+                at_abilities=at_abilities, abilities=abilities)
+            if predictions:
+                features.update_predictions(positions, p, abilities)
+
+            if history is not None:
+                history.record(int(dates[positions[0]]), np.unique(date_df[[w_id_col, l_id_col]].values),
+                               player_abs, games_played, player_trend)
+
+            for observer in observers:
+                observer.on_round_end(EloRound(int(dates[positions[0]]), positions, p, live_state))
+            yield EloRound(int(dates[positions[0]]), positions, p, state)
+
+        for observer in observers:
+            observer.on_finish(live_state)
+
+    elif engine in ('numpy', 'sequential'):
+        match_arrays = get_match_arrays(
+            data=data, date_col=date_col, w_id_col=w_id_col, w_games_col=w_games_col, w_sets_col=w_sets_col,
+            l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col, surface_cols=surface_cols,
+            itf_col=itf_col)
+        round_workspace = RoundWorkspace.for_matches(match_arrays, granularity) if workspace else None
+
+        yield from iter_elo_arrays(
+            params=params, match_arrays=match_arrays, player_abs=player_abs, games_played=games_played,
+            player_trend=player_trend, at_abilities=at_abilities,
+            tables=PrimitiveTable(params, n_surfaces=len(surface_cols)), yield_state=yield_state,
+            workspace=round_workspace if engine == 'numpy' else None, sequential=engine == 'sequential',
+            granularity=granularity, features=features, history=history, observers=observers)
+
+    else:
+        raise ValueError(f'Unknown engine: {engine}')
+
+
 def elo(params: Dict[str, float],
         data: pd.DataFrame,
         date_col: str,
@@ -264,7 +1266,19 @@ def elo(params: Dict[str, float],
         player_abs: np.array,
         games_played: np.array,
         player_trend: np.array,
-        at_abilities: np.array) -> Tuple[np.array]:
+        at_abilities: np.array,
+        engine: str = 'numpy',
+        state_dtype: Optional[type] = None,
+        metrics: Optional[MetricAccumulator] = None,
+        keep_probs: bool = True,
+        inplace: bool = False,
+        out: Optional[np.array] = None,
+        workspace: bool = False,
+        renumber: bool = False,
+        granularity: str = 'day',
+        features: Optional['FeatureMatrix'] = None,
+        history: Optional['HistoryRecorder'] = None,
+        observers: Sequence['EloObserver'] = ()) -> Tuple[np.array]:
     """Main ELO model
 
     Args:
@@ -283,26 +1297,98 @@ def elo(params: Dict[str, float],
         games_played (np.array): games played previously
         player_trend (np.array): current trend
         at_abilities (np.array): all time max abilities
+        engine (str): `numpy` converts data to arrays once, slices rounds by date boundaries and gathers primitives
+            from a PrimitiveTable, `pandas` groups the dataframe by date (reference implementation), `sequential`
+            applies matches strictly one after another (compiled with Numba when installed, see
+            elo_round_sequential) so repeat players within a date see their earlier result
+        state_dtype (Optional[type]): copy state into a compact interleaved buffer of this type (see
+            get_compact_state), separate copies of the arrays passed if None
+        metrics (Optional[MetricAccumulator]): updated with each date's predictions, score_from compares against
+            day ordinals (see get_day_ordinals)
+        keep_probs (bool): False to not store predictions (probs returned as None), use with metrics
+        inplace (bool): update the state arrays passed rather than copies (written back at the end if renumbering)
+        out (Optional[np.array]): (n_matches,) buffer predictions are written to (e.g. a slice of a larger array)
+        workspace (bool): numpy engine runs rounds in preallocated buffers (see RoundWorkspace), float64 state only
+        renumber (bool): run on players renumbered by when they first play (see get_activity_order) so each round's
+            players are close together in memory, state is returned (and ids kept) in the original numbering
+        granularity (str): unit players are updated in, `day` (inferred date), `week` (tournament week, fewer and
+            larger rounds) or `match` (strict match order, same as the sequential engine). Matches in a unit are all
+            predicted from the state before it
+        features (Optional[FeatureMatrix]): filled with every match's pre match features in the same pass (rows
+            aligned with data, state as of the start of the match's round, prob and ability as the match was predicted)
+        history (Optional[HistoryRecorder]): records the state of the players who played after every round, for
+            rating trajectories without a replay (see get_trajectory)
+        observers (Sequence[EloObserver]): hooks called at the start and end of every round and once the replay is
+            done (see EloObserver), state passed to them is in the replay's numbering when renumbering
 
     Returns:
-        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs (SORTED BY DATE)
+        Tuple[np.array]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs (data order)
     """
+    if inplace and state_dtype is not None:
+        raise ValueError('state_dtype copies the state, it cannot be used inplace')
+    if workspace and state_dtype is not None and np.dtype(state_dtype) != np.float64:
+        raise ValueError(f'workspace buffers are float64, state_dtype {np.dtype(state_dtype)} cannot be used')
+    if out is not None and out.shape != (len(data),):
+        raise ValueError(f'out must have shape ({len(data)},), got {out.shape}')
+    if features is not None and len(features.values) != len(data):
+        raise ValueError(f'features must have {len(data)} rows, got {len(features.values)}')
 
-    player_abs = deepcopy(player_abs)
-    games_played = deepcopy(games_played)
-    player_trend = deepcopy(player_trend)
-    at_abilities = deepcopy(at_abilities)
+    state = (player_abs, games_played, player_trend, at_abilities)
+    first_round = 0 if history is None else history.n_rounds
+    if renumber:
+        order = get_activity_order(
+            get_day_ordinals(data[date_col]), data[w_id_col].values, data[l_id_col].values, player_trend.shape[-1])
+        internal_ids = np.argsort(order)
+        # only the columns the engines read, ids swapped for internal ones
+        data = data[[date_col, w_games_col, w_sets_col, l_games_col, l_sets_col, *surface_cols, itf_col]].assign(
+            **{w_id_col: internal_ids[data[w_id_col].values], l_id_col: internal_ids[data[l_id_col].values]})
+        player_abs, games_played, player_trend, at_abilities = get_renumbered_state(order, *state)
 
-    overall_probs = np.empty((len(data),))
+    if state_dtype is not None:
+        player_abs, games_played, player_trend, at_abilities = get_compact_state(
+            player_abs, games_played, player_trend, at_abilities, dtype=state_dtype)
+    elif not inplace and not renumber:
+        player_abs = deepcopy(player_abs)
+        games_played = deepcopy(games_played)
+        player_trend = deepcopy(player_trend)
+        at_abilities = deepcopy(at_abilities)
 
-    for _, date_df in data.groupby(date_col):
+    overall_probs = (np.empty((len(data),)) if out is None else out) if keep_probs else None
 
-        player_abs, games_played, player_trend, at_abilities, p = elo_single_round(
-            params=params, data=date_df, w_id_col=w_id_col, w_games_col=w_games_col, w_sets_col=w_sets_col,
-            l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col, surface_cols=surface_cols,
-            itf_col=itf_col, player_abs=player_abs, games_played=games_played, player_trend=player_trend,
-            at_abilities=at_abilities)
+    # before waves were introduced each of these silently dropped an update, only counted when debugging as it's
+    # another pass over the data. Sequential rounds apply matches one at a time so have none
+    if logging.getLogger().isEnabledFor(logging.DEBUG) and engine != 'sequential' and granularity != 'match':
+        dates = get_day_ordinals(data[date_col])
+        collisions = get_collision_count(rounds=dates if granularity == 'day' else get_week_ordinals(dates),
+                                         w_id=data[w_id_col].values, l_id=data[l_id_col].values)
+        logging.debug(f'ELO COLLISIONS: {collisions} repeat player appearances within a {granularity}')
+
+    if metrics is not None:
+        itf, surface_codes = (data[itf_col] == 'I').values, get_surface_codes(data[surface_cols].values)
+
+    for elo_round in iter_elo(
+            params=params, data=data, date_col=date_col, w_id_col=w_id_col, w_games_col=w_games_col,
+            w_sets_col=w_sets_col, l_id_col=l_id_col, l_games_col=l_games_col, l_sets_col=l_sets_col,
+            surface_cols=surface_cols, itf_col=itf_col, player_abs=player_abs, games_played=games_played,
+            player_trend=player_trend, at_abilities=at_abilities, engine=engine, workspace=workspace,
+            granularity=granularity, features=features, history=history, observers=observers):
+
+        if metrics is not None:
+            metrics.update(elo_round.probs, itf[elo_round.index], surface_codes[elo_round.index], elo_round.date)
+        if keep_probs:
+            overall_probs[elo_round.index] = elo_round.probs
+
+    if features is not None:
+        features.flush()
 
-        overall_probs[date_df.index] = p
+    if renumber:
+        if history is not None:
+            history.relabel(order, start=first_round)
+        restored = get_renumbered_state(internal_ids, player_abs, games_played, player_trend, at_abilities)
+        if inplace:
+            for passed, values in zip(state, restored):
+                passed[...] = values
+            restored = state
+        player_abs, games_played, player_trend, at_abilities = restored
 
     return player_abs, games_played, player_trend, at_abilities, overall_probs
@@ -6,6 +6,7 @@ from copy import deepcopy
 import matplotlib.pyplot as plt
 
 from .model import get_current_ability, get_surface_weights
+from .metrics import MetricAccumulator
 from ..constants import PARAMS
 
 
@@ -77,22 +78,18 @@ def get_model_calibration(p: np.array, source: np.array) -> plt.figure:
     return f
 
 
-def get_model_performance(p: np.array, source: np.array) -> str:
-    """Formats model performance into string"""
-
-    itf_predictions = p[source == 'I']
-    wta_predictions = p[source == 'W']
-
-    return f"""
-Overall Total: {len(p)}
-Overall accuracy: {len(p[p > 0.5]) / len(p)}
-Overall brier score: {np.mean((1 - p)**2)}
+def get_performance_report(metrics: MetricAccumulator) -> str:
+    """Formats accumulated model performance into string (a block per source and surface)"""
+    blocks = [f"""{name} total: {int(row['total'])}
+{name} accuracy: {row['accuracy']}
+{name} brier score: {row['brier']}
+{name} log likelihood: {row['log_likelihood']}
+""" for name, row in metrics.get_metrics().iterrows()]
+    return '\n' + '\n'.join(blocks)
 
-WTA total: {len(wta_predictions)}
-WTA accuracy: {len(wta_predictions[wta_predictions > 0.5]) / len(wta_predictions)}
-WTA brier score: {np.mean((1 - wta_predictions)**2)}
 
-ITF total: {len(itf_predictions)}
-ITF accuracy: {len(itf_predictions[itf_predictions > 0.5]) / len(itf_predictions)}
-ITF brier score: {np.mean((1 - itf_predictions)**2)}
-    """
+def get_model_performance(p: np.array, source: np.array) -> str:
+    """Formats model performance into string"""
+    metrics = MetricAccumulator()
+    metrics.update(p, source == 'I')
+    return get_performance_report(metrics)
@@ -0,0 +1,103 @@
+from typing import List, Tuple, TYPE_CHECKING
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .model import EloRound
+
+
+class EloObserver:
+    """Hooks into the ELO replay (see elo `observers`), subclass and override the ones needed. Replays without
+    observers run a loop with no dispatch at all
+
+    State passed is the live (player_abs, games_played, player_trend, at_abilities) the replay updates, views not
+    copies, so copy anything kept beyond the call
+    """
+
+    def on_round_start(self, date: int, index: np.array, state: Tuple[np.array]):
+        """Before a round is predicted and applied
+
+        Args:
+            date (int): day ordinal of the round's first match
+            index (np.array): positions of the round's matches in the data
+            state (Tuple[np.array]): state before the round
+        """
+
+    def on_round_end(self, elo_round: 'EloRound'):
+        """After a round is applied
+
+        Args:
+            elo_round (EloRound): the round's date, index, pre match probs and the state after it
+        """
+
+    def on_finish(self, state: Tuple[np.array]):
+        """Once every round is applied
+
+        Args:
+            state (Tuple[np.array]): final state
+        """
+
+
+class RoundTimer(EloObserver):
+    """Wall time and number of matches of every round"""
+
+    def __init__(self):
+        self._start = 0.
+        self.rounds: List[Tuple[int, int, float]] = []
+
+    def on_round_start(self, date: int, index: np.array, state: Tuple[np.array]):
+        self._start = time.perf_counter()
+
+    def on_round_end(self, elo_round: 'EloRound'):
+        self.rounds.append((elo_round.date, len(elo_round.index), time.perf_counter() - self._start))
+
+    def to_frame(self) -> pd.DataFrame:
+        """A row per round: date, matches and seconds"""
+        times = pd.DataFrame(self.rounds, columns=['date', 'matches', 'seconds'])
+        times['date'] = times['date'].values.astype('datetime64[D]')
+        return times
+
+
+class ProgressLogger(EloObserver):
+    """Logs the replay's progress every `every` rounds and its throughput at the end
+
+    Args:
+        every (int): rounds between log lines
+    """
+
+    def __init__(self, every: int = 1000):
+        self.every = every
+        self._rounds, self._matches, self._start = 0, 0, None
+
+    def on_round_start(self, date: int, index: np.array, state: Tuple[np.array]):
+        if self._start is None:
+            self._start = time.perf_counter()
+
+    def on_round_end(self, elo_round: 'EloRound'):
+        self._rounds += 1
+        self._matches += len(elo_round.index)
+        if self._rounds % self.every == 0:
+            logging.info(f'ELO PROGRESS: {self._rounds} rounds, {self._matches} matches, up to '
+                         f'{np.datetime64(elo_round.date, "D")}')
+
+    def on_finish(self, state: Tuple[np.array]):
+        seconds = time.perf_counter() - (self._start or time.perf_counter())
+        logging.info(f'ELO DONE: {self._rounds} rounds, {self._matches} matches in {seconds:.2f} sec '
+                     f'({self._matches/max(seconds, 1e-9):.0f} matches/sec)')
+
+
+class PredictionWriter(EloObserver):
+    """Writes each round's pre match probs into out (e.g. a memory mapped file) as the round ends. Observers are
+    called in order, so placed before a StoreJournal the predictions are written before the round is committed
+
+    Args:
+        out (np.array): (n_matches,) buffer, positions as the data passed to elo
+    """
+
+    def __init__(self, out: np.array):
+        self.out = out
+
+    def on_round_end(self, elo_round: 'EloRound'):
+        self.out[elo_round.index] = elo_round.probs
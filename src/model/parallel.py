@@ -0,0 +1,215 @@
+from typing import Dict, Tuple, Union, Optional
+import os
+import time
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from .model import MatchArrays, PrimitiveTable, get_match_slice, get_week_ordinals, elo_arrays
+from .checkpoint import Checkpoints, get_state_at
+from .fitting import save_match_arrays, load_worker_match_arrays
+
+# match arrays and primitives each worker process sets up once (see init_era_worker)
+_WORKER = {}
+
+
+def get_era_bounds(dates: np.array, n_eras: int) -> np.array:
+    """Splits sorted matches into eras of roughly equal numbers of matches, each starting on a tournament week
+
+    Args:
+        dates (np.array): sorted dates (day ordinals, see get_day_ordinals)
+        n_eras (int): number of eras wanted, fewer if there are not enough weeks
+
+    Returns:
+        np.array: era boundaries (sorted positions), era i is [bounds[i], bounds[i + 1])
+    """
+    if not len(dates):
+        return np.zeros((1,), dtype=np.int64)
+
+    weeks = get_week_ordinals(dates)
+    week_starts = np.flatnonzero(np.concatenate(([True], weeks[1:] != weeks[:-1])))
+    targets = np.linspace(0, len(dates), n_eras + 1)[1:-1]
+    inner = week_starts[np.minimum(np.searchsorted(week_starts, targets), len(week_starts) - 1)]
+    return np.unique(np.concatenate(([0], inner, [len(dates)]))).astype(np.int64)
+
+
+def get_composed_starts(first: Tuple[np.array], runs: list) -> list:
+    """Start state of every era from the first era's start and each era's last run, players an era doesn't touch
+    carry over from the era's (new) start so only the players who played inherit its error
+
+    Args:
+        first (Tuple[np.array]): exact start state of the first era
+        runs (list): each era's (start state it was run from, end state, touched players)
+
+    Returns:
+        list: start state of each era and the final state (len(runs) + 1)
+    """
+    starts = [tuple(first)]
+    for (start_abs, start_games, start_trend, start_at), (end_abs, end_games, end_trend, end_at), touched in runs:
+        player_abs, games_played, player_trend, at_abilities = starts[-1]
+        starts.append((
+            np.where(touched[:, None], end_abs, player_abs),
+            # games added don't depend on the state (whole numbers, so exact)
+            games_played + (end_games - start_games),
+            np.where(touched, end_trend, player_trend),
+            # highs the era reached above where it started
+            np.maximum(at_abilities, np.where(end_at > start_at, end_at, -np.inf))))
+    return starts
+
+
+def init_era_worker(folder: str, params: Dict[str, float], n_surfaces: int):
+    """Process pool initialiser, maps the shared match arrays once per worker"""
+    _WORKER['matches'] = load_worker_match_arrays(folder)
+    _WORKER['params'] = params
+    _WORKER['tables'] = PrimitiveTable(params, n_surfaces=n_surfaces)
+
+
+def run_era(start: int, end: int, state: Tuple[np.array]) -> Tuple[Tuple[np.array], np.array, np.array]:
+    """Replays the worker's matches at sorted positions [start, end) from state
+
+    Args:
+        start (int): first match (sorted position)
+        end (int): stop before this match (sorted position)
+        state (Tuple[np.array]): player_abs, games_played, player_trend, at_abilities at the start of the era
+
+    Returns:
+        Tuple[Tuple[np.array], np.array, np.array]: end state, probs (sorted order), players touched
+    """
+    m = get_match_slice(_WORKER['matches'], start, end)
+    *end_state, probs = elo_arrays(_WORKER['params'], m, *[values.copy() for values in state],
+                                   tables=_WORKER['tables'])
+
+    touched = np.zeros((len(state[2]),), dtype=bool)
+    touched[m.w_id], touched[m.l_id] = True, True
+    return tuple(end_state), probs, touched
+
+
+def get_initial_starts(params: Dict[str, float],
+                       match_arrays: MatchArrays,
+                       state: Tuple[np.array],
+                       bounds: np.array,
+                       initial: Union[str, Checkpoints],
+                       tables: PrimitiveTable) -> list:
+    """Approximate start state of every era, the first is exact
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        state (Tuple[np.array]): state before the first match
+        bounds (np.array): era boundaries (see get_era_bounds)
+        initial (Union[str, Checkpoints]): `coarse` a serial pass updating by tournament week, `cold` every era from
+            state, or snapshots of a previous run over these matches (see load_checkpoints)
+        tables (PrimitiveTable): precomputed primitives for params
+
+    Returns:
+        list: start state of each era
+    """
+    if isinstance(initial, Checkpoints):
+        return [tuple(state)] + [get_state_at(params, match_arrays, initial, int(match_arrays.dates[start]),
+                                              tables=tables) for start in bounds[1:-1]]
+    if initial == 'cold':
+        return [tuple(state)]*(len(bounds) - 1)
+    if initial != 'coarse':
+        raise ValueError(f'Unknown initial states: {initial}')
+
+    # the last era's matches never feed a start
+    starts, coarse = [tuple(state)], [values.copy() for values in state]
+    for start, end in zip(bounds[:-2], bounds[1:-1]):
+        elo_arrays(params, get_match_slice(match_arrays, start, end), *coarse, tables=tables, granularity='week')
+        starts.append(tuple(values.copy() for values in coarse))
+    return starts
+
+
+def elo_parallel(params: Dict[str, float],
+                 match_arrays: MatchArrays,
+                 player_abs: np.array,
+                 games_played: np.array,
+                 player_trend: np.array,
+                 at_abilities: np.array,
+                 n_eras: Optional[int] = None,
+                 workers: Optional[int] = None,
+                 initial: Union[str, Checkpoints] = 'coarse',
+                 tol: float = 1e-6,
+                 max_passes: Optional[int] = None,
+                 tables: Optional[PrimitiveTable] = None) -> Tuple[Union[np.array, pd.DataFrame]]:
+    """Experimental. Same as elo_arrays with the history split into eras replayed concurrently over a process pool,
+    each from an approximate start state. Fix up passes rerun the eras whose start moved by more than tol, starts
+    being rebuilt from the previous pass (see get_composed_starts), until none move. Each pass makes at least one more
+    era exact, so tol=0 ends bit identical to elo_arrays after at most n_eras passes
+
+    Ratings forget slowly (K shrinks with games played, inactive players keep theirs) so start errors barely fade
+    within an era: a tight tol needs close to n_eras passes, max_passes trades accuracy for time
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        n_eras (Optional[int]): number of eras, workers if None
+        workers (Optional[int]): number of processes, all cores if None
+        initial (Union[str, Checkpoints]): first guess of the era starts (see get_initial_starts)
+        tol (float): largest change in any era's start state (any field) treated as converged
+        max_passes (Optional[int]): stop after this many passes even if not converged, n_eras if None
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
+
+    Returns:
+        Tuple[Union[np.array, pd.DataFrame]]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs
+            (original data order), a row per pass with eras run, largest start change and seconds
+    """
+    m = match_arrays
+    workers = workers or os.cpu_count()
+    n_surfaces = player_abs.shape[-1] - 1
+    tables = PrimitiveTable(params, n_surfaces=n_surfaces) if tables is None else tables
+
+    bounds = get_era_bounds(m.dates, n_eras or workers)
+    n_eras = len(bounds) - 1
+    max_passes = max_passes or n_eras
+
+    state = (player_abs, games_played, player_trend, at_abilities)
+    if not n_eras:
+        return (*state, np.empty((0,)), pd.DataFrame(columns=['eras_run', 'max_change', 'seconds']).rename_axis('pass'))
+
+    ts = time.perf_counter()
+    starts = get_initial_starts(params, m, state, bounds, initial, tables)
+    passes = [{'eras_run': 0, 'max_change': np.nan, 'seconds': time.perf_counter() - ts}]
+
+    runs, era_probs = [None]*n_eras, [None]*n_eras
+    stale = list(range(n_eras))
+    with tempfile.TemporaryDirectory() as folder:
+        save_match_arrays(m, folder)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_era_worker,
+                                 initargs=(folder, params, n_surfaces)) as executor:
+            while stale and len(passes) <= max_passes:
+                ts = time.perf_counter()
+                futures = {k: executor.submit(run_era, bounds[k], bounds[k + 1], starts[k]) for k in stale}
+                for k, future in futures.items():
+                    end_state, era_probs[k], touched = future.result()
+                    runs[k] = (starts[k], end_state, touched)
+
+                composed = get_composed_starts(starts[0], runs)
+                changes = [max(float(np.abs(new - old).max(initial=0)) for new, old in zip(composed[k], starts[k]))
+                           for k in range(n_eras)]
+                ran, stale = len(stale), [k for k in range(n_eras) if changes[k] > tol]
+                starts[1:] = composed[1:-1]
+                passes.append({'eras_run': ran, 'max_change': max(changes), 'seconds': time.perf_counter() - ts})
+
+    if stale:
+        logging.warning(f'PARALLEL: {len(stale)} era starts still moved by up to {max(changes):.2e} after '
+                        f'{len(passes) - 1} passes')
+
+    for values, final in zip(state, composed[-1]):
+        values[...] = final
+
+    overall_probs = np.empty((len(m.dates),))
+    for k, probs in enumerate(era_probs):
+        overall_probs[m.order[bounds[k]:bounds[k + 1]]] = probs
+
+    passes = pd.DataFrame(passes).rename_axis('pass')
+    logging.info(f'PARALLEL: {n_eras} eras, {workers} workers, {len(passes) - 1} passes, '
+                 f'{passes["seconds"].sum():.2f} sec')
+    return player_abs, games_played, player_trend, at_abilities, overall_probs, passes
@@ -0,0 +1,268 @@
+from typing import Dict, Tuple, Union, Optional
+import os
+import time
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+from .model import STATE_FIELDS, MatchArrays, PrimitiveTable, get_match_slice, get_date_bounds, elo_arrays
+from .fitting import save_match_arrays, load_worker_match_arrays
+
+# match arrays, partition positions, shared state and primitives each worker process sets up once (see
+# init_partition_worker)
+_WORKER = {}
+
+
+def get_player_communities(w_id: np.array, l_id: np.array, n_players: int, iterations: int = 20) -> np.array:
+    """Groups players who mostly play each other by label propagation over the match graph, every player takes the
+    label most of their matches are against (their own counting once, ties to the smallest label). Communities never
+    span players who are not connected, so separate components always end up apart
+
+    Args:
+        w_id (np.array): winner ids
+        l_id (np.array): loser ids
+        n_players (int): number of players
+        iterations (int): most propagation rounds, stops early once no label changes
+
+    Returns:
+        np.array: community of each player, 0 -> n_communities - 1
+    """
+    players = np.concatenate((w_id, l_id, np.arange(n_players))).astype(np.int64)
+    opponents = np.concatenate((l_id, w_id)).astype(np.int64)
+    labels = np.arange(n_players, dtype=np.int64)
+
+    for _ in range(iterations):
+        changed = False
+        # even then odd ids, all at once every player copies a neighbour and dense groups split in two
+        for parity in (0, 1):
+            keys, votes = np.unique(players*n_players + np.concatenate((labels[opponents], labels)),
+                                    return_counts=True)
+            player, label = keys // n_players, keys % n_players
+            # most votes first, then smallest label
+            best = np.lexsort((label, -votes, player))
+            first = np.concatenate(([True], player[best][1:] != player[best][:-1]))
+            player, label = player[best][first], label[best][first]
+
+            update = (player % 2 == parity) & (labels[player] != label)
+            labels[player[update]] = label[update]
+            changed |= update.any()
+
+        if not changed:
+            break
+
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def get_player_partitions(w_id: np.array, l_id: np.array, n_players: int, n_partitions: int,
+                          iterations: int = 20) -> np.array:
+    """Packs player communities (see get_player_communities) into n_partitions of roughly equal numbers of matches,
+    largest community first into the partition with the fewest
+
+    Args:
+        w_id (np.array): winner ids
+        l_id (np.array): loser ids
+        n_players (int): number of players
+        n_partitions (int): number of partitions
+        iterations (int): most label propagation rounds
+
+    Returns:
+        np.array: partition of each player, 0 -> n_partitions - 1
+    """
+    communities = get_player_communities(w_id, l_id, n_players, iterations)
+    appearances = np.bincount(communities[np.concatenate((w_id, l_id))], minlength=communities.max() + 1)
+
+    loads = np.zeros((n_partitions,), dtype=np.int64)
+    packed = np.empty((len(appearances),), dtype=np.int64)
+    for community in np.argsort(-appearances, kind='stable'):
+        packed[community] = np.argmin(loads)
+        loads[packed[community]] += appearances[community]
+    return packed[communities]
+
+
+def get_match_subset(match_arrays: MatchArrays, positions: np.array) -> MatchArrays:
+    """Matches at sorted positions (increasing) as their own MatchArrays (copies), order is reset as in
+    get_match_slice"""
+    return MatchArrays(**{field: values[positions] for field, values in match_arrays._asdict().items()
+                          if field != 'order'}, order=np.arange(len(positions)))
+
+
+def init_partition_worker(folder: str, params: Dict[str, float], n_surfaces: int, sequential: bool = False):
+    """Process pool initialiser, maps the shared match arrays, partition positions and state (read / write) once per
+    worker"""
+    _WORKER['matches'] = load_worker_match_arrays(folder)
+    _WORKER['positions'] = np.load(os.path.join(folder, 'partition_positions.npy'), mmap_mode='r')
+    _WORKER['offsets'] = np.load(os.path.join(folder, 'partition_offsets.npy'))
+    # plain ndarray views like the match arrays (see load_worker_match_arrays)
+    _WORKER['state'] = [np.asarray(open_memmap(os.path.join(folder, f'state_{field}.npy'), mode='r+'))
+                        for field in STATE_FIELDS]
+    _WORKER['params'] = params
+    _WORKER['tables'] = PrimitiveTable(params, n_surfaces=n_surfaces)
+    _WORKER['sequential'] = sequential
+
+
+def run_partition(partition: int, lo: int, hi: int) -> Tuple[np.array, float]:
+    """Replays matches lo:hi of a partition's (intra partition) matches on the shared state, only that partition's
+    players are touched
+
+    Args:
+        partition (int): partition
+        lo (int): first of the partition's matches
+        hi (int): stop before this one
+
+    Returns:
+        Tuple[np.array, float]: probs (sorted order), CPU seconds taken (workers sharing a core don't inflate it)
+    """
+    ts = time.process_time()
+    start = _WORKER['offsets'][partition]
+    m = get_match_subset(_WORKER['matches'], np.asarray(_WORKER['positions'][start + lo:start + hi]))
+    *_, probs = elo_arrays(_WORKER['params'], m, *_WORKER['state'], tables=_WORKER['tables'],
+                           sequential=_WORKER['sequential'])
+    return probs, time.process_time() - ts
+
+
+def elo_partitioned(params: Dict[str, float],
+                    match_arrays: MatchArrays,
+                    player_abs: np.array,
+                    games_played: np.array,
+                    player_trend: np.array,
+                    at_abilities: np.array,
+                    n_partitions: Optional[int] = None,
+                    workers: Optional[int] = None,
+                    partitions: Optional[np.array] = None,
+                    sequential: bool = False,
+                    tables: Optional[PrimitiveTable] = None) -> Tuple[Union[np.array, pd.DataFrame]]:
+    """Same as elo_arrays (bit identical) with players split into partitions (see get_player_partitions) replayed
+    concurrently over a process pool. The state is shared through memory mapped files and each worker only touches
+    its partition's rows. Between dates with matches across partitions every partition runs its own matches, those
+    dates are barriers applied whole by this process (the state of a player only depends on their own matches and
+    rounds are conflict free per player, so splitting a round by partition changes nothing)
+
+    Each partition's rounds are smaller than the full dates, so the fixed cost of a numpy round is paid once per
+    partition. The sequential engine's cost is per match and splits evenly
+
+    Args:
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        match_arrays (MatchArrays): contiguous match columns sorted by date
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        n_partitions (Optional[int]): number of partitions, workers if None
+        workers (Optional[int]): number of processes, all cores if None
+        partitions (Optional[np.array]): partition of each player, found from the matches if None
+        sequential (bool): same as elo_arrays with sequential=True (see elo_round_sequential)
+        tables (Optional[PrimitiveTable]): precomputed primitives for params, computed directly if None
+
+    Returns:
+        Tuple[Union[np.array, pd.DataFrame]]: (UPDATED) player_abs, games_played, player_trend, at_abilities, probs
+            (original data order), a row per step (see get_partition_report)
+    """
+    m = match_arrays
+    workers = workers or os.cpu_count()
+    n_surfaces = player_abs.shape[-1] - 1
+    tables = PrimitiveTable(params, n_surfaces=n_surfaces) if tables is None else tables
+    if partitions is None:
+        partitions = get_player_partitions(m.w_id, m.l_id, len(player_trend), n_partitions or workers)
+    n_partitions = int(partitions.max()) + 1 if len(partitions) else 1
+
+    bounds = get_date_bounds(m.dates)
+    cross = partitions[m.w_id] != partitions[m.l_id]
+    sync_dates = (np.add.reduceat(cross.astype(np.int64), bounds[:-1]) > 0 if len(m.dates)
+                  else np.zeros((0,), dtype=bool))
+
+    # intra partition matches away from barriers, grouped by partition (sorted positions within each)
+    match_partition = partitions[m.w_id].astype(np.int64)
+    match_partition[np.repeat(sync_dates, np.diff(bounds))] = -1
+    positions = np.argsort(match_partition, kind='stable')
+    counts = np.bincount(match_partition[match_partition >= 0], minlength=n_partitions)
+    positions = positions[len(positions) - counts.sum():]
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    state = (player_abs, games_played, player_trend, at_abilities)
+    overall_probs = np.empty((len(m.dates),))
+    steps = []
+
+    with tempfile.TemporaryDirectory() as folder:
+        save_match_arrays(m, folder)
+        np.save(os.path.join(folder, 'partition_positions.npy'), positions)
+        np.save(os.path.join(folder, 'partition_offsets.npy'), offsets)
+        for field, values in zip(STATE_FIELDS, state):
+            np.save(os.path.join(folder, f'state_{field}.npy'), np.asarray(values, dtype=np.float64))
+        shared = [np.asarray(open_memmap(os.path.join(folder, f'state_{field}.npy'), mode='r+'))
+                  for field in STATE_FIELDS]
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_partition_worker,
+                                 initargs=(folder, params, n_surfaces, sequential)) as executor:
+            # runs of dates between barriers, then the barrier date
+            barriers = np.flatnonzero(sync_dates)
+            for first, barrier in zip(np.concatenate(([0], barriers + 1)), np.append(barriers, len(sync_dates))):
+                start, end = bounds[first], bounds[barrier]
+                if end > start:
+                    ts = time.perf_counter()
+                    futures = {}
+                    for p in range(n_partitions):
+                        part = positions[offsets[p]:offsets[p + 1]]
+                        lo, hi = np.searchsorted(part, start), np.searchsorted(part, end)
+                        if hi > lo:
+                            futures[p] = (part[lo:hi], executor.submit(run_partition, p, lo, hi))
+
+                    busy = []
+                    for part, future in futures.values():
+                        probs, seconds = future.result()
+                        overall_probs[m.order[part]] = probs
+                        busy.append(seconds)
+                    steps.append({'date': int(m.dates[start]), 'kind': 'parallel', 'matches': end - start,
+                                  'tasks': len(busy), 'seconds': time.perf_counter() - ts, 'busy': sum(busy),
+                                  'critical': max(busy)})
+
+                if barrier < len(sync_dates):
+                    ts = time.perf_counter()
+                    start, end = bounds[barrier], bounds[barrier + 1]
+                    *_, overall_probs[m.order[start:end]] = elo_arrays(params, get_match_slice(m, start, end),
+                                                                       *shared, tables=tables, sequential=sequential)
+                    seconds = time.perf_counter() - ts
+                    steps.append({'date': int(m.dates[start]), 'kind': 'sync', 'matches': end - start, 'tasks': 1,
+                                  'seconds': seconds, 'busy': seconds, 'critical': seconds})
+
+        for values, final in zip(state, shared):
+            values[...] = final
+        del shared
+
+    steps = pd.DataFrame(steps, columns=['date', 'kind', 'matches', 'tasks', 'seconds', 'busy', 'critical'])
+    logging.info(f'PARTITIONED: {n_partitions} partitions, {workers} workers, {cross.sum()} cross partition '
+                 f'matches on {sync_dates.sum()} of {len(sync_dates)} dates')
+    return player_abs, games_played, player_trend, at_abilities, overall_probs, steps
+
+
+def get_partition_report(steps: pd.DataFrame) -> pd.DataFrame:
+    """Parallelism and barrier overhead of a partitioned replay (see elo_partitioned) per season
+
+    Args:
+        steps (pd.DataFrame): steps returned by elo_partitioned
+
+    Returns:
+        pd.DataFrame: a row per season with matches, barrier dates, share of matches replayed in parallel, achieved
+            parallelism (worker busy time over wall time of the parallel steps), available parallelism (busy time
+            over the slowest partition of each step, what enough cores would reach), seconds and the share of them
+            spent on barrier dates
+    """
+    years = steps['date'].values.astype('datetime64[D]').astype('datetime64[Y]')
+    steps = steps.assign(season=years.astype(np.int64) + 1970)
+    parallel = steps[steps['kind'] == 'parallel'].groupby('season')
+    sync = steps[steps['kind'] == 'sync'].groupby('season')
+    seasons = steps.groupby('season')
+
+    report = pd.DataFrame({
+        'matches': seasons['matches'].sum(),
+        'sync_dates': sync.size(),
+        'parallel_share': parallel['matches'].sum() / seasons['matches'].sum(),
+        'achieved_parallelism': parallel['busy'].sum() / parallel['seconds'].sum(),
+        'available_parallelism': parallel['busy'].sum() / parallel['critical'].sum(),
+        'seconds': seasons['seconds'].sum(),
+        'sync_overhead': sync['seconds'].sum() / seasons['seconds'].sum(),
+    }).fillna({'sync_dates': 0, 'parallel_share': 0., 'sync_overhead': 0.})
+    report['sync_dates'] = report['sync_dates'].astype(int)
+    return report
@@ -0,0 +1,105 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # optional, without it the sequential engine runs the same loop as plain python
+    njit = None
+
+NUMBA_AVAILABLE = njit is not None
+
+
+def elo_match_loop(w_id: np.array,
+                   l_id: np.array,
+                   straight_sets: np.array,
+                   games_cdf: np.array,
+                   surface_codes: np.array,
+                   itf: np.array,
+                   surface_weights: np.array,
+                   playing_surface: np.array,
+                   k_table: np.array,
+                   K: float,
+                   offset: float,
+                   shape: float,
+                   itf_deduction: float,
+                   s_boost: float,
+                   trend_rate: float,
+                   trend_weight: float,
+                   at_weight: float,
+                   player_abs: np.array,
+                   games_played: np.array,
+                   player_trend: np.array,
+                   at_abilities: np.array,
+                   probs: np.array,
+                   abilities: np.array):
+    """Scalar ELO loop, matches are applied strictly in order so each sees the state left by the one before. Same
+    update rules (and floating point operation order) as elo_round_arrays with a PrimitiveTable, compiled with Numba
+    when it is installed (see elo_match_kernel). Player state is updated IN PLACE
+
+    Args:
+        w_id (np.array): winner ids
+        l_id (np.array): loser ids
+        straight_sets (np.array): True if the winner won in straight sets
+        games_cdf (np.array): binomial cdf of games won (see PrimitiveTable.get_binom_cdf)
+        surface_codes (np.array): surface codes (see get_surface_codes)
+        itf (np.array): True if game on itf circuit
+        surface_weights (np.array): surface weights per surface code (PrimitiveTable.surface_weights)
+        playing_surface (np.array): playing surface per surface code (PrimitiveTable.playing_surface)
+        k_table (np.array): k factor per [itf, games played] (PrimitiveTable.k_factor), computed directly past it
+        K (float): static number to be divided by
+        offset (float): ensures K factor not too big to start
+        shape (float): ensures K factor doesn't get too small over time
+        itf_deduction (float): % to deduct if game played on itf
+        s_boost (float): added to winners performance score if they win in straight sets
+        trend_rate (float): EWMA rate of the trend
+        trend_weight (float): weight of the trend in current ability
+        at_weight (float): weight of all time ability in current ability
+        player_abs (np.array): current player abilities
+        games_played (np.array): games played previously
+        player_trend (np.array): current trend
+        at_abilities (np.array): all time max abilities
+        probs (np.array): (n_matches,) buffer pre match probabilities are written to
+        abilities (np.array): (2, n_matches) buffer the winner and loser current abilities are written to
+    """
+    n_abilities = player_abs.shape[1]
+    max_played = k_table.shape[1]
+
+    for i in range(len(w_id)):
+        code = surface_codes[i]
+
+        # abilities summed left to right, the order numpy uses for a row this short, so results are identical
+        w_ability, l_ability = 0., 0.
+        for player, side in ((w_id[i], 0), (l_id[i], 1)):
+            c_sum, at_sum = 0., 0.
+            for j in range(n_abilities):
+                c_sum += player_abs[player, j]*surface_weights[code, j]
+                at_sum += at_abilities[player, j]*surface_weights[code, j]
+
+            c_ab = c_sum*(1 - at_weight) + at_sum*at_weight
+            ability = c_ab + c_ab*player_trend[player]*trend_weight
+            if side == 0:
+                w_ability = ability
+            else:
+                l_ability = ability
+
+        p = 1 - 1/(1 + np.power(10., (w_ability - l_ability)/400))
+        probs[i] = p
+        abilities[0, i], abilities[1, i] = w_ability, l_ability
+
+        w_score = games_cdf[i] + straight_sets[i]*s_boost
+        for player, performance in ((w_id[i], w_score - p), (l_id[i], (1 - w_score) - (1 - p))):
+            for j in range(n_abilities):
+                played = int(games_played[player, j])
+                if played < max_played:
+                    k_factor = k_table[int(itf[i]), played]
+                else:
+                    k_factor = K / (games_played[player, j] + offset)**shape*(1 - itf[i]*itf_deduction)
+
+                player_abs[player, j] += k_factor*performance*playing_surface[code, j]
+                at_abilities[player, j] = max(player_abs[player, j], at_abilities[player, j])
+                games_played[player, j] += playing_surface[code, j]
+
+            player_trend[player] = player_trend[player]*(1 - trend_rate) + performance*trend_rate
+
+
+# plain python is still faster than numpy rounds of a single match, so it is the fallback
+elo_match_kernel = njit(cache=True, nogil=True)(elo_match_loop) if NUMBA_AVAILABLE else elo_match_loop
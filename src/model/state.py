@@ -0,0 +1,167 @@
+from typing import List, Dict, Optional
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+from .model import PrimitiveTable, get_match_arrays, get_day_ordinals, elo_arrays
+from ..constants import PARAMS, SOURCE_COL, J_WINNER_COL, J_LOSER_COL
+
+
+class EloState:
+    """Current ratings that can be brought up to date with new matches without replaying history. Player arrays are
+    views onto buffers with spare capacity, so new players are added in amortised constant time
+
+    Args:
+        surfaces (List[str]): surface columns (one hot encoding) in the order abilities are stored
+        params (Dict[str, float]): ELO model parameters (parameters.yml)
+        player_map (Optional[Dict[str, int]]): existing player name -> id, ids must be 0 -> n_players - 1
+        capacity (int): number of players to allocate space for up front
+    """
+
+    def __init__(self, surfaces: List[str], params: Dict[str, float] = PARAMS,
+                 player_map: Optional[Dict[str, int]] = None, capacity: int = 1024):
+        self.surfaces = list(surfaces)
+        self.params = params
+        self.player_map = dict(player_map or {})
+        # day ordinal of the last date ingested
+        self.last_date: Optional[int] = None
+
+        self.tables = PrimitiveTable(params, n_surfaces=len(self.surfaces))
+        self._capacity = 0
+        self._reserve(self.n_players, capacity)
+
+    @property
+    def n_players(self) -> int:
+        return len(self.player_map)
+
+    def _reserve(self, n_players: int, capacity: int = 0):
+        """Makes sure buffers can hold n_players (doubling), then points the state arrays at the first n_players"""
+        if max(n_players, capacity) > self._capacity:
+            capacity = max(n_players, capacity, 2*self._capacity)
+            n_abilities = len(self.surfaces) + 1
+
+            buffers = (np.full((capacity, n_abilities), 1500.), np.zeros((capacity, n_abilities)),
+                       np.zeros((capacity,)), np.full((capacity, n_abilities), 1500.))
+            if self._capacity:
+                for new, old in zip(buffers, (self._abs, self._games, self._trend, self._at)):
+                    new[:self._capacity] = old
+            self._abs, self._games, self._trend, self._at = buffers
+            self._capacity = capacity
+
+        self.player_abs = self._abs[:n_players]
+        self.games_played = self._games[:n_players]
+        self.player_trend = self._trend[:n_players]
+        self.at_abilities = self._at[:n_players]
+
+    def get_player_ids(self, names: np.array) -> np.array:
+        """Maps player names to ids, adding any unseen players with fresh (1500) ratings
+
+        Args:
+            names (np.array): player names
+
+        Returns:
+            np.array: player ids
+        """
+        for name in pd.unique(names):
+            if name not in self.player_map:
+                self.player_map[name] = len(self.player_map)
+        self._reserve(self.n_players)
+        return np.array([self.player_map[name] for name in names], dtype=np.int64)
+
+    def ingest(self,
+               matches: pd.DataFrame,
+               date_col: str = 'inferred_date',
+               w_name_col: str = J_WINNER_COL,
+               w_games_col: str = 'WGames',
+               w_sets_col: str = 'WSets',
+               l_name_col: str = J_LOSER_COL,
+               l_games_col: str = 'LGames',
+               l_sets_col: str = 'LSets',
+               itf_col: str = SOURCE_COL) -> np.array:
+        """Updates ratings with matches played after the last date already ingested (earlier ones are skipped), dates
+        must be datetimes so they compare across calls
+
+        Args:
+            matches (pd.DataFrame): clean match data (see pipeline.get_clean_data), surfaces as in self.surfaces
+            date_col (str): Column with date
+            w_name_col (str): Column with winner names
+            w_games_col (str): Columns with games won by winner
+            w_sets_col (str): Columns with sets won by winner
+            l_name_col (str): Column with loser names
+            l_games_col (str): Columns with games won by loser
+            l_sets_col (str): Columns with games won by loser
+            itf_col (str): Column with bool indicator if game on itf circuit
+
+        Returns:
+            np.array: pre match probability of the winner winning for each row, NaN if skipped
+        """
+        probs = np.full((len(matches),), np.nan)
+
+        new = np.ones(len(matches), dtype=bool)
+        if self.last_date is not None:
+            new = get_day_ordinals(matches[date_col]) > self.last_date
+            if not new.all():
+                logging.debug(f'ELO STATE: skipped {np.sum(~new)} matches on or before last date ingested')
+        if not new.any():
+            return probs
+
+        # ids from this state's player map replace any already in the data
+        matches = matches[new].assign(WID=self.get_player_ids(matches.loc[new, w_name_col].values),
+                                      LID=self.get_player_ids(matches.loc[new, l_name_col].values))
+
+        match_arrays = get_match_arrays(
+            data=matches, date_col=date_col, w_id_col='WID', w_games_col=w_games_col,
+            w_sets_col=w_sets_col, l_id_col='LID', l_games_col=l_games_col, l_sets_col=l_sets_col,
+            surface_cols=self.surfaces, itf_col=itf_col)
+
+        # state arrays are views onto the buffers so are updated in place
+        *_, probs[new] = elo_arrays(self.params, match_arrays, self.player_abs, self.games_played, self.player_trend,
+                                    self.at_abilities, tables=self.tables)
+
+        self.last_date = int(match_arrays.dates[-1])
+        return probs
+
+    def save(self, path: str):
+        """Saves state to a single uncompressed .npz file"""
+        np.savez(path, player_abs=self.player_abs, games_played=self.games_played, player_trend=self.player_trend,
+                 at_abilities=self.at_abilities, players=np.array(list(self.player_map), dtype=str),
+                 meta=np.array(json.dumps({'surfaces': self.surfaces, 'params': self.params,
+                                           'last_date': self.last_date})))
+
+    @classmethod
+    def from_arrays(cls, surfaces: List[str], params: Dict[str, float], player_map: Dict[str, int],
+                    player_abs: np.array, games_played: np.array, player_trend: np.array, at_abilities: np.array,
+                    last_date: Optional[int] = None) -> 'EloState':
+        """Wraps existing ratings (e.g. the output of elo) so they can be updated incrementally
+
+        Args:
+            surfaces (List[str]): surface columns abilities correspond to
+            params (Dict[str, float]): ELO model parameters
+            player_map (Dict[str, int]): player name -> id (row of the arrays)
+            player_abs (np.array): current player abilities
+            games_played (np.array): games played previously
+            player_trend (np.array): current trend
+            at_abilities (np.array): all time max abilities
+            last_date (Optional[int]): day ordinal (see get_day_ordinals) of the last date played
+
+        Returns:
+            EloState: state holding a copy of the arrays
+        """
+        state = cls(surfaces, params, player_map=player_map)
+        state.player_abs[:] = player_abs
+        state.games_played[:] = games_played
+        state.player_trend[:] = player_trend
+        state.at_abilities[:] = at_abilities
+        state.last_date = None if last_date is None else int(last_date)
+        return state
+
+    @classmethod
+    def load(cls, path: str) -> 'EloState':
+        """Loads state saved with EloState.save"""
+        with np.load(path) as saved:
+            meta = json.loads(str(saved['meta']))
+            return cls.from_arrays(
+                meta['surfaces'], meta['params'], {name: i for i, name in enumerate(saved['players'])},
+                saved['player_abs'], saved['games_played'], saved['player_trend'], saved['at_abilities'],
+                meta['last_date'])
@@ -0,0 +1,221 @@
+from typing import Tuple, Optional
+import os
+import json
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from .model import STATE_FIELDS, EloRound
+from .observers import EloObserver
+
+META_FILE = 'meta.json'
+UNDO_FILE = 'undo.log'
+
+
+class MemmapState:
+    """ELO state kept in memory mapped .npy files (one per state field) rather than RAM, so very large player
+    universes replay in small containers. The state attributes are plain ndarray views onto the mappings and are used
+    like the in memory arrays (elo with inplace=True), the OS pages in the rows a round touches
+
+    Writes are made crash consistent by a StoreJournal (see journal): rows are saved to an undo log before a round
+    changes them and the state is committed at round boundaries, opening a folder left by a killed replay rolls back
+    the rounds after the last commit. Writes to the mappings reach the OS straight away so a killed process loses
+    nothing, durable commits also sync the files to disk (surviving power loss) at a much higher cost
+
+    Args:
+        folder (str): folder holding the state files (see create)
+        mode (str): `r+` to read and write, `r` read only
+    """
+
+    def __init__(self, folder: str, mode: str = 'r+'):
+        self.folder = folder
+        self._maps = [open_memmap(os.path.join(folder, f'{field}.npy'), mode=mode) for field in STATE_FIELDS]
+        self.player_abs, self.games_played, self.player_trend, self.at_abilities = (
+            values.view(np.ndarray) for values in self._maps)
+
+        with open(os.path.join(folder, META_FILE)) as f:
+            meta = json.load(f)
+        # batch: number of flushes, date / matches: last round date (day ordinal) and matches applied as of then
+        self.batch, self.date, self.matches = meta['batch'], meta['date'], meta['matches']
+
+        self.rolled_back = self._recover() if mode == 'r+' else 0
+
+    @classmethod
+    def create(cls, folder: str, n_players: int, n_abilities: int) -> 'MemmapState':
+        """New state files for n_players (everyone starts at 1500 with no games or trend), replaces any in folder
+
+        Args:
+            folder (str): folder to write to (created if needed)
+            n_players (int): number of players
+            n_abilities (int): number of abilities per player (surfaces + base)
+
+        Returns:
+            MemmapState: the new state, open for writing
+        """
+        os.makedirs(folder, exist_ok=True)
+        shapes = {'player_abs': (n_players, n_abilities), 'games_played': (n_players, n_abilities),
+                  'player_trend': (n_players,), 'at_abilities': (n_players, n_abilities)}
+        for field in STATE_FIELDS:
+            values = open_memmap(os.path.join(folder, f'{field}.npy'), mode='w+', dtype=np.float64,
+                                 shape=shapes[field])
+            values[...] = 1500. if field in ('player_abs', 'at_abilities') else 0.
+            values.flush()
+            del values
+
+        if os.path.exists(os.path.join(folder, UNDO_FILE)):
+            os.remove(os.path.join(folder, UNDO_FILE))
+        _write_meta(folder, batch=0, date=None, matches=0)
+        return cls(folder)
+
+    @property
+    def state(self) -> Tuple[np.array]:
+        return self.player_abs, self.games_played, self.player_trend, self.at_abilities
+
+    @property
+    def n_players(self) -> int:
+        return len(self.player_trend)
+
+    def journal(self, w_id: np.array, l_id: np.array, flush_every: int = 1, durable: bool = False) -> 'StoreJournal':
+        """Observer making a replay over this state crash consistent (see StoreJournal)
+
+        Args:
+            w_id (np.array): winner ids of the data replayed (positions as the data passed to elo)
+            l_id (np.array): loser ids of the data replayed
+            flush_every (int): rounds between flushes, more rounds per flush write less often but redo more after a
+                crash
+            durable (bool): sync the undo log and state files to disk (see flush)
+
+        Returns:
+            StoreJournal: pass in elo `observers`
+        """
+        return StoreJournal(self, w_id, l_id, flush_every, durable)
+
+    def flush(self, date: Optional[int] = None, matches: int = 0, durable: bool = False):
+        """Marks the state as of date (and matches more applied) as committed, the undo log is dropped only once the
+        mark is written
+
+        Args:
+            date (Optional[int]): day ordinal of the last round applied, unchanged if None
+            matches (int): matches applied since the last flush
+            durable (bool): first write the mapped files to disk (msync) and sync the mark
+        """
+        if durable:
+            for values in self._maps:
+                values.flush()
+        self.batch += 1
+        self.date = self.date if date is None else date
+        self.matches += matches
+        _write_meta(self.folder, durable, batch=self.batch, date=self.date, matches=self.matches)
+
+        if os.path.exists(os.path.join(self.folder, UNDO_FILE)):
+            os.remove(os.path.join(self.folder, UNDO_FILE))
+
+    def _recover(self) -> int:
+        """Rolls back rows changed after the last flush, returns the number of rows restored"""
+        path = os.path.join(self.folder, UNDO_FILE)
+        if not os.path.exists(path):
+            return 0
+
+        restored = 0
+        with open(path, 'rb') as f:
+            # a log of an already committed batch (killed before it was removed) has nothing to undo
+            header = _read_record(f, 1)
+            if header is not None and header[0][0] == self.batch + 1:
+                # newest first, so rows saved twice end up with their oldest values
+                records = []
+                while True:
+                    record = _read_record(f, 1 + len(STATE_FIELDS))
+                    if record is None:
+                        break
+                    records.append(record)
+                for ids, *rows in reversed(records):
+                    for values, saved in zip(self.state, rows):
+                        values[ids] = saved
+                    restored += len(ids)
+
+        for values in self._maps:
+            values.flush()
+        os.remove(path)
+        return restored
+
+
+class StoreJournal(EloObserver):
+    """Saves the rows of a round's players to the store's undo log before the round changes them and flushes the
+    store every flush_every rounds (and at the end). The log only holds rows first touched since the last flush
+
+    Args:
+        store (MemmapState): state the replay updates (inplace)
+        w_id (np.array): winner ids of the data replayed
+        l_id (np.array): loser ids of the data replayed
+        flush_every (int): rounds between flushes
+        durable (bool): sync the undo log to disk before each round and the state files at each flush
+    """
+
+    def __init__(self, store: MemmapState, w_id: np.array, l_id: np.array, flush_every: int = 1,
+                 durable: bool = False):
+        self.store = store
+        self.w_id, self.l_id = np.asarray(w_id), np.asarray(l_id)
+        self.flush_every = flush_every
+        self.durable = durable
+
+        self._saved = np.zeros((store.n_players,), dtype=bool)
+        self._log = None
+        self._rounds, self._matches, self._date = 0, 0, None
+
+    def on_round_start(self, date: int, index: np.array, state: Tuple[np.array]):
+        if any(values is not stored for values, stored in zip(state, self.store.state)):
+            raise ValueError('StoreJournal needs the replay to run inplace on the store state (no renumber or '
+                             'state_dtype)')
+
+        ids = np.unique(np.concatenate((self.w_id[index], self.l_id[index])))
+        ids = ids[~self._saved[ids]]
+        if not len(ids):
+            return
+
+        if self._log is None:
+            self._log = open(os.path.join(self.store.folder, UNDO_FILE), 'wb')
+            np.save(self._log, np.array([self.store.batch + 1]))
+        for values in (ids, *(values[ids] for values in state)):
+            np.save(self._log, values)
+        # handed to the OS before the round writes the rows, so a killed process leaves the log behind
+        self._log.flush()
+        if self.durable:
+            os.fsync(self._log.fileno())
+        self._saved[ids] = True
+
+    def on_round_end(self, elo_round: EloRound):
+        self._rounds += 1
+        self._matches += len(elo_round.index)
+        self._date = elo_round.date
+        if self._rounds % self.flush_every == 0:
+            self._flush()
+
+    def on_finish(self, state: Tuple[np.array]):
+        if self._matches or self._log is not None:
+            self._flush()
+
+    def _flush(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        self.store.flush(date=self._date, matches=self._matches, durable=self.durable)
+        self._saved[...] = False
+        self._matches = 0
+
+
+def _write_meta(folder: str, durable: bool = False, **meta):
+    """Replaces the meta file atomically"""
+    path = os.path.join(folder, META_FILE)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(meta, f)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(f'{path}.tmp', path)
+
+
+def _read_record(f, n_arrays: int) -> Optional[list]:
+    """Next n_arrays arrays of the undo log, None if the log ends (or was cut short by a kill) before them"""
+    try:
+        return [np.load(f) for _ in range(n_arrays)]
+    except (EOFError, ValueError, OSError):
+        return None
@@ -1,22 +1,38 @@
+from typing import Dict, Tuple, Optional
+import os
 import numpy as np
 import pandas as pd
 from datetime import datetime
 import logging
+from numpy.lib.format import open_memmap
 
 from .constants import PIPELINE_DATA_FILE, CLEAN_DATA_FILE_PATH, MODEL_OUTPUT_FOLDER, SURFACE_MAP, ROUND_ORDER, PARAMS, SOURCE_COL, J_SURFACE_COL, J_WINNER_COL, J_LOSER_COL, J_SCORE_COL, J_T_NAME, J_T_DATE, J_ROUND
 from .data_ingestion.data_scraping import get_raw_games
 from .data_ingestion.data_cleaning import score_to_int, get_player_map, surface_to_one_hot, get_inferred_date
-from .model.model import elo
-from .model.model_output import get_rankings, get_model_calibration, get_model_performance
+from .model.model import STATE_FIELDS, elo, get_day_ordinals, get_surface_codes
+from .model.state import EloState
+from .model.store import META_FILE, MemmapState
+from .model.observers import PredictionWriter
+from .model.metrics import MetricAccumulator
+from .model.fitting import fit, successive_halving, fit_lbfgs, get_initial_state
+from .model.model_output import get_rankings, get_model_calibration, get_performance_report
 from .logging_functions import timeit
 
+PREDICTIONS_FILE = 'predictions.npy'
+
 
 @timeit
-def run(year_from: int, year_to: int, test_size: int):
-    """Runs pipeline
-    """
-    assert (year_to - year_from - test_size) > 0
+def get_clean_data(year_from: int, year_to: int, save: bool = True) -> Tuple[pd.DataFrame, Dict[str, int], np.array]:
+    """Scrapes and cleans all games between the years provided
 
+    Args:
+        year_from (int): starting year
+        year_to (int): end year
+        save (bool): save clean dataset (format can be seen in constants.py)
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, int], np.array]: clean data sorted by date, player map, surface categories
+    """
     # scraping
     raw_data = get_raw_games(PIPELINE_DATA_FILE, year_from, year_to)
 
@@ -36,7 +52,82 @@ def run(year_from: int, year_to: int, test_size: int):
 
     clean_data = clean_data.sort_values(by='inferred_date').reset_index(drop=True)
 
-    clean_data.to_csv(CLEAN_DATA_FILE_PATH.format(PIPELINE_DATA_FILE, year_from, year_to))
+    if save:
+        clean_data.to_csv(CLEAN_DATA_FILE_PATH.format(PIPELINE_DATA_FILE, year_from, year_to))
+
+    return clean_data, player_map, s_categories
+
+
+def get_predictions(clean_data: pd.DataFrame, n_players: int, s_categories: np.array,
+                    state_folder: Optional[str] = None) -> Tuple[np.array, Tuple[np.array]]:
+    """Runs ELO over the clean data, a single state carried through and predictions written straight into one
+    buffer. With a state folder the state and predictions are kept in memory mapped files committed after every
+    date, a folder left by a killed run is resumed from its last committed date rather than replayed
+
+    Args:
+        clean_data (pd.DataFrame): clean data sorted by date (see get_clean_data)
+        n_players (int): number of players
+        s_categories (np.array): surface categories
+        state_folder (Optional[str]): folder for the memory mapped state (see MemmapState), in RAM if None
+
+    Returns:
+        Tuple[np.array, Tuple[np.array]]: predictions (data order), player_abs, games_played, player_trend,
+            at_abilities
+    """
+    elo_cols = dict(
+        params=PARAMS, date_col='inferred_date', w_id_col='WID', w_games_col='WGames', w_sets_col='WSets',
+        l_id_col='LID', l_games_col='LGames', l_sets_col='LSets', surface_cols=s_categories, itf_col=SOURCE_COL)
+    n_abilities = len(s_categories) + 1
+
+    if state_folder is None:
+        state = get_initial_state(n_players, n_abilities)
+        *_, predictions = elo(**elo_cols, data=clean_data, **dict(zip(STATE_FIELDS, state)), inplace=True)
+        return predictions, state
+
+    predictions_path = os.path.join(state_folder, PREDICTIONS_FILE)
+    if os.path.exists(os.path.join(state_folder, META_FILE)):
+        # rolls back the rounds after the last commit
+        store = MemmapState(state_folder)
+        predictions = open_memmap(predictions_path, mode='r+')
+        if store.n_players != n_players or len(predictions) != len(clean_data):
+            raise ValueError(f'{state_folder} holds a run over other data, remove it to start again')
+    else:
+        store = MemmapState.create(state_folder, n_players, n_abilities)
+        predictions = open_memmap(predictions_path, mode='w+', dtype=np.float64, shape=(len(clean_data),))
+
+    # dates up to the last commit are applied, clean data is sorted so they are a prefix
+    start = 0 if store.date is None else int(
+        np.searchsorted(get_day_ordinals(clean_data['inferred_date']), store.date, side='right'))
+    if start != store.matches:
+        raise ValueError(f'{state_folder} committed {store.matches} matches but {start} are on or before its last '
+                         f'date, remove it to start again')
+    if start:
+        logging.info(f'RESUMING: {start} of {len(clean_data)} matches already applied in {state_folder}')
+
+    remaining = clean_data.iloc[start:]
+    if len(remaining):
+        elo(**elo_cols, data=remaining, **dict(zip(STATE_FIELDS, store.state)), inplace=True, keep_probs=False,
+            observers=[PredictionWriter(predictions[start:]),
+                       store.journal(remaining['WID'].values, remaining['LID'].values)])
+
+    predictions.flush()
+    return np.asarray(predictions), store.state
+
+
+@timeit
+def run(year_from: int, year_to: int, test_size: int, state_folder: Optional[str] = None):
+    """Runs pipeline
+
+    Args:
+        year_from (int): year from
+        year_to (int): year to
+        test_size (int): final years predicted out of sample
+        state_folder (Optional[str]): keep the ELO state in memory mapped files in this folder rather than RAM (see
+            MemmapState), committed after every date. Rerunning with the folder of a killed run resumes it
+    """
+    assert (year_to - year_from - test_size) > 0
+
+    clean_data, player_map, s_categories = get_clean_data(year_from, year_to)
 
     logging.info('DATA CLEANING COMPLETE')
 
@@ -45,35 +136,25 @@ def run(year_from: int, year_to: int, test_size: int):
 
     date_cutoff = datetime.strptime(f'{year_to - test_size}1231', '%Y%m%d')
 
-    train_data = clean_data[clean_data['inferred_date'] <= date_cutoff].copy(
-        deep=True).sort_values(by='inferred_date').reset_index(drop=True)
-    test_data = clean_data[clean_data['inferred_date'] > date_cutoff].copy(
-        deep=True).sort_values(by='inferred_date').reset_index(drop=True)
+    # clean data is sorted by date so the split is a position, train and test are views rather than copies
+    cutoff = clean_data['inferred_date'].searchsorted(date_cutoff, side='right')
+    test_data = clean_data.iloc[cutoff:]
 
-    player_abilities = np.full((len(player_map), len(s_categories) + 1), 1500.)
-    games_played = np.zeros((len(player_map), len(s_categories) + 1))
-    player_trend = np.zeros((len(player_map),))
-    alltime_abilities = np.full((len(player_map), len(s_categories) + 1), 1500.)
+    predictions, (test_abilities, test_games, test_trend, test_alltime) = get_predictions(
+        clean_data, len(player_map), s_categories, state_folder)
+    test_predictions = predictions[cutoff:]
 
-    train_abilities, train_games, train_trend, train_alltime, train_p = elo(
-        params=PARAMS, data=train_data, date_col='inferred_date', w_id_col='WID', w_games_col='WGames',
-        w_sets_col='WSets', l_id_col='LID', l_games_col='LGames', l_sets_col='LSets', surface_cols=s_categories,
-        itf_col=SOURCE_COL, player_abs=player_abilities, games_played=games_played, player_trend=player_trend,
-        at_abilities=alltime_abilities)
-
-    test_abilities, test_games, test_trend, test_alltime, test_predictions = elo(
-        params=PARAMS, data=test_data, date_col='inferred_date', w_id_col='WID', w_games_col='WGames',
-        w_sets_col='WSets', l_id_col='LID', l_games_col='LGames', l_sets_col='LSets', surface_cols=s_categories,
-        itf_col=SOURCE_COL, player_abs=train_abilities, games_played=train_games, player_trend=train_trend,
-        at_abilities=train_alltime)
+    # scored from the predictions so matches applied before a resume count too
+    test_metrics = MetricAccumulator(surfaces=s_categories)
+    test_metrics.update(test_predictions, (test_data[SOURCE_COL] == 'I').values,
+                        get_surface_codes(test_data[s_categories].values))
 
     logging.info('MODELING COMPLETE')
 
     # output
-    test_data['p'] = test_predictions
-    test_data.to_csv(f'{MODEL_OUTPUT_FOLDER}test_predictions.csv')
+    test_data.assign(p=test_predictions).reset_index(drop=True).to_csv(f'{MODEL_OUTPUT_FOLDER}test_predictions.csv')
 
-    model_performance = get_model_performance(test_predictions, test_data[SOURCE_COL].values)
+    model_performance = get_performance_report(test_metrics)
     with open(f'{MODEL_OUTPUT_FOLDER}test_model_performance.txt', 'w+') as txt:
         txt.write(model_performance)
 
@@ -82,3 +163,46 @@ def run(year_from: int, year_to: int, test_size: int):
 
     calibration_fig = get_model_calibration(test_predictions, test_data[SOURCE_COL].values)
     calibration_fig.savefig(f'{MODEL_OUTPUT_FOLDER}test_model_calibration.png')
+
+    # final ratings, new matches can be added with EloState.ingest without replaying history
+    EloState.from_arrays(
+        s_categories, PARAMS, player_map, test_abilities, test_games, test_trend, test_alltime,
+        last_date=get_day_ordinals(test_data['inferred_date']).max()).save(f'{MODEL_OUTPUT_FOLDER}elo_state.npz')
+
+
+@timeit
+def tune(year_from: int, year_to: int, burn_in: int, n_candidates: int, workers: int = None, seed: int = 0,
+         journal: str = None, method: str = 'random'):
+    """Searches for ELO parameters, results table saved to output folder
+
+    Args:
+        year_from (int): year from
+        year_to (int): year to
+        burn_in (int): years of matches used to warm up ratings before scoring
+        n_candidates (int): number of parameter sets to evaluate (random and halving)
+        workers (int): number of processes, all cores if None (random)
+        seed (int): random seed
+        journal (str): SQLite journal, reruns skip candidates already scored, None to not persist (random)
+        method (str): `random` search over a process pool, successive `halving` or `lbfgs` with exact gradients
+    """
+    assert (year_to - year_from - burn_in) >= 0
+
+    clean_data, player_map, s_categories = get_clean_data(year_from, year_to)
+
+    elo_cols = dict(
+        data=clean_data, date_col='inferred_date', w_id_col='WID', w_games_col='WGames', w_sets_col='WSets',
+        l_id_col='LID', l_games_col='LGames', l_sets_col='LSets', surface_cols=s_categories, itf_col=SOURCE_COL,
+        n_players=len(player_map), score_from=datetime.strptime(f'{year_from + burn_in}0101', '%Y%m%d'))
+
+    if method == 'random':
+        results = fit(**elo_cols, n_candidates=n_candidates, seed=seed, workers=workers, journal=journal)
+    elif method == 'halving':
+        results = successive_halving(**elo_cols, n_candidates=n_candidates, seed=seed)
+    elif method == 'lbfgs':
+        _, results = fit_lbfgs(**elo_cols)
+        results = results.sort_values(by='log_likelihood', ascending=False)
+    else:
+        raise ValueError(f'Unknown method: {method}')
+
+    results.to_csv(f'{MODEL_OUTPUT_FOLDER}fit_results.csv')
+    logging.info(f'BEST PARAMS: {results.iloc[0].to_dict()}')
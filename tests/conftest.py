@@ -0,0 +1,28 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from src.data_ingestion.synthetic import get_synthetic_games
+
+
+@pytest.fixture
+def games() -> pd.DataFrame:
+    return get_synthetic_games(n_players=40, n_dates=60, games_per_date=8, latent_skill=False)
+
+
+@pytest.fixture
+def elo_kwargs() -> dict:
+    return dict(date_col='inferred_date', w_id_col='WID', w_games_col='WGames', w_sets_col='WSets', l_id_col='LID',
+                l_games_col='LGames', l_sets_col='LSets', surface_cols=['Clay', 'Grass', 'Hard'], itf_col='source')
+
+
+@pytest.fixture
+def initial_state():
+
+    def initial_state(n_players: int, n_surfaces: int = 3):
+        return dict(player_abs=np.full((n_players, n_surfaces + 1), 1500.),
+                    games_played=np.zeros((n_players, n_surfaces + 1)),
+                    player_trend=np.zeros((n_players,)),
+                    at_abilities=np.full((n_players, n_surfaces + 1), 1500.))
+
+    return initial_state
@@ -0,0 +1,14 @@
+import pytest
+import numpy as np
+
+from src.data_ingestion.synthetic import get_synthetic_games
+
+
+@pytest.mark.parametrize("latent_skill", [True, False])
+def test_get_synthetic_games(latent_skill):
+    games = get_synthetic_games(n_players=10, n_dates=5, games_per_date=4, latent_skill=latent_skill)
+
+    assert len(games) == 20 and games['inferred_date'].is_monotonic_increasing
+    assert (games['WID'] != games['LID']).all() and games[['WID', 'LID']].values.max() < 10
+    np.testing.assert_array_equal(games[['Clay', 'Grass', 'Hard']].sum(axis=1), 1)
+    assert games.equals(get_synthetic_games(n_players=10, n_dates=5, games_per_date=4, latent_skill=latent_skill))
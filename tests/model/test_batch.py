@@ -0,0 +1,58 @@
+import tracemalloc
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo, get_log_likelihood, get_match_arrays
+from src.model.batch import elo_batch, elo_batch_arrays, stack_params, get_lane_params, get_lane_bytes
+from src.data_ingestion.synthetic import get_synthetic_games
+
+
+def get_candidates():
+    return [PARAMS, {**PARAMS, 'K': 150., 'surface_weight': 0.}, {**PARAMS, 'p': .6, 'trend_rate': .5}]
+
+
+def test_get_lane_params():
+    lane_params = get_lane_params(stack_params(get_candidates()))
+    assert lane_params['K'].shape == (3, 1, 1)
+    assert lane_params['p'].shape == (3, 1)
+
+
+def test_elo_batch(games, elo_kwargs, initial_state):
+    candidates = get_candidates()
+    state = initial_state(40)
+
+    probs, log_likelihood = elo_batch(candidates, games, **elo_kwargs, **state)
+
+    assert probs.shape == (len(candidates), len(games))
+    for lane, params in enumerate(candidates):
+        *_, e_probs = elo(params, games, **elo_kwargs, **state)
+        np.testing.assert_allclose(probs[lane], e_probs, rtol=1e-12)
+        assert log_likelihood[lane] == get_log_likelihood(probs[lane], 1)
+
+
+def test_elo_batch_chunks(games, elo_kwargs, initial_state):
+    state = initial_state(40)
+
+    probs, _ = elo_batch(get_candidates(), games, **elo_kwargs, **state)
+    # cap fits a single lane
+    chunked, _ = elo_batch(get_candidates(), games, **elo_kwargs, **state, max_bytes=1)
+
+    np.testing.assert_array_equal(probs, chunked)
+
+
+def test_get_lane_bytes(elo_kwargs, initial_state):
+    # a single date of 2000 matches, its temporaries dwarf the state
+    games = get_synthetic_games(n_players=4000, n_dates=1, games_per_date=2000, latent_skill=False)
+    m = get_match_arrays(games, **elo_kwargs)
+    n_lanes = len(get_candidates())
+    state = [np.repeat(values[None], n_lanes, axis=0) for values in initial_state(4000).values()]
+
+    tracemalloc.start()
+    elo_batch_arrays(stack_params(get_candidates()), m, *state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # state is allocated beforehand, so the peak is predictions and temporaries
+    state_bytes = get_lane_bytes(4000, 4, 0)
+    assert peak > n_lanes*(get_lane_bytes(4000, 4, 2000) - state_bytes)
+    assert peak < n_lanes*(get_lane_bytes(4000, 4, 2000, max_round=2000) - state_bytes)
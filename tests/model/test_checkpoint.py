@@ -0,0 +1,133 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from src.constants import PARAMS
+from src.model.model import get_match_arrays, get_match_slice, elo_arrays, elo
+from src.model.checkpoint import (
+    get_checkpoint_positions, elo_checkpoints, load_checkpoints, get_checkpoint_index, get_state_at,
+    replay_corrections)
+
+
+@pytest.mark.parametrize("dates, every, expected", [
+    (np.array([0, 0, 1, 2, 2, 3]), 1, [0, 2, 3, 5, 6]),
+    (np.array([0, 0, 1, 2, 2, 3]), 2, [0, 3, 6]),
+    (np.array([0, 0, 1, 2, 2, 3]), 10, [0, 6]),
+    # 4 and 11 are Mondays
+    (np.array([1, 2, 4, 4, 10, 11, 12]), 'week', [0, 2, 5, 7]),
+    (np.array([], dtype=np.int32), 3, [0]),
+])
+def test_get_checkpoint_positions(dates, every, expected):
+    np.testing.assert_array_equal(get_checkpoint_positions(dates, every), expected)
+
+
+def test_get_checkpoint_positions_invalid():
+    with pytest.raises(ValueError):
+        get_checkpoint_positions(np.array([0, 1]), 0)
+
+
+@pytest.mark.parametrize("every", [1, 7, 'week', 100])
+def test_elo_checkpoints(games, elo_kwargs, initial_state, tmp_path, every):
+    m = get_match_arrays(games, **elo_kwargs)
+    *expected, expected_probs = elo_arrays(PARAMS, m, *initial_state(40).values())
+
+    *actual, probs = elo_checkpoints(PARAMS, m, *initial_state(40).values(), folder=tmp_path, every=every)
+
+    np.testing.assert_allclose(probs, expected_probs)
+    checkpoints = load_checkpoints(tmp_path)
+    assert isinstance(checkpoints.player_abs, np.memmap)
+    for a, e, final in zip(actual, expected, (checkpoints.player_abs[-1], checkpoints.games_played[-1],
+                                              checkpoints.player_trend[-1], checkpoints.at_abilities[-1])):
+        np.testing.assert_allclose(a, e)
+        np.testing.assert_allclose(final, e)
+
+
+@pytest.mark.parametrize("every", [1, 7, 'week'])
+@pytest.mark.parametrize("day", [-5, 0, 13, 31, 59, 70])
+def test_get_state_at(games, elo_kwargs, initial_state, tmp_path, every, day):
+    m = get_match_arrays(games, **elo_kwargs)
+    elo_checkpoints(PARAMS, m, *initial_state(40).values(), folder=tmp_path, every=every)
+    checkpoints = load_checkpoints(tmp_path)
+    date = m.dates[0] + day
+
+    # full replay of everything before date
+    expected = initial_state(40)
+    elo_arrays(PARAMS, get_match_slice(m, 0, np.searchsorted(m.dates, date)), *expected.values())
+
+    for a, e in zip(get_state_at(PARAMS, m, checkpoints, date), expected.values()):
+        np.testing.assert_allclose(a, e)
+
+
+def test_get_checkpoint_index(games, elo_kwargs, initial_state, tmp_path):
+    m = get_match_arrays(games, **elo_kwargs)
+    elo_checkpoints(PARAMS, m, *initial_state(40).values(), folder=tmp_path, every=10)
+    checkpoints = load_checkpoints(tmp_path)
+
+    assert get_checkpoint_index(checkpoints, m.dates[0] - 1) == 0
+    assert get_checkpoint_index(checkpoints, m.dates[0] + 19) == 1
+    assert get_checkpoint_index(checkpoints, m.dates[0] + 20) == 2
+    assert get_checkpoint_index(checkpoints, m.dates[-1] + 1) == len(checkpoints.dates) - 1
+
+
+def get_corrections(games, kind):
+    """Changed rows, removed labels for each kind of upstream correction"""
+    if kind == 'score':
+        changes = games.iloc[[300, 420]].copy()
+        changes['LGames'] = changes['LGames'] + 3
+        return changes, None
+    if kind == 'insert':
+        changes = games.iloc[[100]].copy()
+        changes.index = [len(games)]
+        return changes, None
+    if kind == 'before':
+        # before the first snapshot's date
+        changes = games.iloc[[100]].copy()
+        changes.index = [len(games)]
+        changes['inferred_date'] = games['inferred_date'].min() - pd.Timedelta(days=3)
+        return changes, None
+    if kind == 'moved':
+        # old date earlier than the new one
+        changes = games.iloc[[50]].copy()
+        changes['inferred_date'] = games['inferred_date'].iloc[-1]
+        return changes, None
+    if kind == 'rename':
+        changes = games.iloc[[400]].copy()
+        changes['WID'] = (changes['WID'] + 1) % 40
+        changes['LID'] = np.where(changes['LID'] == changes['WID'], (changes['LID'] + 1) % 40, changes['LID'])
+        return changes, None
+    return games.iloc[:0], games.index[[200, 201]]
+
+
+@pytest.mark.parametrize("kind", ['score', 'insert', 'before', 'moved', 'rename', 'walkover'])
+def test_replay_corrections(games, elo_kwargs, initial_state, tmp_path, kind):
+    m = get_match_arrays(games, **elo_kwargs)
+    *original, _ = elo_checkpoints(PARAMS, m, *initial_state(40).values(), folder=tmp_path, every=7)
+    changes, removed = get_corrections(games, kind)
+
+    *actual, moved = replay_corrections(PARAMS, games, changes, load_checkpoints(tmp_path), **elo_kwargs,
+                                        removed=removed)
+
+    # edited rows in place, inserts at the end
+    edited = changes.index.intersection(games.index)
+    corrected = games.copy()
+    corrected.loc[edited] = changes.loc[edited]
+    corrected = pd.concat((corrected.drop(index=pd.Index([] if removed is None else removed)),
+                           changes.drop(index=edited))).reset_index(drop=True)
+    *expected, _ = elo(PARAMS, corrected, **elo_kwargs, **initial_state(40))
+
+    for a, e in zip(actual, expected):
+        np.testing.assert_allclose(a, e)
+
+    change = expected[0] - original[0]
+    np.testing.assert_array_equal(np.sort(moved.index), np.flatnonzero(np.abs(change).max(axis=1) > 1e-9))
+    np.testing.assert_allclose(moved.values, change[moved.index])
+    assert list(moved.columns) == ['Clay', 'Grass', 'Hard', 'Base']
+
+
+def test_replay_corrections_unchanged(games, elo_kwargs, initial_state, tmp_path):
+    m = get_match_arrays(games, **elo_kwargs)
+    elo_checkpoints(PARAMS, m, *initial_state(40).values(), folder=tmp_path, every=7)
+
+    # resubmitted rows keep their place within their date
+    *_, moved = replay_corrections(PARAMS, games, games.iloc[::20], load_checkpoints(tmp_path), **elo_kwargs)
+    assert moved.empty
@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo, get_k_factor, get_probs
+from src.model.features import FeatureMatrix, get_feature_columns
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+@pytest.mark.parametrize("groups, expected", [
+    (['trend', 'prob'], ['prob', 'w_trend', 'l_trend']),
+    (['games'], [f'{side}_games_{s}' for side in 'wl' for s in [*SURFACES, 'Base']]),
+])
+def test_get_feature_columns(groups, expected):
+    assert get_feature_columns(SURFACES, groups) == expected
+    assert len(get_feature_columns(SURFACES)) == 1 + 2 + 4*8 + 2
+
+    with pytest.raises(ValueError):
+        get_feature_columns(SURFACES, ['elo'])
+
+
+@pytest.mark.parametrize("engine, workspace", [('pandas', False), ('numpy', False), ('numpy', True),
+                                               ('sequential', False)])
+def test_elo_features(games, elo_kwargs, initial_state, engine, workspace):
+    features = FeatureMatrix(len(games), SURFACES, dtype=np.float64)
+    *_, probs = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine, workspace=workspace,
+                    features=features)
+    table = features.to_frame(games.index)
+
+    # handed over by the rounds, as predicted
+    np.testing.assert_array_equal(table['prob'], probs)
+    np.testing.assert_allclose(table['prob'], get_probs(table['w_ability'], table['l_ability']), rtol=1e-12)
+
+    # state at the start of the 30th date is the end state of the dates before it
+    date = games['inferred_date'].unique()[30]
+    before, on = games[games['inferred_date'] < date], games[games['inferred_date'] == date]
+    player_abs, games_played, player_trend, _, _ = elo(PARAMS, before, **elo_kwargs, **initial_state(40),
+                                                         engine=engine)
+
+    np.testing.assert_array_equal(table.loc[on.index, 'w_trend'], player_trend[on['WID']])
+    np.testing.assert_array_equal(table.loc[on.index, [f'l_abs_{s}' for s in [*SURFACES, 'Base']]],
+                                  player_abs[on['LID']])
+    np.testing.assert_array_equal(
+        table.loc[on.index, [f'w_k_factor_{s}' for s in [*SURFACES, 'Base']]],
+        get_k_factor(games_played[on['WID']], PARAMS['K'], PARAMS['offset'], PARAMS['shape'],
+                     (on[['source']] == 'I').values, PARAMS['itf_deduction']))
+
+
+def test_elo_features_memmap(games, elo_kwargs, initial_state, tmp_path):
+    path = str(tmp_path / 'features.npy')
+    expected = FeatureMatrix(len(games), SURFACES, groups=['ability', 'games'], dtype=np.float64)
+    features = FeatureMatrix(len(games), SURFACES, groups=['ability', 'games'], dtype=np.float32, path=path)
+
+    elo(PARAMS, games, **elo_kwargs, **initial_state(40), features=expected)
+    elo(PARAMS, games, **elo_kwargs, **initial_state(40), features=features)
+
+    saved = np.load(path, mmap_mode='r')
+    assert saved.shape == (len(games), 2 + 8) and saved.dtype == np.float32 and saved.flags['F_CONTIGUOUS']
+    np.testing.assert_allclose(saved, expected.values, rtol=1e-6)
+
+    with pytest.raises(ValueError):
+        elo(PARAMS, games.iloc[:10], **elo_kwargs, **initial_state(40), features=features)
@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS, PARAM_BOUNDS
+from src.model.model import elo, get_match_arrays, get_log_likelihood
+from src.model.fitting import (
+    get_candidates, save_match_arrays, load_match_arrays, fit, get_rung_ends, successive_halving, fit_lbfgs)
+
+
+def test_get_candidates():
+    candidates = get_candidates(20, seed=3)
+
+    assert candidates == get_candidates(20, seed=3)
+    assert candidates != get_candidates(20, seed=4)
+    for name, (low, high) in PARAM_BOUNDS.items():
+        assert all(low <= c[name] <= high for c in candidates)
+
+
+def test_save_load_match_arrays(games, elo_kwargs, tmp_path):
+    match_arrays = get_match_arrays(games, **elo_kwargs)
+    save_match_arrays(match_arrays, tmp_path)
+    loaded = load_match_arrays(tmp_path)
+
+    assert isinstance(loaded.w_id, np.memmap)
+    for field in match_arrays._fields:
+        np.testing.assert_array_equal(getattr(match_arrays, field), getattr(loaded, field))
+
+
+def test_fit(games, elo_kwargs, initial_state):
+    candidates = [PARAMS, {**PARAMS, 'K': 100.}, {**PARAMS, 'trend_rate': 0.}]
+    score_from = games['inferred_date'].iloc[len(games)//2]
+
+    results = fit(games, **elo_kwargs, n_players=40, workers=2, candidates=candidates, score_from=score_from)
+
+    assert len(results) == len(candidates)
+    assert results['log_likelihood'].is_monotonic_decreasing
+    for i, params in enumerate(candidates):
+        *_, probs = elo(params, games, **elo_kwargs, **initial_state(40))
+        probs = probs[(games['inferred_date'] >= score_from).values]
+        assert results.loc[i, 'log_likelihood'] == pytest.approx(get_log_likelihood(probs, 1))
+
+
+def test_get_rung_ends():
+    dates = np.repeat(np.arange(27), 3)
+    np.testing.assert_array_equal(get_rung_ends(dates, n_rungs=3, eta=3), [9, 27, 81])
+    # always snapped to the end of a date
+    np.testing.assert_array_equal(get_rung_ends(dates, n_rungs=2, eta=2), [42, 81])
+
+
+def test_successive_halving(games, elo_kwargs, initial_state):
+    candidates = get_candidates(9, seed=1)
+    score_from = games['inferred_date'].iloc[len(games)//4]
+
+    results = successive_halving(games, **elo_kwargs, n_players=40, eta=3, n_rungs=3, candidates=candidates,
+                                 score_from=score_from, max_bytes=1)
+
+    np.testing.assert_array_equal(results['rung'].value_counts().sort_index(), [6, 2, 1])
+
+    # survivor resumed from saved state, so scored exactly as a full replay would be
+    best = results.index[0]
+    *_, probs = elo(candidates[best], games, **elo_kwargs, **initial_state(40))
+    probs = probs[(games['inferred_date'] >= score_from).values]
+    assert results.loc[best, 'log_likelihood'] == pytest.approx(get_log_likelihood(probs, 1), rel=1e-12)
+    assert results.loc[best, 'matches'] == len(probs)
+
+
+def test_fit_lbfgs(games, elo_kwargs, initial_state):
+    bounds = {**PARAM_BOUNDS, 'K': (100., 300.)}
+    x0 = {**PARAMS, 'K': 100.}
+    params, history = fit_lbfgs(games, **elo_kwargs, n_players=40, x0=x0, bounds=bounds, max_iter=10)
+
+    *_, start_probs = elo(x0, games, **elo_kwargs, **initial_state(40))
+    *_, fitted_probs = elo(params, games, **elo_kwargs, **initial_state(40))
+
+    assert get_log_likelihood(fitted_probs, 1) > get_log_likelihood(start_probs, 1)
+    assert history['log_likelihood'].iloc[0] == pytest.approx(get_log_likelihood(start_probs, 1))
+    # fixed parameters untouched, others within bounds
+    assert params['offset'] == PARAMS['offset']
+    for name, (low, high) in bounds.items():
+        assert low <= params[name] <= high
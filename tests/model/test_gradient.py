@@ -0,0 +1,34 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import get_match_arrays, elo_arrays, get_log_likelihood
+from src.model.gradient import elo_gradient, PARAM_NAMES
+
+
+def get_log_likelihood_at(params, match_arrays, initial_state, score_from=None):
+    *_, probs = elo_arrays(params, match_arrays, *initial_state(40).values())
+    scored = np.ones(len(probs), dtype=bool)
+    if score_from is not None:
+        scored[match_arrays.order] = match_arrays.dates >= score_from
+    return get_log_likelihood(probs[scored], 1)
+
+
+@pytest.mark.parametrize("score_from", [None, 20])
+def test_elo_gradient(games, elo_kwargs, initial_state, score_from):
+    match_arrays = get_match_arrays(games, **elo_kwargs)
+    if score_from is not None:
+        score_from = int(np.unique(match_arrays.dates)[score_from])
+
+    log_likelihood, gradient = elo_gradient(PARAMS, match_arrays, *initial_state(40).values(), score_from=score_from)
+
+    assert set(gradient) == set(PARAM_NAMES)
+    assert log_likelihood == pytest.approx(get_log_likelihood_at(PARAMS, match_arrays, initial_state, score_from),
+                                           rel=1e-12)
+
+    # central finite differences
+    for name in PARAM_NAMES:
+        h = 1e-5*PARAMS[name]
+        up = get_log_likelihood_at({**PARAMS, name: PARAMS[name] + h}, match_arrays, initial_state, score_from)
+        down = get_log_likelihood_at({**PARAMS, name: PARAMS[name] - h}, match_arrays, initial_state, score_from)
+        assert gradient[name] == pytest.approx((up - down) / (2*h), rel=1e-4, abs=1e-6), name
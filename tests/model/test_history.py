@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo
+from src.model.history import HistoryRecorder, save_history, load_history, get_trajectory
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+@pytest.mark.parametrize("kwargs", [dict(engine='pandas'), dict(engine='numpy'), dict(renumber=True)])
+def test_elo_history(games, elo_kwargs, initial_state, kwargs):
+    recorder = HistoryRecorder(n_players=45)
+    player_abs, games_played, player_trend, _, _ = elo(
+        PARAMS, games, **elo_kwargs, **initial_state(45), **kwargs, history=recorder)
+    history = recorder.get_history()
+
+    # players 40+ never play
+    assert history.offsets[-1] == len(history.dates) and (history.offsets[41:] == history.offsets[40]).all()
+    for player in (0, 17, 39):
+        trajectory = get_trajectory(history, player, SURFACES)
+        played = games[(games['WID'] == player) | (games['LID'] == player)]['inferred_date'].unique()
+
+        np.testing.assert_array_equal(trajectory.index, played)
+        np.testing.assert_array_equal(trajectory.iloc[-1][[*SURFACES, 'Base']], player_abs[player])
+        assert trajectory['trend'].iloc[-1] == player_trend[player]
+        np.testing.assert_array_equal(trajectory.iloc[-1][[f'games_{s}' for s in [*SURFACES, 'Base']]],
+                                      games_played[player])
+
+    # an entry is the state at the end of that date
+    date = played[len(played)//2]
+    before = games[games['inferred_date'] <= date]
+    expected_abs, *_ = elo(PARAMS, before, **elo_kwargs, **initial_state(45))
+    np.testing.assert_array_equal(trajectory.loc[date, [*SURFACES, 'Base']], expected_abs[39])
+
+
+@pytest.mark.parametrize("dtype, tol", [(np.float16, .5), (np.int16, 1/16)])
+def test_elo_history_quantized(games, elo_kwargs, initial_state, tmp_path, dtype, tol):
+    exact, quantized = HistoryRecorder(n_players=40), HistoryRecorder(n_players=40, dtype=dtype)
+    elo(PARAMS, games, **elo_kwargs, **initial_state(40), history=exact)
+    elo(PARAMS, games, **elo_kwargs, **initial_state(40), history=quantized)
+
+    save_history(quantized.get_history(), str(tmp_path))
+    loaded = load_history(str(tmp_path))
+    assert loaded.player_abs.dtype == dtype and loaded.games_played.dtype == np.int16
+
+    for player in range(40):
+        e, q = get_trajectory(exact.get_history(), player, SURFACES), get_trajectory(loaded, player, SURFACES)
+        assert np.abs(e[[*SURFACES, 'Base']].values - q[[*SURFACES, 'Base']].values).max() <= tol
+        assert np.abs(e['trend'] - q['trend']).max() < 1e-3
+        np.testing.assert_array_equal(e.filter(like='games_'), q.filter(like='games_'))
+
+    with pytest.raises(ValueError):
+        HistoryRecorder(n_players=40, dtype=np.int8)
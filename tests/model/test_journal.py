@@ -0,0 +1,136 @@
+import os
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import get_match_arrays
+from src.model import fitting
+from src.model.fitting import fit, get_candidates
+from src.model.journal import (
+    get_data_fingerprint, get_candidate_key, add_sweep, claim_candidate, record_result, get_results, connect)
+
+METRICS = {'log_likelihood': -1., 'brier': .2, 'accuracy': .6, 'seconds': 1.}
+
+
+def test_get_data_fingerprint(games, elo_kwargs):
+    match_arrays = get_match_arrays(games, **elo_kwargs)
+    fingerprint = get_data_fingerprint(match_arrays, 40)
+
+    assert fingerprint == get_data_fingerprint(get_match_arrays(games, **elo_kwargs), 40)
+    assert fingerprint != get_data_fingerprint(match_arrays, 40, score_from=10)
+    games.loc[0, 'WGames'] += 1
+    assert fingerprint != get_data_fingerprint(get_match_arrays(games, **elo_kwargs), 40)
+
+
+def test_get_candidate_key():
+    assert get_candidate_key({'a': 1, 'b': 2.}) == get_candidate_key({'b': 2, 'a': 1.})
+
+
+def test_journal_queue(tmp_path):
+    path = str(tmp_path / 'journal.db')
+    candidates = get_candidates(3)
+
+    assert add_sweep(path, 'abc', 'folder', 10, 4, None, candidates) == 3
+    # same candidates aren't queued twice
+    assert add_sweep(path, 'abc', 'folder', 10, 4, None, candidates + [PARAMS]) == 1
+
+    claimed = [claim_candidate(path, 'abc', 'worker') for _ in range(4)]
+    assert len({c[0] for c in claimed}) == 4
+    assert claim_candidate(path, 'abc', 'worker') is None
+
+    record_result(path, claimed[0][0], 'worker', METRICS)
+    results = get_results(path, 'abc')
+    assert len(results) == 1
+    assert results.loc[claimed[0][0], 'worker'] == 'worker'
+    assert results.loc[claimed[0][0], 'K'] == pytest.approx(claimed[0][1]['K'])
+
+    # abandoned claims are taken again
+    assert claim_candidate(path, 'abc', 'other', stale_after=-1)[0] == claimed[1][0]
+
+
+def test_fit_journal_resumes(games, elo_kwargs, tmp_path):
+    path = str(tmp_path / 'journal.db')
+    candidates = get_candidates(4, seed=2)
+
+    first = fit(games, **elo_kwargs, n_players=40, workers=1, candidates=candidates[:2], journal=path)
+    assert len(first) == 2
+
+    # label the first sweeps results so reuse can be seen
+    with connect(path) as connection:
+        connection.execute("UPDATE candidates SET worker = 'first' WHERE status = 'done'")
+
+    second = fit(games, **elo_kwargs, n_players=40, workers=2, candidates=candidates, journal=path)
+
+    assert len(second) == 4
+    # earlier results kept rather than evaluated again
+    assert (second['worker'] == 'first').sum() == 2
+    np.testing.assert_array_almost_equal(
+        second.sort_index()['log_likelihood'].values[:2], first.sort_index()['log_likelihood'].values)
+
+    # only this sweep's candidates, not every one scored on the data
+    assert len(fit(games, **elo_kwargs, n_players=40, workers=1, candidates=candidates[1:3], journal=path)) == 2
+
+
+def test_fit_journal_partial_arrays(games, elo_kwargs, tmp_path, monkeypatch):
+    path = str(tmp_path / 'journal.db')
+    candidates = get_candidates(1)
+
+    def crash(match_arrays, folder):
+        np.save(os.path.join(folder, 'dates.npy'), match_arrays.dates)
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch:
+        patch.setattr(fitting, 'save_match_arrays', crash)
+        with pytest.raises(KeyboardInterrupt):
+            fit(games, **elo_kwargs, n_players=40, workers=1, candidates=candidates, journal=path)
+
+    # the rerun doesn't pick up the half saved arrays
+    assert not list(tmp_path.glob('arrays_*'))
+    assert len(fit(games, **elo_kwargs, n_players=40, workers=1, candidates=candidates, journal=path)) == 1
+
+
+def test_fit_journal_resumes_after_kill(games, elo_kwargs, tmp_path, monkeypatch, caplog):
+    path = str(tmp_path / 'journal.db')
+    candidates = get_candidates(3, seed=4)
+    evaluate = fitting.evaluate_candidate
+    calls = []
+
+    def killed_on_second(params):
+        calls.append(params)
+        if len(calls) == 2:
+            # the worker process dies mid evaluation, its claim is left running
+            os._exit(1)
+        return evaluate(params)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(fitting, 'evaluate_candidate', killed_on_second)
+        with pytest.raises(BrokenProcessPool):
+            fit(games, **elo_kwargs, n_players=40, workers=1, candidates=candidates, journal=path)
+
+    with connect(path) as connection:
+        statuses = [row[0] for row in connection.execute('SELECT status FROM candidates ORDER BY id')]
+    assert statuses == ['done', 'running', 'pending']
+
+    # straight away, not stale_after later
+    with caplog.at_level('WARNING'):
+        results = fit(games, **elo_kwargs, n_players=40, workers=1, candidates=candidates, journal=path)
+    assert len(results) == 3
+    assert 'claimed by dead workers' in caplog.text
+
+
+def test_fit_journal_warns_when_incomplete(games, elo_kwargs, tmp_path, caplog):
+    path = str(tmp_path / 'journal.db')
+    candidates = get_candidates(2, seed=5)
+    fit(games, **elo_kwargs, n_players=40, workers=1, candidates=candidates[:1], journal=path)
+
+    # a live worker elsewhere holds the other candidate
+    match_arrays = get_match_arrays(games, **elo_kwargs)
+    fingerprint = get_data_fingerprint(match_arrays, 40)
+    add_sweep(path, fingerprint, str(tmp_path), 40, 4, None, candidates)
+    claim_candidate(path, fingerprint, 'elsewhere:1')
+
+    with caplog.at_level('WARNING'):
+        results = fit(games, **elo_kwargs, n_players=40, workers=1, candidates=candidates, journal=path)
+    assert len(results) == 1
+    assert 'only 1 of 2 candidates scored' in caplog.text
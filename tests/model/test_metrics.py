@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo, get_surface_codes, get_day_ordinals
+from src.model.metrics import MetricAccumulator
+
+
+def test_metric_accumulator():
+    metrics = MetricAccumulator(surfaces=['Clay', 'Grass'])
+    metrics.update(np.array([.8, .4]), np.array([True, False]), np.array([0, 1]))
+    metrics.update(np.array([.6]), np.array([True]), np.array([2]))
+
+    table = metrics.get_metrics()
+
+    assert list(table.index) == ['Overall', 'WTA', 'ITF', 'Clay', 'Grass']
+    np.testing.assert_array_equal(table['total'], [3, 1, 2, 1, 1])
+    np.testing.assert_allclose(table.loc['Overall', 'log_likelihood'], np.log([.8, .4, .6]).sum())
+    np.testing.assert_allclose(table.loc['ITF', 'brier'], (.2**2 + .4**2) / 2)
+    np.testing.assert_allclose(table['accuracy'], [2/3, 0, 1, 1, 0])
+
+
+def test_metric_accumulator_score_from():
+    metrics = MetricAccumulator(score_from=10)
+    metrics.update(np.array([.8]), np.array([False]), date=9)
+    metrics.update(np.array([.3]), np.array([False]), date=10)
+
+    assert metrics.get_metrics().loc['Overall', 'total'] == 1
+    np.testing.assert_allclose(metrics.get_metrics().loc['Overall', 'accuracy'], 0)
+
+
+def test_metric_accumulator_no_surface_split():
+    metrics = MetricAccumulator()
+    metrics.update(np.array([.8]), np.array([False]))
+    assert list(metrics.get_metrics().index) == ['Overall', 'WTA', 'ITF']
+    assert np.isnan(metrics.get_metrics().loc['ITF', 'brier'])
+
+
+@pytest.mark.parametrize("engine", ['pandas', 'numpy'])
+def test_elo_metrics(games, elo_kwargs, initial_state, engine):
+    *_, probs = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine)
+
+    score_from = int(get_day_ordinals(games['inferred_date'])[200])
+    metrics = MetricAccumulator(surfaces=elo_kwargs['surface_cols'], score_from=score_from)
+    *state, no_probs = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine, metrics=metrics,
+                           keep_probs=False)
+    table = metrics.get_metrics()
+
+    assert no_probs is None
+    scored = get_day_ordinals(games['inferred_date']) >= score_from
+    np.testing.assert_allclose(table.loc['Overall', 'log_likelihood'], np.log(probs[scored]).sum())
+    np.testing.assert_allclose(table.loc['Overall', 'brier'], np.mean((1 - probs[scored])**2))
+    np.testing.assert_allclose(table.loc['Overall', 'accuracy'], np.mean(probs[scored] > .5))
+
+    itf = (games['source'] == 'I').values
+    np.testing.assert_allclose(table.loc['ITF', 'log_likelihood'], np.log(probs[scored & itf]).sum())
+    codes = get_surface_codes(games[elo_kwargs['surface_cols']].values)
+    np.testing.assert_allclose(table.loc['Grass', 'brier'], np.mean((1 - probs[scored & (codes == 1)])**2))
@@ -2,11 +2,16 @@ import pytest
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from scipy.stats import binom
 
 from src.constants import PARAMS
+from src.data_ingestion.synthetic import get_synthetic_games
 from src.model.model import (
     get_probs, get_k_factor, get_surface_weights, get_current_ability, get_performance_score, get_log_likelihood,
-    get_ability_change, get_updated_trend, elo_single_round)
+    get_ability_change, get_updated_trend, elo_single_round, elo, get_date_bounds, get_match_arrays, get_round_waves,
+    get_collision_count, elo_round_arrays, elo_arrays, get_surface_codes, PrimitiveTable, get_match_slice,
+    get_compact_state, iter_elo, get_day_ordinals, RoundWorkspace, iter_elo_arrays, get_activity_order,
+    get_renumbered_state, get_round_bounds)
 
 
 @pytest.mark.parametrize("one_hot_array, surface_weight, expected",
@@ -101,3 +106,383 @@ def test_get_ability_change(k_factor, performance, playing_surface, expected):
                          [(0, 1, .2, .2), (.3, -.2, .5, 0.05)])
 def test_get_updated_trend(c_trend, performance, rate, expected):
     assert get_updated_trend(c_trend, performance, rate) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("dates, expected", [
+    (np.array([3, 3, 5, 7, 7, 7]), [0, 2, 3, 6]),
+    (np.array([], dtype=np.int32), [0]),
+])
+def test_get_date_bounds(dates, expected):
+    np.testing.assert_array_equal(get_date_bounds(dates), expected)
+
+
+@pytest.mark.parametrize("granularity, expected", [
+    ('day', [0, 1, 3, 4, 6]),
+    ('match', [0, 1, 3, 4, 6]),
+    # 2010-01-04 is a Monday, days 1 and 6 of the week together, the next Monday starts a new week
+    ('week', [0, 4, 6]),
+])
+def test_get_round_bounds(granularity, expected):
+    dates = get_day_ordinals(pd.to_datetime(
+        ['2010-01-04', '2010-01-05', '2010-01-05', '2010-01-10', '2010-01-11', '2010-01-11']))
+    np.testing.assert_array_equal(get_round_bounds(dates, granularity), expected)
+
+    with pytest.raises(ValueError):
+        get_round_bounds(dates, 'month')
+
+
+@pytest.mark.parametrize("split", [0, 96, 480])
+def test_get_match_slice(games, elo_kwargs, initial_state, split):
+    m = get_match_arrays(games, **elo_kwargs)
+    *expected, expected_probs = elo_arrays(PARAMS, m, *initial_state(40).values())
+
+    # replaying two slices back to back resumes from the same state
+    state = initial_state(40)
+    *_, first = elo_arrays(PARAMS, get_match_slice(m, 0, split), *state.values())
+    *actual, second = elo_arrays(PARAMS, get_match_slice(m, split, len(games)), *state.values())
+
+    np.testing.assert_allclose(np.concatenate((first, second)), expected_probs[m.order])
+    for a, e in zip(actual, expected):
+        np.testing.assert_allclose(a, e)
+
+
+def test_get_match_arrays(games, elo_kwargs):
+    shuffled = games.sample(frac=1, random_state=1)
+    m = get_match_arrays(shuffled, **elo_kwargs)
+
+    assert m.dates.dtype == np.int32
+    assert m.itf.dtype == bool
+    assert (np.diff(m.dates) >= 0).all()
+    np.testing.assert_array_equal(m.w_id, shuffled['WID'].values[m.order])
+    assert m.w_id.flags['C_CONTIGUOUS'] and m.surfaces.flags['C_CONTIGUOUS']
+
+
+def test_elo_engines_match(games, elo_kwargs, initial_state):
+    state = initial_state(40)
+
+    pandas_out = elo(PARAMS, games, **elo_kwargs, **state, engine='pandas')
+    numpy_out = elo(PARAMS, games, **elo_kwargs, **state, engine='numpy')
+
+    for p_arr, n_arr in zip(pandas_out, numpy_out):
+        np.testing.assert_array_equal(p_arr, n_arr)
+    # inputs not altered
+    np.testing.assert_array_equal(state['player_abs'], 1500.)
+
+
+def test_get_compact_state(initial_state):
+    state = initial_state(5)
+    state['player_trend'][:] = np.arange(5)
+    state['games_played'][2] = 7
+
+    compact = get_compact_state(*state.values(), dtype=np.float64)
+
+    assert compact[0].base is compact[1].base is compact[2].base is compact[3].base
+    assert compact[0].base.shape == (5, 13)
+    for c, s in zip(compact, state.values()):
+        np.testing.assert_array_equal(c, s)
+    # updates through a view land in the record of that player only
+    compact[0][[1, 3]] += 10.
+    np.testing.assert_array_equal(compact[0].base[:, :4].sum(axis=1), [6000., 6040., 6000., 6040., 6000.])
+
+
+@pytest.mark.parametrize("engine", ['pandas', 'numpy'])
+def test_elo_compact_float64(games, elo_kwargs, initial_state, engine):
+    expected = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine)
+    actual = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine, state_dtype=np.float64)
+
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
+
+
+def test_elo_compact_float32_drift(elo_kwargs, initial_state):
+    # 2 years of daily rounds, each player plays ~70 matches
+    games = get_synthetic_games(n_players=200, n_dates=730, games_per_date=10, latent_skill=False)
+    *expected, expected_probs = elo(PARAMS, games, **elo_kwargs, **initial_state(200))
+    *actual, probs = elo(PARAMS, games, **elo_kwargs, **initial_state(200), state_dtype=np.float32)
+
+    assert actual[0].dtype == np.float32
+    # float32 keeps ~7 significant figures, ratings around 1500 drift by well under a rating point
+    assert np.abs(actual[0] - expected[0]).max() < 0.01
+    assert np.abs(actual[3] - expected[3]).max() < 0.01
+    assert np.abs(probs - expected_probs).max() < 1e-5
+    np.testing.assert_array_equal(actual[1], expected[1])
+
+
+@pytest.mark.parametrize("engine", ['pandas', 'numpy'])
+def test_elo_inplace_out(games, elo_kwargs, initial_state, engine):
+    *expected, expected_probs = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine)
+
+    # positional slices (index not starting at 0) written into slices of one buffer
+    state, probs = initial_state(40), np.full(len(games) + 10, -1.)
+    cutoff = 200
+    for rows, out in ((slice(0, cutoff), probs[:cutoff]), (slice(cutoff, None), probs[cutoff:-10])):
+        *actual, p = elo(PARAMS, games.iloc[rows], **elo_kwargs, **state, engine=engine, inplace=True, out=out)
+        assert p is out
+
+    np.testing.assert_array_equal(probs[:-10], expected_probs)
+    np.testing.assert_array_equal(probs[-10:], -1.)
+    for a, s, e in zip(actual, state.values(), expected):
+        assert a is s
+        np.testing.assert_array_equal(a, e)
+
+
+def test_elo_workspace(games, elo_kwargs, initial_state):
+    expected = elo(PARAMS, games, **elo_kwargs, **initial_state(40))
+    actual = elo(PARAMS, games, **elo_kwargs, **initial_state(40), workspace=True)
+
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
+
+
+def test_elo_workspace_invalid(games, elo_kwargs, initial_state):
+    with pytest.raises(ValueError):
+        elo(PARAMS, games, **elo_kwargs, **initial_state(40), workspace=True, state_dtype=np.float32)
+    # buffers would clip unknown players onto the last one
+    with pytest.raises(IndexError):
+        elo(PARAMS, games, **elo_kwargs, **initial_state(39), workspace=True)
+    with pytest.raises(IndexError):
+        elo(PARAMS, games.assign(LID=games['LID'] - 1), **elo_kwargs, **initial_state(40), workspace=True)
+
+
+def test_elo_sequential(games, elo_kwargs, initial_state):
+    # a date per match makes the grouped engine apply matches one at a time too
+    one_per_date = games.assign(inferred_date=pd.Timestamp('2010-01-04') + pd.to_timedelta(np.arange(len(games)), 'D'))
+    expected = elo(PARAMS, one_per_date, **elo_kwargs, **initial_state(40))
+    actual = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine='sequential')
+
+    # compiled pow may differ from numpy's in the last bit
+    for a, e in zip(actual, expected):
+        np.testing.assert_allclose(a, e, rtol=1e-12)
+    # 8 games between 40 players a date has repeat players, grouped sees the pre round state
+    assert not np.allclose(elo(PARAMS, games, **elo_kwargs, **initial_state(40))[-1], actual[-1], rtol=1e-12)
+
+
+@pytest.mark.parametrize("max_games, max_played", [(80, 2048), (20, 5)])
+def test_elo_arrays_sequential(elo_kwargs, initial_state, max_games, max_played):
+    # 2 games a date between 40 players mostly doesn't repeat a player, those dates match the grouped engine
+    games = get_synthetic_games(n_players=40, n_dates=60, games_per_date=2, latent_skill=False)
+    match_arrays = get_match_arrays(games, **elo_kwargs)
+    tables = PrimitiveTable(PARAMS, max_games=max_games, max_played=max_played)
+
+    grouped = elo_arrays(PARAMS, match_arrays, *initial_state(40).values(), tables=tables)
+    in_order = elo_arrays(PARAMS, match_arrays, *initial_state(40).values(), tables=tables, sequential=True)
+
+    # identical up to the first date a player repeats on
+    m = match_arrays
+    bounds = get_date_bounds(m.dates)
+    repeats = [len(np.unique(np.concatenate((m.w_id[start:end], m.l_id[start:end])))) < 2*(end - start)
+               for start, end in zip(bounds[:-1], bounds[1:])]
+    before = m.order[:bounds[repeats.index(True)]]
+    np.testing.assert_allclose(grouped[-1][before], in_order[-1][before], rtol=1e-12)
+    assert not np.allclose(grouped[-1], in_order[-1], rtol=1e-12)
+
+    with pytest.raises(ValueError):
+        next(iter_elo_arrays(PARAMS, match_arrays, *initial_state(40).values(), tables=tables,
+                             workspace=RoundWorkspace.for_matches(match_arrays), sequential=True))
+
+
+@pytest.mark.parametrize("workspace", [False, True])
+def test_elo_granularity_week(games, elo_kwargs, initial_state, workspace):
+    # every match moved to the Monday of its week is the same as updating by week
+    mondays = games.assign(inferred_date=games['inferred_date'].dt.to_period('W').dt.start_time)
+    expected = elo(PARAMS, mondays, **elo_kwargs, **initial_state(40))
+    actual = elo(PARAMS, games, **elo_kwargs, **initial_state(40), granularity='week', workspace=workspace)
+
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
+    assert len(list(iter_elo(PARAMS, games, **elo_kwargs, **initial_state(40), granularity='week'))) == 9
+
+
+def test_elo_granularity_match(games, elo_kwargs, initial_state):
+    expected = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine='sequential')
+    actual = elo(PARAMS, games, **elo_kwargs, **initial_state(40), granularity='match')
+
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
+
+    with pytest.raises(ValueError):
+        elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine='pandas', granularity='week')
+
+
+def test_get_activity_order(initial_state):
+    # player 4 plays first, 0 on the later date (listed first), 2 never plays
+    order = get_activity_order(np.array([5, 3, 3]), np.array([0, 4, 1]), np.array([3, 1, 4]), n_players=5)
+    np.testing.assert_array_equal(order, [4, 1, 0, 3, 2])
+
+    state = initial_state(5)
+    state['player_trend'][:] = np.arange(5)
+    renumbered = get_renumbered_state(order, *state.values())
+    np.testing.assert_array_equal(renumbered[2], [4, 1, 0, 3, 2])
+    for r, s in zip(get_renumbered_state(np.argsort(order), *renumbered), state.values()):
+        np.testing.assert_array_equal(r, s)
+
+
+@pytest.mark.parametrize("engine", ['pandas', 'numpy', 'sequential'])
+@pytest.mark.parametrize("inplace", [False, True])
+def test_elo_renumber(games, elo_kwargs, initial_state, engine, inplace):
+    # players never seen keep their rows
+    state = initial_state(45)
+    state['player_trend'][40:] = .5
+    expected = elo(PARAMS, games, **elo_kwargs, **initial_state(45), engine=engine)
+    expected[2][40:] = .5
+
+    actual = elo(PARAMS, games, **elo_kwargs, **state, engine=engine, inplace=inplace, renumber=True)
+
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
+    assert all((a is s) == inplace for a, s in zip(actual, state.values()))
+    # ids in data untouched
+    assert games['WID'].max() < 40
+
+
+@pytest.mark.parametrize("kwargs", [dict(inplace=True, state_dtype=np.float32), dict(out=np.empty(3))])
+def test_elo_inplace_out_invalid(games, elo_kwargs, initial_state, kwargs):
+    with pytest.raises(ValueError):
+        elo(PARAMS, games, **elo_kwargs, **initial_state(40), **kwargs)
+
+
+@pytest.mark.parametrize("engine", ['pandas', 'numpy'])
+def test_iter_elo(games, elo_kwargs, initial_state, engine):
+    *_, expected_probs = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine)
+
+    rounds = list(iter_elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine))
+
+    assert len(rounds) == games['inferred_date'].nunique()
+    assert [r.date for r in rounds] == sorted(get_day_ordinals(games['inferred_date'].unique()))
+    probs = np.empty(len(games))
+    for r in rounds:
+        probs[r.index] = r.probs
+        assert r.state is None
+    np.testing.assert_array_equal(probs, expected_probs)
+
+
+@pytest.mark.parametrize("engine", ['pandas', 'numpy'])
+def test_iter_elo_stop_early(games, elo_kwargs, initial_state, engine):
+    state = initial_state(40)
+    rounds = iter_elo(PARAMS, games, **elo_kwargs, **state, engine=engine, yield_state=True)
+    for i, r in enumerate(rounds):
+        if i == 9:
+            break
+    rounds.close()
+
+    # live arrays, not copies
+    assert r.state[0] is state['player_abs']
+    *expected, _ = elo(PARAMS, games.iloc[:80], **elo_kwargs, **initial_state(40), engine=engine)
+    for a, e in zip(state.values(), expected):
+        np.testing.assert_array_equal(a, e)
+
+
+@pytest.mark.parametrize("w_id, l_id, expected",
+                         [(np.array([0, 3]), np.array([1, 4]), np.array([0, 0])),
+                          (np.array([0, 0, 3, 1]), np.array([1, 2, 4, 2]), np.array([0, 1, 0, 2])),
+                          (np.array([5, 6, 5]), np.array([6, 5, 6]), np.array([0, 1, 2]))])
+def test_get_round_waves(w_id, l_id, expected):
+    np.testing.assert_array_equal(get_round_waves(w_id, l_id), expected)
+
+
+def test_get_collision_count():
+    dates = np.array([1, 1, 1, 2, 2])
+    w_id = np.array([0, 0, 2, 0, 3])
+    l_id = np.array([1, 2, 3, 1, 4])
+    # date 1: player 0 twice, player 2 twice -> 2 collisions, date 2 none
+    assert get_collision_count(dates, w_id, l_id) == 2
+    # both dates in one round, 10 appearances of 5 players
+    assert get_collision_count(np.zeros_like(dates), w_id, l_id) == 5
+
+
+@pytest.mark.parametrize("engine, granularity, expected", [
+    ('numpy', 'day', 'within a day'), ('numpy', 'week', 'within a week'), ('sequential', 'day', None)])
+def test_elo_collisions_logged(games, elo_kwargs, initial_state, caplog, engine, granularity, expected):
+    with caplog.at_level('INFO'):
+        elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine, granularity=granularity)
+    assert 'ELO COLLISIONS' not in caplog.text
+
+    with caplog.at_level('DEBUG'):
+        elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine, granularity=granularity)
+    if expected is None:
+        assert 'ELO COLLISIONS' not in caplog.text
+    else:
+        assert expected in caplog.text
+
+
+def test_elo_round_arrays_repeated_player(initial_state):
+    # player 0 plays (and wins) twice on the same date
+    state = initial_state(3)
+    w_games, l_games = np.array([12., 13.]), np.array([3., 8.])
+    sets = np.array([2., 2.]), np.array([0., 1.])
+
+    player_abs, games_played, player_trend, at_abilities, probs = elo_round_arrays(
+        PARAMS, w_id=np.array([0, 0]), w_games=w_games, w_sets=sets[0], l_id=np.array([1, 2]), l_games=l_games,
+        l_sets=sets[1], surfaces=np.array([[1, 0, 0], [1, 0, 0]]), itf=np.array([False, False]), **state)
+
+    # both matches counted
+    np.testing.assert_array_equal(games_played[0], [2, 0, 0, 2])
+    np.testing.assert_array_equal(games_played[1:], [[1, 0, 0, 1], [1, 0, 0, 1]])
+
+    # trend follows both updates sequentially
+    w_perf, _ = get_performance_score(probs, w_games, l_games, *sets, PARAMS['p'], PARAMS['straight_sets_boost'])
+    rate = PARAMS['trend_rate']
+    assert player_trend[0] == pytest.approx(w_perf[0]*rate*(1 - rate) + w_perf[1]*rate)
+
+    # second match uses the k factor after the first match
+    k = [get_k_factor(games, PARAMS['K'], PARAMS['offset'], PARAMS['shape'], False, PARAMS['itf_deduction'])
+         for games in (0, 1)]
+    assert player_abs[0, 0] == pytest.approx(1500 + k[0]*w_perf[0] + k[1]*w_perf[1])
+    np.testing.assert_array_equal(at_abilities[0], np.maximum(player_abs[0], 1500))
+
+
+def test_get_surface_codes():
+    np.testing.assert_array_equal(get_surface_codes(np.array([[0, 1, 0], [1, 0, 0], [0, 0, 0]])), [1, 0, 3])
+
+
+def test_primitive_table():
+    table = PrimitiveTable(PARAMS, n_surfaces=3, max_games=30, max_played=10)
+
+    # second match falls outside the binomial table
+    g_won, g_lost = np.array([12., 19.]), np.array([3., 17.])
+    np.testing.assert_array_equal(table.get_binom_cdf(g_won, g_lost), binom.cdf(g_won, g_won + g_lost, PARAMS['p']))
+
+    # last row falls outside the k factor table
+    games_played = np.array([[0., 3., 0., 3.], [9., 0., 2., 11.], [40., 0., 0., 40.]])
+    itf_indicator = np.array([[True], [False], [True]])
+    np.testing.assert_array_equal(
+        table.get_k_factor(games_played, itf_indicator),
+        get_k_factor(games_played, PARAMS['K'], PARAMS['offset'], PARAMS['shape'], itf_indicator,
+                     PARAMS['itf_deduction']))
+
+    one_hot = np.array([[0, 0, 1], [1, 0, 0]])
+    s_weights, playing_surface = get_surface_weights(one_hot, PARAMS['surface_weight'])
+    np.testing.assert_array_equal(table.surface_weights[get_surface_codes(one_hot)], s_weights)
+    np.testing.assert_array_equal(table.playing_surface[get_surface_codes(one_hot)], playing_surface)
+
+
+def test_elo_arrays_tables(games, elo_kwargs, initial_state):
+    match_arrays = get_match_arrays(games, **elo_kwargs)
+
+    direct = elo_arrays(PARAMS, match_arrays, *initial_state(40).values())
+    tabled = elo_arrays(PARAMS, match_arrays, *initial_state(40).values(), tables=PrimitiveTable(PARAMS, max_played=5))
+
+    for d_arr, t_arr in zip(direct, tabled):
+        np.testing.assert_array_equal(d_arr, t_arr)
+
+
+@pytest.mark.parametrize("games_per_date, max_games, max_played", [
+    # 8 games between 40 players a date has repeat players, 2 mostly doesn't
+    (8, 80, 2048),
+    (2, 80, 2048),
+    # matches and players past the end of the tables
+    (2, 20, 5),
+])
+def test_elo_arrays_workspace(elo_kwargs, initial_state, games_per_date, max_games, max_played):
+    games = get_synthetic_games(n_players=40, n_dates=60, games_per_date=games_per_date, latent_skill=False)
+    match_arrays = get_match_arrays(games, **elo_kwargs)
+    tables = PrimitiveTable(PARAMS, max_games=max_games, max_played=max_played)
+    workspace = RoundWorkspace.for_matches(match_arrays)
+
+    direct = elo_arrays(PARAMS, match_arrays, *initial_state(40).values(), tables=tables)
+    in_workspace = elo_arrays(PARAMS, match_arrays, *initial_state(40).values(), tables=tables, workspace=workspace)
+
+    assert workspace.max_matches == games_per_date
+    for d_arr, w_arr in zip(direct, in_workspace):
+        np.testing.assert_array_equal(d_arr, w_arr)
+
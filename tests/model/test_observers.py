@@ -0,0 +1,64 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import elo
+from src.model.observers import EloObserver, RoundTimer, ProgressLogger
+
+
+class Recorder(EloObserver):
+    def __init__(self):
+        self.starts, self.ends, self.finished = [], [], []
+
+    def on_round_start(self, date, index, state):
+        self.starts.append((date, index.copy(), state[0].copy()))
+
+    def on_round_end(self, elo_round):
+        self.ends.append((elo_round.date, elo_round.index.copy(), elo_round.probs.copy(), elo_round.state[0].copy()))
+
+    def on_finish(self, state):
+        self.finished.append(state[0].copy())
+
+
+@pytest.mark.parametrize("engine", ['pandas', 'numpy', 'sequential'])
+def test_elo_observers(games, elo_kwargs, initial_state, engine):
+    expected = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine)
+    recorder = Recorder()
+    results = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine,
+                  observers=[recorder, RoundTimer()])
+
+    for result, expected_result in zip(results, expected):
+        np.testing.assert_array_equal(result, expected_result)
+
+    n_rounds = games['inferred_date'].nunique()
+    assert len(recorder.starts) == len(recorder.ends) == n_rounds and len(recorder.finished) == 1
+
+    # every match predicted exactly once, hooks see the same round
+    np.testing.assert_array_equal(np.sort(np.concatenate([index for _, index, *_ in recorder.ends])),
+                                  np.arange(len(games)))
+    probs = np.empty(len(games))
+    for (start_date, start_index, _), (date, index, p, _) in zip(recorder.starts, recorder.ends):
+        assert start_date == date
+        np.testing.assert_array_equal(start_index, index)
+        probs[index] = p
+    np.testing.assert_array_equal(probs, expected[-1])
+
+    # state before a round is the state after the previous one
+    for (*_, before), (*_, after) in zip(recorder.starts[1:], recorder.ends[:-1]):
+        np.testing.assert_array_equal(before, after)
+    np.testing.assert_array_equal(recorder.ends[-1][-1], expected[0])
+    np.testing.assert_array_equal(recorder.finished[0], expected[0])
+
+
+def test_round_timer_progress_logger(games, elo_kwargs, initial_state, caplog):
+    timer = RoundTimer()
+    with caplog.at_level('INFO'):
+        elo(PARAMS, games, **elo_kwargs, **initial_state(40), observers=[timer, ProgressLogger(every=20)])
+
+    times = timer.to_frame()
+    assert len(times) == games['inferred_date'].nunique() and times['matches'].sum() == len(games)
+    assert (times['seconds'] >= 0).all() and times['date'].is_monotonic_increasing
+
+    progress = [r.message for r in caplog.records if r.message.startswith('ELO PROGRESS')]
+    assert len(progress) == games['inferred_date'].nunique()//20
+    assert any(r.message.startswith(f'ELO DONE: {len(times)} rounds') for r in caplog.records)
@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import get_match_arrays, elo_arrays
+from src.model.checkpoint import elo_checkpoints, load_checkpoints
+from src.model.parallel import get_era_bounds, elo_parallel
+
+
+@pytest.mark.parametrize("dates, n_eras, expected", [
+    # 4 and 11 are Mondays
+    (np.array([4, 4, 5, 6, 11, 11, 12, 13]), 2, [0, 4, 8]),
+    (np.array([4, 4, 5, 6, 11, 11, 12, 13]), 4, [0, 4, 8]),
+    (np.array([4, 4, 5, 6, 11, 11, 12, 13]), 1, [0, 8]),
+    (np.array([], dtype=np.int32), 3, [0]),
+])
+def test_get_era_bounds(dates, n_eras, expected):
+    np.testing.assert_array_equal(get_era_bounds(dates, n_eras), expected)
+
+
+@pytest.mark.parametrize("initial", ['coarse', 'cold'])
+def test_elo_parallel(games, elo_kwargs, initial_state, initial):
+    m = get_match_arrays(games, **elo_kwargs)
+    expected = elo_arrays(PARAMS, m, *initial_state(40).values())
+
+    *actual, passes = elo_parallel(PARAMS, m, *initial_state(40).values(), n_eras=4, workers=2, initial=initial,
+                                   tol=0)
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
+    # the last pass only confirms the final era, no more than one pass per era
+    assert passes['max_change'].iloc[-1] == 0 and len(passes) - 1 <= 4
+    assert passes['eras_run'].iloc[1] == 4
+
+
+def test_elo_parallel_checkpoints(games, elo_kwargs, initial_state, tmp_path):
+    m = get_match_arrays(games, **elo_kwargs)
+    expected = elo_checkpoints(PARAMS, m, *initial_state(40).values(), folder=tmp_path, every=3)
+
+    # exact starts from the previous run, the first pass confirms them
+    *actual, passes = elo_parallel(PARAMS, m, *initial_state(40).values(), n_eras=3, workers=2,
+                                   initial=load_checkpoints(tmp_path), tol=0)
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
+    assert len(passes) - 1 == 1
+
+
+def test_elo_parallel_max_passes(games, elo_kwargs, initial_state):
+    m = get_match_arrays(games, **elo_kwargs)
+    *expected, _ = elo_arrays(PARAMS, m, *initial_state(40).values())
+
+    *state, _, passes = elo_parallel(PARAMS, m, *initial_state(40).values(), n_eras=4, workers=2, initial='cold',
+                                     max_passes=1)
+    assert len(passes) - 1 == 1
+    # games played are exact however the starts are guessed
+    np.testing.assert_array_equal(state[1], expected[1])
+    assert np.abs(state[0] - expected[0]).max() > 1
+
+    with pytest.raises(ValueError):
+        elo_parallel(PARAMS, m, *initial_state(40).values(), workers=2, initial='warm')
@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import get_match_arrays, elo_arrays
+from src.model.partition import (
+    get_player_communities, get_player_partitions, elo_partitioned, get_partition_report)
+
+
+@pytest.fixture
+def regional_games(games):
+    # players 0-19 and 20-39 only meet each other, apart from every 10th date
+    w_id, l_id = games['WID'].values, games['LID'].values
+    regional = w_id // 20*20 + (w_id % 20 + 1 + l_id % 19) % 20
+    cross = games['inferred_date'].dt.day.values % 10 == 0
+    return games.assign(LID=np.where(cross, l_id, regional))
+
+
+def test_get_player_communities(regional_games):
+    dates = regional_games['inferred_date'].dt.day.values % 10 != 0
+    w_id, l_id = regional_games['WID'].values[dates], regional_games['LID'].values[dates]
+
+    communities = get_player_communities(w_id, l_id, n_players=42)
+    assert len(np.unique(communities[:20])) == 1 and len(np.unique(communities[20:40])) == 1
+    assert len(np.unique(communities)) == 4
+
+    partitions = get_player_partitions(w_id, l_id, n_players=42, n_partitions=2)
+    assert partitions[0] != partitions[20] and set(partitions) == {0, 1}
+
+
+@pytest.mark.parametrize("partitions", [None, np.arange(40) // 20, np.arange(40) % 3, np.zeros(40, dtype=int)])
+def test_elo_partitioned(regional_games, elo_kwargs, initial_state, partitions):
+    m = get_match_arrays(regional_games, **elo_kwargs)
+    expected = elo_arrays(PARAMS, m, *initial_state(40).values())
+
+    *actual, steps = elo_partitioned(PARAMS, m, *initial_state(40).values(), n_partitions=2, workers=2,
+                                     partitions=partitions)
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
+    assert steps['matches'].sum() == len(regional_games)
+
+    report = get_partition_report(steps)
+    assert report['matches'].sum() == len(regional_games)
+    if partitions is not None and (partitions == 0).all():
+        assert (steps['kind'] == 'parallel').all() and (report['parallel_share'] == 1).all()
+    elif partitions is None or (partitions == np.arange(40) // 20).all():
+        # barriers only on the dates with cross regional matches
+        assert (steps['kind'] == 'sync').sum() == (regional_games['inferred_date'].dt.day % 10 == 0).sum() // 8
+        assert (steps.loc[steps['kind'] == 'parallel', 'tasks'] == 2).all()
+
+
+def test_elo_partitioned_sequential(regional_games, elo_kwargs, initial_state):
+    m = get_match_arrays(regional_games, **elo_kwargs)
+    expected = elo_arrays(PARAMS, m, *initial_state(40).values(), sequential=True)
+
+    *actual, _ = elo_partitioned(PARAMS, m, *initial_state(40).values(), workers=2, partitions=np.arange(40) // 20,
+                                 sequential=True)
+    for a, e in zip(actual, expected):
+        np.testing.assert_array_equal(a, e)
@@ -0,0 +1,35 @@
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import PrimitiveTable, get_match_arrays
+from src.model import sequential
+
+
+def run_loop(loop, match_arrays, state, tables):
+    """Runs a match loop over every match from a copy of state, returns the end state, probs and abilities"""
+    m = match_arrays
+    state = [values.copy() for values in state.values()]
+    probs, abilities = np.empty((len(m.w_id),)), np.empty((2, len(m.w_id)))
+    loop(m.w_id, m.l_id, (m.w_sets - m.l_sets) == 2, tables.get_binom_cdf(m.w_games, m.l_games), m.surface_codes,
+         m.itf, tables.surface_weights, tables.playing_surface, tables.k_factor, PARAMS['K'], PARAMS['offset'],
+         PARAMS['shape'], PARAMS['itf_deduction'], PARAMS['straight_sets_boost'], PARAMS['trend_rate'],
+         PARAMS['trend_weight'], PARAMS['all_time_weight'], *state, probs, abilities)
+    return (*state, probs, abilities)
+
+
+@pytest.mark.parametrize("max_played", [2048, 5])
+def test_elo_match_kernel_compiled(games, elo_kwargs, initial_state, max_played):
+    pytest.importorskip('numba')
+    assert sequential.NUMBA_AVAILABLE and sequential.elo_match_kernel is not sequential.elo_match_loop
+
+    match_arrays = get_match_arrays(games, **elo_kwargs)
+    # small k factor table covers games played computed directly too
+    tables = PrimitiveTable(PARAMS, max_played=max_played)
+
+    compiled = run_loop(sequential.elo_match_kernel, match_arrays, initial_state(40), tables)
+    fallback = run_loop(sequential.elo_match_loop, match_arrays, initial_state(40), tables)
+
+    # compiled pow may differ from numpy's in the last bit
+    for c, f in zip(compiled, fallback):
+        np.testing.assert_allclose(c, f, rtol=1e-12)
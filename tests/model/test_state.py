@@ -0,0 +1,86 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from src.model.model import elo
+from src.model.state import EloState
+from src.constants import PARAMS
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+def with_names(games: pd.DataFrame) -> pd.DataFrame:
+    return games.assign(winner_name='P' + games['WID'].astype(str), loser_name='P' + games['LID'].astype(str))
+
+
+def get_named_state(state: EloState, names: list) -> tuple:
+    """State rows in the order of names"""
+    ids = [state.player_map[name] for name in names]
+    return state.player_abs[ids], state.games_played[ids], state.player_trend[ids], state.at_abilities[ids]
+
+
+@pytest.mark.parametrize("n_chunks", [1, 3, 7])
+def test_ingest_matches_elo(games, elo_kwargs, initial_state, n_chunks):
+    games = with_names(games)
+    *expected, expected_probs = elo(params=PARAMS, data=games, **elo_kwargs, **initial_state(40))
+
+    # small capacity forces the buffers to grow while ingesting
+    state = EloState(SURFACES, capacity=2)
+    dates = games['inferred_date'].unique()
+    probs = np.concatenate([state.ingest(games[games['inferred_date'].isin(chunk)])
+                            for chunk in np.array_split(dates, n_chunks)])
+
+    np.testing.assert_allclose(probs, expected_probs)
+    names = [f'P{i}' for i in range(40)]
+    for actual, exp in zip(get_named_state(state, names), expected):
+        np.testing.assert_allclose(actual, exp)
+
+
+def test_ingest_skips_old_dates(games):
+    games = with_names(games)
+    state = EloState(SURFACES)
+    state.ingest(games)
+    before = state.player_abs.copy()
+
+    probs = state.ingest(games.iloc[-20:])
+
+    assert np.isnan(probs).all()
+    np.testing.assert_array_equal(state.player_abs, before)
+
+
+@pytest.mark.parametrize("capacity, n_players, expected", [
+    (4, 3, 4),
+    (4, 5, 8),
+    (4, 20, 20),
+])
+def test_capacity_growth(capacity, n_players, expected):
+    names = np.array([f'P{i}' for i in range(n_players)])
+    state = EloState(SURFACES, capacity=capacity)
+    state.get_player_ids(names[:2])
+    state.player_abs[:] = 1600.
+
+    ids = state.get_player_ids(names)
+
+    np.testing.assert_array_equal(ids, np.arange(n_players))
+    assert state._capacity == expected
+    assert state.player_abs.shape == (n_players, len(SURFACES) + 1)
+    # existing players kept, new players start fresh
+    np.testing.assert_array_equal(state.player_abs[:2], 1600.)
+    np.testing.assert_array_equal(state.player_abs[2:], 1500.)
+
+
+def test_save_load(games, tmp_path):
+    games = with_names(games)
+    first, second = games[games['inferred_date'] < '2010-02-01'], games[games['inferred_date'] >= '2010-02-01']
+
+    state = EloState(SURFACES)
+    state.ingest(first)
+    state.save(tmp_path / 'state.npz')
+    loaded = EloState.load(tmp_path / 'state.npz')
+
+    assert loaded.player_map == state.player_map
+    assert loaded.last_date == state.last_date
+    np.testing.assert_array_equal(loaded.player_abs, state.player_abs)
+
+    np.testing.assert_array_equal(loaded.ingest(second), state.ingest(second))
+    np.testing.assert_array_equal(loaded.at_abilities, state.at_abilities)
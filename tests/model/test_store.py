@@ -0,0 +1,63 @@
+import json
+import pytest
+import numpy as np
+
+from src.constants import PARAMS
+from src.model.model import STATE_FIELDS, elo, iter_elo, get_day_ordinals
+from src.model.store import MemmapState, UNDO_FILE, META_FILE
+
+
+@pytest.mark.parametrize("engine", ['pandas', 'numpy'])
+def test_memmap_state(games, elo_kwargs, initial_state, tmp_path, engine):
+    expected = elo(PARAMS, games, **elo_kwargs, **initial_state(40), engine=engine)
+
+    store = MemmapState.create(str(tmp_path), n_players=40, n_abilities=4)
+    journal = store.journal(games['WID'].values, games['LID'].values, flush_every=7)
+    *state, probs = elo(PARAMS, games, **elo_kwargs, **dict(zip(STATE_FIELDS, store.state)), engine=engine,
+                        inplace=True, observers=[journal])
+    np.testing.assert_array_equal(probs, expected[-1])
+    assert all(values is stored for values, stored in zip(state, store.state))
+
+    reopened = MemmapState(str(tmp_path), mode='r')
+    for values, expected_values in zip(reopened.state, expected):
+        np.testing.assert_array_equal(values, expected_values)
+    assert reopened.matches == len(games) and reopened.date == get_day_ordinals(games['inferred_date']).max()
+    assert not (tmp_path / UNDO_FILE).exists()
+
+
+@pytest.mark.parametrize("truncate", [False, True])
+def test_memmap_state_recovery(games, elo_kwargs, initial_state, tmp_path, truncate):
+    store = MemmapState.create(str(tmp_path), n_players=40, n_abilities=4)
+    rounds = iter_elo(PARAMS, games, **elo_kwargs, **dict(zip(STATE_FIELDS, store.state)),
+                      observers=[store.journal(games['WID'].values, games['LID'].values, flush_every=5)])
+    # killed after 12 dates: 10 flushed, 2 applied since
+    for _ in range(12):
+        next(rounds)
+    del rounds
+    assert json.loads((tmp_path / META_FILE).read_text())['batch'] == 2
+    if truncate:
+        # killed halfway through saving a round's rows
+        with open(tmp_path / UNDO_FILE, 'ab') as f:
+            f.write(b'\x93NUMPY\x01\x00')
+
+    recovered = MemmapState(str(tmp_path))
+    assert recovered.rolled_back > 0 and not (tmp_path / UNDO_FILE).exists()
+
+    dates = games['inferred_date'].unique()
+    before = games[games['inferred_date'] <= dates[9]]
+    for values, expected_values in zip(recovered.state, elo(PARAMS, before, **elo_kwargs, **initial_state(40))):
+        np.testing.assert_array_equal(values, expected_values)
+    assert recovered.matches == len(before) and recovered.date == get_day_ordinals(before['inferred_date']).max()
+
+    # resumes from the flushed date
+    elo(PARAMS, games[games['inferred_date'] > dates[9]], **elo_kwargs, **dict(zip(STATE_FIELDS, recovered.state)),
+        inplace=True)
+    for values, expected_values in zip(recovered.state, elo(PARAMS, games, **elo_kwargs, **initial_state(40))):
+        np.testing.assert_array_equal(values, expected_values)
+
+
+def test_memmap_state_needs_inplace(games, elo_kwargs, initial_state, tmp_path):
+    store = MemmapState.create(str(tmp_path), n_players=40, n_abilities=4)
+    with pytest.raises(ValueError):
+        elo(PARAMS, games, **elo_kwargs, **dict(zip(STATE_FIELDS, store.state)),
+            observers=[store.journal(games['WID'].values, games['LID'].values)])
@@ -0,0 +1,47 @@
+import os
+import signal
+import multiprocessing
+import numpy as np
+
+from src.pipeline import get_predictions
+from src.model.store import MemmapState
+from src.model.observers import PredictionWriter
+
+SURFACES = ['Clay', 'Grass', 'Hard']
+
+
+def test_get_predictions_resumes(games, tmp_path):
+    folder = str(tmp_path / 'state')
+    expected, expected_state = get_predictions(games, 40, SURFACES)
+
+    def killed_run():
+        rounds = []
+
+        def on_round_end(self, elo_round):
+            rounds.append(elo_round.date)
+            if len(rounds) == 25:
+                # the round is applied but not committed yet
+                os.kill(os.getpid(), signal.SIGKILL)
+            self.out[elo_round.index] = elo_round.probs
+
+        PredictionWriter.on_round_end = on_round_end
+        get_predictions(games, 40, SURFACES, folder)
+
+    process = multiprocessing.get_context('fork').Process(target=killed_run)
+    process.start()
+    process.join()
+    assert process.exitcode == -signal.SIGKILL
+
+    store = MemmapState(folder, mode='r')
+    assert store.matches == 24*8
+    del store
+
+    predictions, state = get_predictions(games, 40, SURFACES, folder)
+
+    np.testing.assert_array_equal(predictions, expected)
+    for a, e in zip(state, expected_state):
+        np.testing.assert_array_equal(a, e)
+
+    # a finished folder has nothing left to replay
+    again, _ = get_predictions(games, 40, SURFACES, folder)
+    np.testing.assert_array_equal(again, expected)